@@ -0,0 +1,167 @@
+"""
+generation of synthetic template corpora for the benchmarks
+"""
+
+import shutil
+import zipfile
+from pathlib import Path
+from typing import Dict, Any, List
+
+_PROTO = '''"""
+a synthetic benchmark template
+"""
+
+name = ask("name", default="bench", positional_arg=0)
+title = ask("title", default="Benchmark", doc="the title of the generated project")
+enabled = confirm("enabled", prompt="Enabled?", default=True)
+flavor = ask("flavor", choices=["plain", "fancy"], default=0)
+items = [f"item_{i}" for i in range(10)]
+'''
+
+_TEMPLATE_LINES = [
+    "{{ title }} - {{ name }}\n",
+    "{% for item in items %}{{ item }}, {% endfor %}\n",
+    "{% if enabled %}enabled{% else %}disabled{% endif %} ({{ flavor | upper }})\n",
+    "plain content line without any templating, just text to be copied into the output\n",
+]
+
+# the content of templates that hold no jinja syntax (e.g., files that are templates only in order to be renamed)
+_LITERAL_LINES = [
+    "plain content line without any templating, just text to be copied into the output\n",
+    "def main(): return {'key': 'value'}\n",
+]
+
+
+class CorpusSpec:
+    """
+    describes a synthetic template along the benchmarked axes
+    """
+
+    def __init__(self, *, files: int = 100, depth: int = 2, tmpl_ratio: float = 0.5, tmpl_size: int = 1024,
+                 templated_names_ratio: float = 0.1, ignore_rules: int = 0, preserved_files: int = 0,
+                 binary_size: int = 256, literal_tmpl_ratio: float = 0.0):
+        """
+        :param files: the number of (non preserved) files in the template
+        :param depth: the depth of the directory tree that holds the files
+        :param tmpl_ratio: the fraction of the files that are templates (.tmpl), others are copied as is
+        :param tmpl_size: the (approximate) size in bytes of each template file
+        :param templated_names_ratio: the fraction of the files whose name is a template
+        :param ignore_rules: the number of rules in the root .protopyignore file (about 5% of the files are ignored
+                             if there are any rules)
+        :param preserved_files: the number of files in a preserved (.protopypreserve) directory
+        :param binary_size: the size in bytes of each file that is copied as is
+        :param literal_tmpl_ratio: the fraction of the template files that hold no jinja syntax
+        """
+        self.files = files
+        self.depth = depth
+        self.tmpl_ratio = tmpl_ratio
+        self.tmpl_size = tmpl_size
+        self.templated_names_ratio = templated_names_ratio
+        self.ignore_rules = ignore_rules
+        self.preserved_files = preserved_files
+        self.binary_size = binary_size
+        self.literal_tmpl_ratio = literal_tmpl_ratio
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+    def key(self) -> str:
+        return "-".join(f"{k}={v}" for k, v in sorted(vars(self).items()))
+
+
+def generate(spec: CorpusSpec, directory: Path) -> Path:
+    """
+    writes a synthetic template that follows the given spec into the given directory
+    :param spec: the spec of the template to generate
+    :param directory: the directory to generate the template into (will be replaced if exists)
+    :return: the template directory
+    """
+    if directory.exists():
+        shutil.rmtree(directory)
+    directory.mkdir(parents=True)
+
+    (directory / "proto.py").write_text(_PROTO)
+
+    template_content = _template_content(spec.tmpl_size)
+    literal_content = _template_content(spec.tmpl_size, _LITERAL_LINES)
+    binary_content = bytes(range(256)) * (spec.binary_size // 256) + bytes(spec.binary_size % 256)
+
+    branches = max(1, spec.files // 100)
+    tmpl_every = _every(spec.tmpl_ratio)
+    templated_name_every = _every(spec.templated_names_ratio)
+    literal_every = _every(spec.literal_tmpl_ratio)
+    tmpl_count = 0
+    for i in range(spec.files):
+        # files are spread over `branches` chains of nested directories, each `depth` levels deep
+        branch, level = i % branches, (i // branches) % max(1, spec.depth)
+        parent = directory.joinpath(f"b{branch}", *(f"d{d}" for d in range(level)))
+        parent.mkdir(parents=True, exist_ok=True)
+
+        name = f"{{{{ name }}}}_{i}" if templated_name_every and i % templated_name_every == 0 else f"file_{i}"
+        if spec.ignore_rules and i % 20 == 0:
+            # matched by one of the (non anchored) extension rules, see `_ignore_rule`
+            rule = 5 * ((i // 20) % ((spec.ignore_rules + 4) // 5))
+            (parent / f"{name}.ignored{rule}").write_bytes(binary_content)
+        elif tmpl_every and i % tmpl_every == 0:
+            literal = literal_every and tmpl_count % literal_every == 0
+            (parent / f"{name}.txt.tmpl").write_text(literal_content if literal else template_content)
+            tmpl_count += 1
+        else:
+            (parent / f"{name}.bin").write_bytes(binary_content)
+
+    if spec.ignore_rules:
+        (directory / ".protopyignore").write_text("".join(_ignore_rule(k) for k in range(spec.ignore_rules)))
+
+    if spec.preserved_files:
+        preserved = directory / "vendor"
+        preserved.mkdir()
+        (preserved / ".protopypreserve").touch()
+        for i in range(spec.preserved_files):
+            package = preserved / f"package_{i // 100}"
+            package.mkdir(exist_ok=True)
+            (package / f"module_{i}.py").write_bytes(binary_content)
+
+    return directory
+
+
+def zip_template(template_dir: Path, zip_file: Path) -> Path:
+    """
+    archives the given template directory into a zip file
+    :param template_dir: the template to archive
+    :param zip_file: the archive to create
+    :return: the created archive
+    """
+    with zipfile.ZipFile(zip_file, "w", zipfile.ZIP_DEFLATED) as zf:
+        for path in sorted(template_dir.rglob("*")):
+            if path.is_file():
+                zf.write(path, path.relative_to(template_dir).as_posix())
+    return zip_file
+
+
+def _every(ratio: float) -> int:
+    # converts a ratio into "every n-th item", 0 means never
+    return round(1 / ratio) if ratio > 0 else 0
+
+
+def _template_content(size: int, template_lines: List[str] = _TEMPLATE_LINES) -> str:
+    lines = []
+    total = 0
+    while total < size:
+        line = template_lines[len(lines) % len(template_lines)]
+        lines.append(line)
+        total += len(line)
+    return "".join(lines)
+
+
+def _ignore_rule(k: int) -> str:
+    # a mix of the different kinds of rules (extensions, anchored paths, directories, double star and negations)
+    kind = k % 5
+    if kind == 0:
+        return f"*.ignored{k}\n"
+    elif kind == 1:
+        return f"/b{k}/d0/*.ignored{k}\n"
+    elif kind == 2:
+        return f"build_{k}/\n"
+    elif kind == 3:
+        return f"**/d{k}/**/*.ignored{k}\n"
+    return f"!keep_{k}.ignored{k}\n"
@@ -0,0 +1,260 @@
+"""
+runs the protopy benchmark suite and (optionally) compares its results against a stored baseline.
+
+usage:
+    python -m benchmarks.run [--full] [--filter SUBSTRING] [--repeat N] [--output results.json]
+                             [--baseline baseline.json] [--threshold 0.25] [--save-baseline baseline.json]
+
+the results are written as json (to stdout unless --output is given), each benchmark reports the median, min and max
+wall time of its runs. when a baseline is given, benchmarks whose median is slower than the baseline median by more
+than the threshold (a fraction) are reported as regressions and the process exits with status 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional, Iterator
+
+from benchmarks.corpus import CorpusSpec, generate, zip_template
+
+_FORMAT_VERSION = 1
+
+# the arguments of the synthetic template (see `benchmarks.corpus`), given upfront so that nothing is prompted
+_KWARGS = {"name": "bench", "title": "Benchmark", "enabled": "yes", "flavor": "fancy"}
+
+
+class Benchmark:
+    def __init__(self, name: str, spec: CorpusSpec, run: Callable[[Path, Path], None], repeat: Optional[int] = None):
+        """
+        :param name: the name of the benchmark, used to compare against the baseline
+        :param spec: the template corpus that the benchmark runs on
+        :param run: the measured function, receives the template directory and a fresh output directory
+        :param repeat: (optional) overrides the number of measured runs
+        """
+        self.name = name
+        self.spec = spec
+        self.run = run
+        self.repeat = repeat
+
+
+def benchmarks(full: bool) -> Iterator[Benchmark]:
+    """
+    :param full: if True, includes the largest corpora (e.g., 100k files)
+    :return: the benchmarks of the suite
+    """
+
+    # file count
+    for files in (10, 100, 1_000, 10_000) + ((100_000,) if full else ()):
+        yield Benchmark(f"render/files={files}", CorpusSpec(files=files), _render, 1 if files >= 10_000 else None)
+
+    # tree depth
+    for depth in (1, 4, 16):
+        yield Benchmark(f"render/depth={depth}", CorpusSpec(files=1_000, depth=depth), _render)
+
+    # .tmpl size
+    for size in (1024, 64 * 1024, 1024 * 1024):
+        yield Benchmark(f"render/tmpl_size={size}", CorpusSpec(files=50, tmpl_ratio=1.0, tmpl_size=size), _render)
+
+    # templated names
+    for ratio in (0.0, 0.5, 1.0):
+        yield Benchmark(f"render/templated_names={ratio}", CorpusSpec(files=1_000, templated_names_ratio=ratio),
+                        _render)
+
+    # .tmpl files without jinja syntax
+    for ratio in (0.0, 0.5, 1.0):
+        yield Benchmark(f"render/literal_tmpl={ratio}", CorpusSpec(files=1_000, tmpl_ratio=1.0,
+                                                                  literal_tmpl_ratio=ratio), _render)
+
+    # .protopyignore complexity
+    for rules in (0, 10, 100):
+        yield Benchmark(f"render/ignore_rules={rules}", CorpusSpec(files=1_000, ignore_rules=rules), _render)
+
+    # preserved directory size
+    for preserved in (0, 1_000, 10_000) + ((100_000,) if full else ()):
+        yield Benchmark(f"render/preserved={preserved}", CorpusSpec(files=100, preserved_files=preserved), _render,
+                        1 if preserved >= 10_000 else None)
+
+    # sandbox overhead: sandboxed (default) and trusted, compiling while rendering or from precompiled templates
+    modes = (("sandboxed", _render), ("trusted", _render_trusted),
+             ("compiled_sandboxed", lambda t, o: _render_compiled(t, o, trusted=False)),
+             ("compiled_trusted", lambda t, o: _render_compiled(t, o, trusted=True)))
+    for mode, run_mode in modes:
+        yield Benchmark(f"render/mode={mode}", CorpusSpec(files=1_000, tmpl_ratio=1.0, templated_names_ratio=0.5),
+                        run_mode)
+
+    # output durability: writing directly into the target, or staged (and flushed) and then renamed into it
+    outputs = (("direct", _render), ("staged_nosync", lambda t, o: _render_staged(t, o, "none")),
+               ("staged_syncfs", lambda t, o: _render_staged(t, o, "syncfs")),
+               ("staged_files", lambda t, o: _render_staged(t, o, "files")))
+    for output, run_output in outputs:
+        yield Benchmark(f"render/output={output}", CorpusSpec(files=1_000), run_output)
+
+    # documentation
+    yield Benchmark("render_doc", CorpusSpec(files=10), _render_doc)
+
+    # sources, end to end (resolving the source and rendering it)
+    yield Benchmark("source/file_system/files=1000", CorpusSpec(files=1_000), _render_file_system_source)
+    yield Benchmark("source/zip/files=1000", CorpusSpec(files=1_000), _render_zip_source)
+
+
+def _render(template_dir: Path, output_dir: Path):
+    from protopy.engine import ProtopyEngine
+    ProtopyEngine().render(template_dir, output_dir, [], _KWARGS, {})
+
+
+def _render_trusted(template_dir: Path, output_dir: Path):
+    from protopy.engine import ProtopyEngine
+    ProtopyEngine(trusted=True).render(template_dir, output_dir, [], _KWARGS, {})
+
+
+def _render_compiled(template_dir: Path, output_dir: Path, trusted: bool):
+    from protopy.compiled import CompiledTemplates
+    from protopy.engine import ProtopyEngine
+
+    engine = ProtopyEngine(trusted=trusted)
+    compiled = template_dir.with_suffix(f".{'trusted' if trusted else 'sandboxed'}.zip")
+    if not compiled.exists():  # compiled during the warm up run, so it is not measured
+        engine.compile_template(template_dir, compiled)
+    engine.render(template_dir, output_dir, [], _KWARGS, {}, templates=CompiledTemplates(compiled))
+
+
+def _render_staged(template_dir: Path, output_dir: Path, sync: str):
+    from protopy.engine import ProtopyEngine
+    from protopy.staging import StagedDirectorySink
+    ProtopyEngine().render(template_dir, StagedDirectorySink(output_dir, sync=sync), [], _KWARGS, {})
+
+
+def _render_doc(template_dir: Path, output_dir: Path):
+    from protopy.engine import ProtopyEngine
+    engine = ProtopyEngine()
+    for _ in range(100):
+        engine.render_doc(template_dir)
+
+
+def _render_file_system_source(template_dir: Path, output_dir: Path):
+    from protopy.cli.sources.file_system_source import FileSystemSource
+    from protopy.engine import ProtopyEngine
+
+    with FileSystemSource(template_dir).use() as template_path:
+        ProtopyEngine().render(template_path, output_dir, [], _KWARGS, {})
+
+
+def _render_zip_source(template_dir: Path, output_dir: Path):
+    from protopy.cli.sources.zip_source import ZipSource
+    from protopy.engine import ProtopyEngine
+
+    with ZipSource(template_dir.with_suffix(".zip")).use() as template_path:
+        ProtopyEngine().render(template_path, output_dir, [], _KWARGS, {})
+
+
+def run(selected: List[Benchmark], work_dir: Path, repeat: int) -> Dict[str, Any]:
+    """
+    :param selected: the benchmarks to run
+    :param work_dir: a directory to generate the corpora and the outputs in
+    :param repeat: the default number of measured runs per benchmark
+    :return: the results, by benchmark name
+    """
+    results = {}
+    corpora: Dict[str, Path] = {}
+    for benchmark in selected:
+        key = benchmark.spec.key()
+        template_dir = corpora.get(key)
+        if template_dir is None:
+            template_dir = corpora[key] = generate(benchmark.spec, work_dir / f"corpus_{len(corpora)}")
+            zip_template(template_dir, template_dir.with_suffix(".zip"))
+
+        times = []
+        output_dir = work_dir / "output"
+        benchmark.run(template_dir, output_dir)  # warm up (e.g., imports and file system caches)
+        for _ in range(benchmark.repeat or repeat):
+            shutil.rmtree(output_dir, ignore_errors=True)
+            start = time.perf_counter()
+            benchmark.run(template_dir, output_dir)
+            times.append(time.perf_counter() - start)
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+        results[benchmark.name] = {
+            "median": statistics.median(times), "min": min(times), "max": max(times), "runs": len(times),
+            "corpus": benchmark.spec.to_dict()}
+        print(f"{benchmark.name:<40} {results[benchmark.name]['median']:10.4f}s", file=sys.stderr)
+
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    :param results: the results of the current run
+    :param baseline: the results of a previous run
+    :param threshold: the allowed slowdown, as a fraction of the baseline median
+    :return: the comparison of each benchmark that appears in both runs
+    """
+    comparison = []
+    for name, result in results["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            continue
+
+        ratio = result["median"] / base["median"] if base["median"] else float("inf")
+        comparison.append({"name": name, "baseline": base["median"], "current": result["median"], "ratio": ratio,
+                           "regression": ratio > 1 + threshold})
+    return comparison
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="runs the protopy benchmark suite")
+    parser.add_argument("--full", action="store_true", help="include the largest corpora (e.g., 100k files)")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains the given string")
+    parser.add_argument("--repeat", type=int, default=3, help="number of measured runs per benchmark")
+    parser.add_argument("--output", help="file to write the json results into (defaults to the standard output)")
+    parser.add_argument("--baseline", help="json results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown compared to the baseline")
+    parser.add_argument("--save-baseline", help="file to store the results into, as a baseline for future runs")
+    parser.add_argument("--work-dir", help="directory to generate the corpora in (defaults to a temporary directory)")
+    args = parser.parse_args(argv)
+
+    selected = [b for b in benchmarks(args.full) if not args.filter or args.filter in b.name]
+
+    if args.work_dir:
+        Path(args.work_dir).mkdir(parents=True, exist_ok=True)
+        benchmark_results = run(selected, Path(args.work_dir), args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as work_dir:
+            benchmark_results = run(selected, Path(work_dir), args.repeat)
+
+    results = {
+        "version": _FORMAT_VERSION,
+        "environment": {"python": platform.python_version(), "implementation": platform.python_implementation(),
+                        "platform": platform.platform(), "cpus": os.cpu_count()},
+        "benchmarks": benchmark_results}
+
+    status = 0
+    if args.baseline:
+        comparison = compare(results, json.loads(Path(args.baseline).read_text()), args.threshold)
+        results["comparison"] = comparison
+        for entry in comparison:
+            if entry["regression"]:
+                status = 1
+                print(f"regression: {entry['name']} {entry['baseline']:.4f}s -> {entry['current']:.4f}s "
+                      f"(x{entry['ratio']:.2f})", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(output)
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
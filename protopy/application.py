@@ -1,13 +1,26 @@
 from cleo.application import Application
+from cleo.loaders.factory_command_loader import FactoryCommandLoader
+
+
+def _load_command(module: str, name: str):
+    # commands (and the engine they depend on) are only imported once they are actually needed,
+    # so invocations like `protopy man` or `--help` do not pay for importing everything
+    def factory():
+        import importlib
+        return getattr(importlib.import_module(f"protopy.cli.commands.{module}"), name)()
+
+    return factory
 
-from protopy.cli.commands.generate_command import GenerateCommand
-from protopy.cli.commands.man_command import ManCommand
-from protopy.cli.commands.new_command import NewCommand
 
 application = Application()
-application.add(NewCommand())
-application.add(GenerateCommand())
-application.add(ManCommand())
+application.set_command_loader(FactoryCommandLoader({
+    "new": _load_command("new_command", "NewCommand"),
+    "generate": _load_command("generate_command", "GenerateCommand"),
+    "generate-batch": _load_command("generate_batch_command", "GenerateBatchCommand"),
+    "man": _load_command("man_command", "ManCommand"),
+    "serve": _load_command("serve_command", "ServeCommand"),
+    "compile": _load_command("compile_command", "CompileCommand"),
+}))
 
 
 def main():
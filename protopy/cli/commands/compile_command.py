@@ -0,0 +1,23 @@
+from pathlib import Path
+
+from cleo.commands.command import Command
+
+from protopy.protopy import Protopy
+
+
+class CompileCommand(Command):
+    """
+    precompile the names and .tmpl files of a template, for fast trusted rendering with `protopy generate --compiled`
+
+    compile
+        {template : the template to compile (supports path, git, zip, url to zip)}
+        {output : the zip file to write the compiled templates into}
+        {--sandboxed : compile for sandboxed rendering (by default, templates are compiled for trusted rendering)}
+    """
+
+    def handle(self) -> int:
+        trusted = not self.option("sandboxed")
+        count = Protopy.instance().compile(self.argument("template"), Path(self.argument("output")), trusted)
+        self.line(f"compiled {count} templates into {self.argument('output')} "
+                  f"({'trusted' if trusted else 'sandboxed'})")
+        return 0
@@ -0,0 +1,26 @@
+from cleo.commands.command import Command
+
+
+class GenerateBatchCommand(Command):
+    """
+    generate many directory trees based on a given template, one per job in a jobs file (alias of generate --jobs)
+
+    generate-batch
+        {template : the template to use (supports path, git, zip, url to zip)}
+        {jobs : json lines file with a job per line: {"output_path": ..., "args": [...], "kwargs": {...}} (or a .csv file), use - for stdin}
+        {--d|output-dir=. : the directory to resolve relative output paths of jobs against}
+        {--o|overwrite : allows the generated content to overwrite existing files}
+        {--c|copy-strategy=copy : how to copy files that are not templates: copy, reflink, hardlink or symlink}
+        {--p|processes= : number of worker processes to render the jobs with}
+        {--resume : skip the jobs that completed in a previous run (as recorded in the journal)}
+        {--journal= : the file to record the completed jobs in, defaults to the jobs file with a .done suffix}
+        {template_args?* : template arguments for all the jobs (the arguments of a job take precedence), can be positional and key=value}
+    """
+
+    def handle(self) -> int:
+        from protopy.cli.commands.generate_command import split_template_args
+        from protopy.cli.utils.jobs import generate_jobs
+
+        args, kwargs = split_template_args(self.argument("template_args"))
+        return generate_jobs(
+            self, self.argument("template"), self.argument("jobs"), self.option("output-dir"), args, kwargs)
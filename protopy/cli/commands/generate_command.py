@@ -1,19 +1,39 @@
 import os
-from typing import List
+from pathlib import Path
+from typing import List, Dict, Tuple, TYPE_CHECKING
 
 from cleo.commands.command import Command
 
-from protopy.protopy import Protopy
+from protopy.cli.daemon.client import DaemonClient
+from protopy.protopy import Protopy, render_summary
+
+if TYPE_CHECKING:
+    from protopy.watch import WatchCycle
 
 
 class GenerateCommand(Command):
     """
-    generate directory tree based on a given template
+    generate directory tree based on a given template (forwarded to the render daemon if `protopy serve` is running)
 
     generate
         {template : the template to use (supports path, git, zip, url to zip)}
         {output_path : where to put the generated content }
         {--o|overwrite : allows the generated content to overwrite existing files}
+        {--i|incremental : only write files whose content changed since the previous generation into output_path}
+        {--s|staged : render into a staging directory next to output_path and move the result into place only once the
+                      generation succeeded (rolled back if post generation fails)}
+        {--c|copy-strategy=copy : how to copy files that are not templates: copy, reflink, hardlink or symlink}
+        {--profile=? : write a json profile of the generation (phase and per file timings, compilations and cache
+                       statistics) into the given file, or to the standard output if no file is given}
+        {--j|jobs= : generate non-interactively once per job in the given json lines (or .csv) file (- for stdin), relative
+                     output paths of jobs are resolved against output_path}
+        {--p|processes= : with --jobs, number of worker processes to render the jobs with}
+        {--resume : with --jobs, skip the jobs that completed in a previous run (as recorded in the journal)}
+        {--journal= : with --jobs, the file to record the completed jobs in, defaults to the jobs file with a .done suffix}
+        {--trusted : render without the jinja sandbox, faster, only use it with templates that you trust}
+        {--compiled= : render using the templates that were precompiled into the given file by `protopy compile`}
+        {--w|watch : keep running and generate again whenever the (local directory) template changes, only the changed
+                     files are rendered again}
         {template_args?* : template arguments, can be positional and key=value}
     """
 
@@ -23,20 +43,111 @@ class GenerateCommand(Command):
         if not out_path:
             out_path = os.getcwd()
 
-        template_args: List[str] = self.argument("template_args")
-        args = []
-        kwargs = {}
+        args, kwargs = split_template_args(self.argument("template_args"))
+
+        copy_strategy = self.option("copy-strategy")
+        if self.option("staged") and (self.option("incremental") or self.option("jobs") or self.option("watch")):
+            self.line_error("<error>--staged is not supported with --incremental, --jobs or --watch</error>")
+            return 1
+        if self.option("jobs"):
+            return self._generate_jobs(template_descriptor, out_path, args, kwargs)
+        if self.option("watch"):
+            return self._watch(template_descriptor, out_path, args, kwargs, copy_strategy)
+
+        # the option value is None both when it is missing and when it is given without a file
+        profile = self.option("profile") if self.io.input.has_parameter_option("--profile") else False
+
+        # profiles are collected by the local engine and the daemon only renders sandboxed, so such generations are
+        # never forwarded
+        trusted, compiled = self.option("trusted"), self.option("compiled")
+        if profile is False and not trusted and not compiled and os.environ.get("PROTOPY_NO_DAEMON") != "1":
+            response = DaemonClient().render(
+                template_descriptor, out_path, args, kwargs, allow_overwrite=self.option("overwrite"),
+                incremental=self.option("incremental"), copy_strategy=copy_strategy, staged=self.option("staged"))
+
+            if response is not None and not response.get("fallback"):
+                self.io.write(response.get("output", ""))
+                if not response["ok"]:
+                    self.line_error(f"<error>{response['error']}</error>")
+                    return 1
+
+                for line in response["summary"]:
+                    self.line(line)
+                return 0
 
-        for arg in template_args:
-            try:
-                key,value = arg.split("=",2)
-            except ValueError:
-                key, value = (None, arg)
+        from protopy.instrumentation import Profiler
 
-            if key:
-                kwargs[key] = value
+        profiler = Profiler() if profile is not False else None
+        sink = Protopy.instance().render(
+            template_descriptor, out_path, args, kwargs, allow_overwrite=self.option("overwrite"),
+            incremental=self.option("incremental"), copy_strategy=copy_strategy, observer=profiler, trusted=trusted,
+            compiled=Path(compiled) if compiled else None, staged=self.option("staged"))
+
+        for line in render_summary(sink):
+            self.line(line)
+
+        if profiler:
+            if profile:
+                Path(profile).write_text(profiler.to_json())
             else:
-                args.append(value)
+                self.io.write(profiler.to_json(), new_line=True)
+        return 0
+
+    def _generate_jobs(self, template_descriptor: str, out_path: str, args: List[str], kwargs: Dict[str, str]) -> int:
+        from protopy.cli.utils.jobs import generate_jobs
+
+        if self.option("incremental") or self.io.input.has_parameter_option("--profile"):
+            self.line_error("<error>--incremental and --profile are not supported with --jobs</error>")
+            return 1
+
+        return generate_jobs(self, template_descriptor, self.option("jobs"), out_path, args, kwargs)
 
-        Protopy.instance().render(template_descriptor, out_path, args, kwargs, allow_overwrite=self.option("overwrite"))
+    def _watch(self, template_descriptor: str, out_path: str, args: List[str], kwargs: Dict[str, str],
+               copy_strategy: str) -> int:
+
+        if self.option("incremental") or self.io.input.has_parameter_option("--profile"):
+            self.line_error("<error>--incremental and --profile are not supported with --watch</error>")
+            return 1
+        if not Path(template_descriptor).is_dir():
+            self.line_error(f"<error>only local template directories can be watched: {template_descriptor}</error>")
+            return 1
+
+        def report(cycle: "WatchCycle"):
+            changes = ", ".join(cycle.changes[:3]) + (f" (+{len(cycle.changes) - 3})" if len(cycle.changes) > 3 else "")
+            if cycle.error is not None:
+                self.line_error(f"<error>failed</error> [{changes}]: {cycle.error}")
+                if cycle.error.__cause__ is not None:
+                    self.line_error(f"  caused by: {cycle.error.__cause__}")
+            else:
+                self.line(f"<info>generated</info> [{changes}]: {cycle.summary()}")
+
+        self.line(f"watching {template_descriptor} (press ctrl+c to stop)")
+        try:
+            Protopy.instance().watch(
+                template_descriptor, Path(out_path), args, kwargs, allow_overwrite=self.option("overwrite"),
+                on_cycle=report, copy_strategy=copy_strategy)
+        except KeyboardInterrupt:
+            pass
         return 0
+
+
+def split_template_args(template_args: List[str]) -> Tuple[List[str], Dict[str, str]]:
+    """
+    :param template_args: template arguments from the command line, either positional or key=value
+    :return: the positional arguments and the named arguments
+    """
+    args = []
+    kwargs = {}
+
+    for arg in template_args:
+        try:
+            key,value = arg.split("=",2)
+        except ValueError:
+            key, value = (None, arg)
+
+        if key:
+            kwargs[key] = value
+        else:
+            args.append(value)
+
+    return args, kwargs
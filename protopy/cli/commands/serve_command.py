@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from cleo.commands.command import Command
+
+from protopy.cli.daemon import default_socket_path
+from protopy.cli.daemon.client import DaemonClient
+from protopy.protopy import Protopy
+
+
+class ServeCommand(Command):
+    """
+    run a render daemon that keeps templates loaded, `protopy generate` forwards to it while it is running
+
+    serve
+        {--s|socket= : the unix socket to listen on, defaults to $PROTOPY_DAEMON_SOCKET or $XDG_RUNTIME_DIR/protopy.sock}
+        {--m|max-templates=16 : the maximum number of templates to keep loaded}
+        {--stop : stop the running daemon instead of starting one}
+    """
+
+    def handle(self) -> int:
+        socket_path = Path(self.option("socket")) if self.option("socket") else default_socket_path()
+
+        if self.option("stop"):
+            if not DaemonClient(socket_path).shutdown():
+                self.line_error(f"<error>no protopy daemon is listening on {socket_path}</error>")
+                return 1
+            return 0
+
+        self.line(f"<info>serving on</info> {socket_path}")
+        try:
+            Protopy.instance().serve(socket_path, int(self.option("max-templates")))
+        except KeyboardInterrupt:
+            pass
+        return 0
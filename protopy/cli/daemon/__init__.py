@@ -0,0 +1,21 @@
+import os
+from pathlib import Path
+
+# requests and responses are single json lines, this version is sent with every request
+PROTOCOL_VERSION = 3
+
+
+def default_socket_path() -> Path:
+    """
+    the unix socket that the render daemon listens on (see `protopy serve`), configured by the PROTOPY_DAEMON_SOCKET
+    environment variable, defaults to $XDG_RUNTIME_DIR/protopy.sock (or to $XDG_CACHE_HOME/protopy/daemon.sock if
+    there is no runtime directory)
+
+    :return: the path of the daemon socket
+    """
+    env = os.environ
+    if env.get("PROTOPY_DAEMON_SOCKET"):
+        return Path(env["PROTOPY_DAEMON_SOCKET"])
+    if env.get("XDG_RUNTIME_DIR"):
+        return Path(env["XDG_RUNTIME_DIR"]) / "protopy.sock"
+    return Path(env.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "protopy" / "daemon.sock"
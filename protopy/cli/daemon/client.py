@@ -0,0 +1,92 @@
+import json
+import os
+import socket
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Union
+
+from protopy.cli.daemon import PROTOCOL_VERSION, default_socket_path
+
+# the time to wait for the daemon to accept a connection, a daemon that does not accept is treated as not running
+_CONNECT_TIMEOUT = 1.0
+
+
+class DaemonClient:
+    """
+    a thin client of the render daemon (see `protopy serve`), imports nothing but the standard library so that
+    forwarding a render to the daemon does not pay for loading the engine
+    """
+
+    def __init__(self, socket_path: Optional[Union[Path, str]] = None):
+        """
+        :param socket_path: (optional) the socket of the daemon, defaults to `default_socket_path()`
+        """
+        self._socket_path = Path(socket_path) if socket_path else default_socket_path()
+
+    def available(self) -> bool:
+        """
+        :return: True if a daemon is listening on the socket of this client
+        """
+        return self.request({"op": "ping"}) is not None
+
+    def render(self, descriptor: str, out_dir: Union[Path, str], args: List[str], kwargs: Dict[str, str],
+               allow_overwrite: bool, incremental: bool = False,
+               copy_strategy: str = "copy", staged: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        asks the daemon to render the given template (non-interactively)
+
+        :param descriptor: the template to render (path, git, zip or url to zip)
+        :param out_dir: the directory to render the template into
+        :param args: positional arguments for the template
+        :param kwargs: named arguments for the template
+        :param allow_overwrite: if True, files that are already exists will be overridden by the template
+        :param incremental: if True, only files whose content changed since the previous generation are written
+        :param copy_strategy: how files that are not templates are copied
+        :param staged: if True, the output is rendered aside and swapped into out_dir once complete
+        :return: the response of the daemon, a dict with the keys: ok (bool), output (the messages of the template),
+                 summary (lines to print), error (if not ok) and fallback (True if the request should be rendered
+                 locally instead, e.g., since the template asked for a value that was not given), or None if no daemon
+                 is running
+        """
+        if os.path.exists(descriptor):  # local templates are resolved relative to the client, not to the daemon
+            descriptor = os.path.abspath(descriptor)
+
+        return self.request({
+            "op": "render", "template": descriptor, "output_path": os.path.abspath(str(out_dir)),
+            "args": list(args), "kwargs": dict(kwargs), "overwrite": bool(allow_overwrite),
+            "incremental": bool(incremental), "copy_strategy": copy_strategy, "staged": bool(staged),
+            "cwd": os.getcwd(), "env": dict(os.environ)})
+
+    def shutdown(self) -> bool:
+        """
+        asks the daemon to stop
+        :return: True if a daemon was running
+        """
+        return self.request({"op": "shutdown"}) is not None
+
+    def request(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        :param request: the request to send to the daemon
+        :return: the response of the daemon, or None if no daemon is running
+        """
+        if not hasattr(socket, "AF_UNIX") or not self._socket_path.exists():
+            return None
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(_CONNECT_TIMEOUT)
+            try:
+                sock.connect(str(self._socket_path))
+            except (ConnectionRefusedError, FileNotFoundError, socket.timeout):
+                return None  # a stale socket file, the daemon is not running
+            sock.settimeout(None)
+
+            with sock.makefile("rwb") as stream:
+                stream.write(json.dumps({**request, "version": PROTOCOL_VERSION}).encode("utf-8") + b"\n")
+                stream.flush()
+                line = stream.readline()
+
+            if not line:
+                raise ConnectionError(f"the protopy daemon at {self._socket_path} closed the connection")
+            return json.loads(line)
+        finally:
+            sock.close()
@@ -0,0 +1,359 @@
+import ast
+import json
+import os
+import socketserver
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterator, Tuple, Union, List
+
+from cleo.io.buffered_io import BufferedIO
+from cleo.io.inputs.string_input import StringInput
+
+from protopy.batch import RenderJob
+from protopy.engine import ProtopyEngine, LoadedTemplate, PromptRequiredError
+from protopy.ignore import IGNORE_FILE
+from protopy.manifest import IncrementalDirectorySink
+from protopy.sinks import DirectorySink
+from protopy.staging import StagedDirectorySink
+from protopy.template_cache import TemplateCache
+from protopy.zip_template import TemplatePath
+
+from protopy.cli.daemon import PROTOCOL_VERSION
+from protopy.cli.daemon.client import DaemonClient
+from protopy.cli.sources import Source
+from protopy.protopy import render_summary
+
+# remote templates (git and urls) are re-resolved (through the source cache) at most once in this many seconds
+_REMOTE_TTL = 60
+
+
+class TemplateRegistry:
+    """
+    keeps the most recently used templates loaded (their compiled proto.py, ignore matchers and compiled jinja
+    templates), bounded by `max_templates` and evicted in LRU order. local templates are reloaded when their proto.py
+    or one of their ignore files changes, remote templates are re-resolved periodically.
+
+    a template that is evicted while being rendered is released once its last rendering completes.
+    """
+
+    def __init__(self, engine: ProtopyEngine, max_templates: int = 16):
+        """
+        :param engine: the engine to load the templates with
+        :param max_templates: the maximum number of templates to keep loaded
+        """
+        self._engine = engine
+        self._max_templates = max_templates
+        self._entries: "OrderedDict[str, _RegistryEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @contextmanager
+    def use(self, descriptor: str) -> Iterator[LoadedTemplate]:
+        """
+        :param descriptor: the template to use (path, git, zip or url to zip)
+        :return: a context manager over the loaded template, which remains valid until the context exits
+        """
+        stamp = _stamp(descriptor)
+        with self._lock:
+            entry = self._entries.get(descriptor)
+            # ignore files of sub directories are read lazily, so their loaded matchers are checked for changes
+            if entry is not None and entry.stamp == stamp and not entry.template.ignore.is_stale():
+                self._entries.move_to_end(descriptor)
+                entry.users += 1
+                self.hits += 1
+            else:
+                entry = None
+                self.misses += 1
+
+        if entry is None:
+            entry = self._load(descriptor, stamp)
+            retired = []
+            with self._lock:
+                entry.users += 1
+                previous = self._entries.pop(descriptor, None)
+                if previous is not None:
+                    retired.append(previous)
+                self._entries[descriptor] = entry
+                while len(self._entries) > self._max_templates:
+                    retired.append(self._entries.popitem(last=False)[1])
+            for old_entry in retired:
+                self._retire(old_entry)
+
+        try:
+            yield entry.template
+        finally:
+            with self._lock:
+                entry.users -= 1
+                close = entry.retired and entry.users == 0
+            if close:
+                entry.resources.close()
+
+    def clear(self):
+        """
+        releases all the loaded templates (templates that are being rendered are released once their rendering
+        completes)
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._retire(entry)
+
+    def _load(self, descriptor: str, stamp: Any) -> "_RegistryEntry":
+        # the source remains in use (e.g., an open zip archive) for as long as the template is loaded
+        resources = ExitStack()
+        try:
+            template_path = resources.enter_context(Source.from_descriptor(descriptor).use())
+            template = self._engine.load_template(template_path, templates=TemplateCache())
+            return _RegistryEntry(template, stamp, resources)
+        except BaseException:
+            resources.close()
+            raise
+
+    def _retire(self, entry: "_RegistryEntry"):
+        with self._lock:
+            entry.retired = True
+            close = entry.users == 0
+        if close:
+            entry.resources.close()
+
+
+class _RegistryEntry:
+    def __init__(self, template: LoadedTemplate, stamp: Any, resources: ExitStack):
+        self.template = template
+        self.stamp = stamp
+        self.resources = resources
+        self.users = 0
+        self.retired = False
+
+
+class RenderDaemon:
+    """
+    serves non-interactive render requests (see `DaemonClient`) on a unix socket, requests are handled concurrently (by
+    a thread per connection) and share the templates that are kept loaded by a `TemplateRegistry`.
+
+    the client resolves the paths of the request, so rendering does not depend on the working directory of the daemon.
+    proto.py and its `post_generation` run in the working directory and the environment of the client, which are
+    process wide, so only these are performed one request at a time. a request whose template would prompt for a
+    value that was not given (as far as can be told from its proto.py) is sent back to the client before proto.py runs.
+    """
+
+    def __init__(self, engine: ProtopyEngine, socket_path: Union[Path, str], max_templates: int = 16):
+        """
+        :param engine: the engine to render the templates with
+        :param socket_path: the unix socket to listen on
+        :param max_templates: the maximum number of templates to keep loaded
+        """
+        self._engine = engine
+        self._socket_path = Path(socket_path)
+        self.registry = TemplateRegistry(engine, max_templates)
+        self._server: Optional[socketserver.BaseServer] = None
+        self._stopping = False
+
+    def __enter__(self) -> "RenderDaemon":
+        if DaemonClient(self._socket_path).available():
+            raise RuntimeError(f"a protopy daemon is already listening on {self._socket_path}")
+
+        self._socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self._socket_path.exists() or self._socket_path.is_symlink():
+            self._socket_path.unlink()  # a stale socket of a daemon that did not stop cleanly
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                line = self.rfile.readline()
+                if line:
+                    try:
+                        response = daemon.handle(line)
+                    except Exception as e:
+                        response = {"ok": False, "error": _describe(e)}
+                    self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+
+                if daemon._stopping:  # the response was sent, so the daemon can stop
+                    threading.Thread(target=daemon.shutdown).start()
+
+        old_umask = os.umask(0o177)  # only the user that started the daemon can connect to it
+        try:
+            self._server = _Server(str(self._socket_path), Handler)
+        finally:
+            os.umask(old_umask)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._server.server_close()
+        self.registry.clear()
+        try:
+            self._socket_path.unlink()
+        except OSError:
+            pass
+
+    def serve_forever(self):
+        """
+        handles requests until `shutdown` is called (or a shutdown request is received)
+        """
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """
+        stops serving requests, must not be called from the thread that runs `serve_forever`
+        """
+        self._server.shutdown()
+
+    def handle(self, line: bytes) -> Dict[str, Any]:
+        """
+        :param line: a json encoded request
+        :return: the response to the given request
+        """
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return {"ok": False, "error": f"malformed request: {e}"}
+
+        if request.get("version") != PROTOCOL_VERSION:
+            return {"ok": False, "error": f"unsupported protocol version: {request.get('version')}",
+                    "fallback": True}
+
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid(), "templates": len(self.registry),
+                    "hits": self.registry.hits, "misses": self.registry.misses}
+        elif op == "shutdown":
+            self._stopping = True
+            return {"ok": True}
+        elif op == "render":
+            return self._render(request)
+        return {"ok": False, "error": f"unknown operation: {op}"}
+
+    def _render(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        io = BufferedIO(StringInput(""))
+        io.interactive(False)
+
+        try:
+            out_dir, copy_strategy = Path(request["output_path"]), request.get("copy_strategy", "copy")
+            if request.get("incremental"):
+                sink = IncrementalDirectorySink(out_dir, copy_strategy=copy_strategy)
+            elif request.get("staged"):
+                sink = StagedDirectorySink(out_dir, copy_strategy)
+            else:
+                sink = DirectorySink(out_dir, copy_strategy)
+
+            job = RenderJob(sink, request.get("args"), request.get("kwargs"))
+            with self.registry.use(request["template"]) as template:
+                prompt = _unanswered_prompt(template, job.args, job.kwargs)
+                if prompt is not None:
+                    raise PromptRequiredError(prompt)
+
+                result = next(self._engine.render_many(
+                    template, [job], allow_overwrite=request.get("overwrite", False), io=io, fail_on_prompt=True,
+                    proto_scope=lambda: _client_process(request["cwd"], request["env"])))
+            error = result.error
+        except Exception as e:
+            error = e
+
+        output = io.fetch_output() + io.fetch_error()
+        if error is not None:
+            return {"ok": False, "output": output, "error": _describe(error),
+                    "fallback": isinstance(error, PromptRequiredError)}
+        return {"ok": True, "output": output, "summary": render_summary(sink)}
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+# the working directory and the environment are process wide, so they are used by one request at a time
+_client_process_lock = threading.Lock()
+
+
+@contextmanager
+def _client_process(cwd: str, env: Dict[str, str]):
+    # proto.py (and its post_generation) run in the working directory and environment of the client, as they would if
+    # the client rendered the template itself. the rest of the rendering only uses the absolute paths of the request
+    with _client_process_lock:
+        daemon_cwd, daemon_env = os.getcwd(), dict(os.environ)
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(env)
+        try:
+            yield
+        finally:
+            os.chdir(daemon_cwd)
+            os.environ.clear()
+            os.environ.update(daemon_env)
+
+
+# the values that proto.py may prompt for, (argument name, positional index), by the loaded templates
+_prompts_cache: "weakref.WeakKeyDictionary[LoadedTemplate, List[Tuple[Optional[str], int]]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def _unanswered_prompt(template: LoadedTemplate, args: Optional[List[str]], kwargs: Optional[Dict[str, str]]) \
+        -> Optional[str]:
+    # the first value that proto.py may prompt for but was not given, found by its `ask` and `confirm` calls (which
+    # may not all be reached), so that such a request is rendered by the client before proto.py had any side effect.
+    # values that are asked for in other ways (e.g., through an alias of `ask`) still fail while proto.py runs
+    prompts = _prompts_cache.get(template)
+    if prompts is None:
+        prompts = _prompts_cache[template] = _prompts(template.template_dir / "proto.py")
+
+    args, kwargs = args or [], kwargs or {}
+    for name, position in prompts:
+        if name is None:
+            return "<unknown>"  # the name is computed, so it cannot be told whether it was given
+        if not kwargs.get(name) and not (0 <= position < len(args) and args[position]):
+            return name
+    return None
+
+
+def _prompts(proto_file: TemplatePath) -> List[Tuple[Optional[str], int]]:
+    prompts = []
+    for node in ast.walk(ast.parse(proto_file.read_bytes())):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in ("ask", "confirm"):
+            keywords = {keyword.arg: keyword.value for keyword in node.keywords}
+            name = _literal(node.args[0] if node.args else keywords.get("named_arg"))
+            position = _literal(keywords.get("positional_arg"))
+            prompts.append((name if isinstance(name, str) else None, position if isinstance(position, int) else -1))
+    return prompts
+
+
+def _literal(node: Optional[ast.AST]) -> Any:
+    try:
+        return ast.literal_eval(node) if node is not None else None
+    except ValueError:
+        return None
+
+
+def _describe(error: BaseException) -> str:
+    message = f"{type(error).__name__}: {error}"
+    if error.__cause__ is not None:
+        message += f" (caused by {type(error.__cause__).__name__}: {error.__cause__})"
+    return message
+
+
+def _stamp(descriptor: str) -> Any:
+    # identifies the version of a template, a loaded template whose stamp changed is reloaded
+    path = Path(descriptor)
+    if path.is_dir():
+        return _stat(path / "proto.py"), _stat(path / IGNORE_FILE)
+    elif path.is_file():
+        return _stat(path)
+    return int(time.monotonic() // _REMOTE_TTL)
+
+
+def _stat(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
@@ -2,6 +2,7 @@ from abc import abstractmethod
 from contextlib import AbstractContextManager
 from pathlib import Path
 
+from protopy.zip_template import TemplatePath
 
 
 try:
@@ -12,29 +13,35 @@ except ImportError:
 
 class Source(Protocol):
     @abstractmethod
-    def use(self) -> "AbstractContextManager[Path]":
+    def use(self) -> "AbstractContextManager[TemplatePath]":
         ...
 
     @staticmethod
     def from_descriptor(descriptor: str) -> "Source":
-        from protopy.cli.sources.git_source import GitSource
-        from protopy.cli.sources.url_source import UrlSource
-        from protopy.cli.sources.zip_source import ZipSource
-        from protopy.cli.sources.file_system_source import FileSystemSource
-
+        # only the source that is actually used is imported (e.g., pygit2 and requests are only loaded for remote
+        # templates)
         if descriptor.startswith("git+"):
-            return GitSource(descriptor[5:])
+            from protopy.cli.sources.git_source import GitSource
+            from protopy.cli.sources.source_cache import SourceCache
+            return GitSource(descriptor[4:], SourceCache.from_environment())
         elif descriptor.startswith(("https://", "ssh://")) and descriptor.endswith(".git"):
-            return GitSource(descriptor)
+            from protopy.cli.sources.git_source import GitSource
+            from protopy.cli.sources.source_cache import SourceCache
+            return GitSource(descriptor, SourceCache.from_environment())
         elif descriptor.startswith(("http://", "https://")) and descriptor.endswith(".zip"):
-            return UrlSource(descriptor, ZipSource)
+            from protopy.cli.sources.url_source import UrlSource
+            from protopy.cli.sources.zip_source import ZipSource
+            from protopy.cli.sources.source_cache import SourceCache
+            return UrlSource(descriptor, ZipSource, SourceCache.from_environment())
         else:
             path = Path(descriptor)
             if not path.exists():
                 raise FileNotFoundError(f"could not find template in {descriptor} or source not supported.")
             if path.is_dir():
+                from protopy.cli.sources.file_system_source import FileSystemSource
                 return FileSystemSource(path)
-            elif path.suffix == "zip":
+            elif path.suffix == ".zip":
+                from protopy.cli.sources.zip_source import ZipSource
                 return ZipSource(descriptor)
             else:
                 raise ValueError(f"Unsupported File Type: {descriptor}")
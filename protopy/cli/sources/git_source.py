@@ -1,19 +1,153 @@
+import hashlib
+import os
+import re
 from contextlib import contextmanager
 from pathlib import Path
+from typing import Optional, Dict, Any, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qs
 
 import pygit2
 from tempfile import TemporaryDirectory
 
 from protopy.cli.sources import Source
+from protopy.cli.sources.source_cache import SourceCache, CacheFetcher
+
+_COMMIT_SHA = re.compile(r"[0-9a-fA-F]{40}")
+_FETCHED_REF = "refs/protopy/fetched"
 
 
 class GitSource(Source):
+    """
+    a template inside a git repository, the repository url may be followed by a ref (branch, tag or commit sha) and a
+    sub directory selector, e.g., https://host/repo.git@v1.0#subdir=templates/service. only the requested commit is
+    fetched (at depth 1) and only the selected sub directory is materialized.
+    """
 
-    def __init__(self, repo_url: str):
-        self._repo_url = repo_url
+    def __init__(self, repo_url: str, cache: Optional[SourceCache] = None):
+        self._descriptor = repo_url
+        self._repo_url, self._ref, self._subdir = _parse(repo_url)
+        self._cache = cache
 
     @contextmanager
     def use(self):
+        if self._cache:
+            yield self._cache.use(f"git+{self._descriptor}", _GitFetcher(self._repo_url, self._ref, self._subdir))
+            return
+
         with TemporaryDirectory() as temp_dir:
-            pygit2.clone_repository(self._repo_url, temp_dir)
+            _fetch(self._repo_url, self._ref, self._subdir, Path(temp_dir))
             yield Path(temp_dir)
+
+
+class _GitFetcher(CacheFetcher):
+    def __init__(self, repo_url: str, ref: Optional[str], subdir: Optional[str]):
+        self._repo_url = repo_url
+        self._ref = ref
+        self._subdir = subdir
+
+    def revalidate(self, validators: Dict[str, Any]) -> bool:
+        if validators.get("subdir") != self._subdir:
+            return False  # cached before the sub directory was part of the content key
+        if self._ref and _COMMIT_SHA.fullmatch(self._ref):
+            return True  # commits are immutable
+
+        with TemporaryDirectory() as temp_dir:
+            remote = pygit2.init_repository(temp_dir, bare=True).remotes.create_anonymous(self._repo_url)
+            remote_ref = _resolve_remote_ref(_list_heads(remote), self._ref)
+
+        return remote_ref is not None and remote_ref[1] == validators["commit"]
+
+    def fetch(self, work_dir: Path) -> Tuple[str, Dict[str, Any], Path]:
+        checkout = work_dir / "checkout"
+        commit = _fetch(self._repo_url, self._ref, self._subdir, checkout)
+        # the content is the selected sub directory of the commit, so descriptors of the same commit with different
+        # sub directories must not share an entry
+        key = hashlib.sha1(f"{commit}:{self._subdir}".encode("utf-8")).hexdigest() if self._subdir else commit
+        return key, {"commit": commit, "subdir": self._subdir}, checkout
+
+
+def _parse(descriptor: str) -> Tuple[str, Optional[str], Optional[str]]:
+    # splits the given descriptor into (repository url, ref, sub directory)
+    scheme, netloc, path, query, fragment = urlsplit(descriptor)
+
+    ref = None
+    head, separator, tail = path.rpartition("@")
+    # without a scheme, the descriptor may be scp-like (user@host:path), whose user is also followed by an '@'. the ref
+    # is only taken from after the repository path (ending with .git) or if it holds neither a ':' nor a '/'
+    if separator and (netloc or head.endswith(".git") or not any(c in tail for c in ":/")):
+        path, ref = head, tail
+
+    subdir = None
+    if fragment:
+        selectors = parse_qs(fragment)
+        subdir = next(iter(selectors.get("subdir") or selectors.get("subdirectory") or []), None)
+        if subdir is None:
+            raise ValueError(f"unsupported git descriptor fragment: #{fragment} (expecting #subdir=<path>)")
+        subdir = subdir.strip("/")
+
+    return urlunsplit((scheme, netloc, path, query, "")), ref or None, subdir or None
+
+
+def _list_heads(remote: pygit2.Remote) -> Dict[str, str]:
+    if hasattr(remote, "list_heads"):
+        return {head.name: str(head.oid) for head in remote.list_heads()}
+    return {head["name"]: str(head["oid"]) for head in remote.ls_remotes()}  # pygit2 < 1.15
+
+
+def _resolve_remote_ref(heads: Dict[str, str], ref: Optional[str]) -> Optional[Tuple[str, str]]:
+    # returns the (full ref name, commit) that the given ref denotes in the remote (None means the remote's HEAD)
+    candidates = [ref, f"refs/heads/{ref}", f"refs/tags/{ref}"] if ref else ["HEAD"]
+    for name in candidates:
+        if name in heads:
+            return name, heads.get(f"{name}^{{}}", heads[name])  # annotated tags are listed also peeled with ^{}
+    return None
+
+
+def _fetch(repo_url: str, ref: Optional[str], subdir: Optional[str], target: Path) -> str:
+    # fetches the given ref (at depth 1) and materializes its sub directory into target, returns the fetched commit
+    with TemporaryDirectory() as git_dir:
+        repo = pygit2.init_repository(git_dir, bare=True)
+        remote = repo.remotes.create_anonymous(repo_url)
+
+        remote_ref = _resolve_remote_ref(_list_heads(remote), ref)
+        if remote_ref:
+            refspec = f"+{remote_ref[0]}:{_FETCHED_REF}"
+        elif ref and _COMMIT_SHA.fullmatch(ref):
+            refspec = f"+{ref}:{_FETCHED_REF}"
+        else:
+            raise ValueError(f"could not find ref {ref} in {repo_url}")
+
+        try:
+            remote.fetch([refspec], depth=1)
+        except (TypeError, pygit2.GitError):
+            # shallow fetches are not supported by pygit2 < 1.14 and by some transports (e.g., local repositories)
+            remote.fetch([refspec])
+
+        commit = repo.references[_FETCHED_REF].peel(pygit2.Commit)
+        tree = commit.tree
+        if subdir:
+            try:
+                tree = (tree / subdir).peel(pygit2.Tree)
+            except (KeyError, ValueError) as e:
+                raise FileNotFoundError(f"could not find directory {subdir} in {repo_url}@{commit.id}") from e
+
+        target.mkdir(parents=True, exist_ok=True)
+        _materialize(repo, tree, target)
+        return str(commit.id)
+
+
+def _materialize(repo: pygit2.Repository, tree: pygit2.Tree, target: Path):
+    for entry in tree:
+        entry_path = target / entry.name
+        if entry.type_str == "tree":
+            entry_path.mkdir()
+            _materialize(repo, repo[entry.id], entry_path)
+        elif entry.type_str == "blob":
+            data = repo[entry.id].data
+            if entry.filemode == pygit2.GIT_FILEMODE_LINK:
+                os.symlink(data, str(entry_path))
+            else:
+                entry_path.write_bytes(data)
+                if entry.filemode == pygit2.GIT_FILEMODE_BLOB_EXECUTABLE:
+                    entry_path.chmod(0o755)
+        # submodules (commit entries) are not materialized
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from abc import abstractmethod
+from pathlib import Path
+from typing import Optional, Dict, Tuple, Any, Union
+
+try:
+    from typing import Protocol
+except ImportError:
+    from typing_extensions import Protocol
+
+_DEFAULT_TTL = 10 * 60
+_DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+
+class CacheFetcher(Protocol):
+    """
+    knows how to fetch (and revalidate) the content of a remote template, used by `SourceCache`
+    """
+
+    @abstractmethod
+    def revalidate(self, validators: Dict[str, Any]) -> bool:
+        """
+        :param validators: the validators that were returned by the fetch that created the cached entry
+        :return: True if the cached entry is still valid
+        """
+
+    @abstractmethod
+    def fetch(self, work_dir: Path) -> Tuple[str, Dict[str, Any], Path]:
+        """
+        :param work_dir: a temporary directory to fetch the content into
+        :return: a tuple (content key, validators, path of the fetched content file or directory inside work_dir),
+                 the content key identifies the content itself (e.g., a commit sha or a hash of the downloaded file)
+        """
+
+
+class SourceCache:
+    """
+    a local, content addressed, cache of remote templates.
+
+    each template descriptor references a content entry (keyed by a commit sha or by a hash of a downloaded file),
+    descriptors are revalidated against their remote source once their ttl expires. the total size of the content
+    entries is bounded, entries are evicted in LRU order. in offline mode, cached entries are used without
+    revalidation and descriptors that are not cached result in an error.
+    """
+
+    def __init__(self, directory: Union[Path, str], *, ttl: float = _DEFAULT_TTL, max_size: int = _DEFAULT_MAX_SIZE,
+                 offline: bool = False):
+        """
+        :param directory: the directory to keep the cache in
+        :param ttl: number of seconds that a cached entry is used for before being revalidated against its source
+        :param max_size: the maximum number of bytes that the cached content may take
+        :param offline: if True, the sources will never be contacted
+        """
+        self._directory = Path(directory)
+        self._ttl = ttl
+        self._max_size = max_size
+        self._offline = offline
+
+        self._refs_dir = self._directory / "refs"
+        self._objects_dir = self._directory / "objects"
+
+    @staticmethod
+    def from_environment() -> Optional["SourceCache"]:
+        """
+        creates the cache that is configured by the environment variables: PROTOPY_CACHE_DIR (defaults to
+        $XDG_CACHE_HOME/protopy), PROTOPY_CACHE_TTL (seconds), PROTOPY_CACHE_MAX_SIZE (bytes), PROTOPY_OFFLINE (1 to
+        enable offline mode) and PROTOPY_NO_CACHE (1 to disable the cache)
+
+        :return: the configured cache or None if the cache is disabled
+        """
+
+        env = os.environ
+        if env.get("PROTOPY_NO_CACHE") == "1":
+            return None
+
+        directory = env.get("PROTOPY_CACHE_DIR") or \
+                    Path(env.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "protopy" / "templates"
+
+        return SourceCache(
+            directory, ttl=float(env.get("PROTOPY_CACHE_TTL", _DEFAULT_TTL)),
+            max_size=int(env.get("PROTOPY_CACHE_MAX_SIZE", _DEFAULT_MAX_SIZE)),
+            offline=env.get("PROTOPY_OFFLINE") == "1")
+
+    def use(self, descriptor: str, fetcher: CacheFetcher) -> Path:
+        """
+        :param descriptor: the descriptor of the remote template
+        :param fetcher: fetcher for the remote template
+        :return: the path of the cached content of the given descriptor, fetching it if required
+        """
+
+        ref = self._read_ref(descriptor)
+        if ref and not self._object_path(ref).exists():
+            ref = None
+
+        if ref and (self._offline or time.time() - ref["validated_at"] < self._ttl):
+            return self._hit(ref)
+
+        if self._offline:
+            raise IOError(f"template {descriptor} is not available in the cache (offline mode)")
+
+        if ref:
+            try:
+                valid = fetcher.revalidate(ref["validators"])
+            except Exception:
+                valid = True  # the source is not reachable, using the cached content
+
+            if valid:
+                ref["validated_at"] = time.time()
+                self._write_ref(descriptor, ref)
+                return self._hit(ref)
+
+        self._objects_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=str(self._directory)) as work_dir:
+            key, validators, content = fetcher.fetch(Path(work_dir))
+            ref = {"descriptor": descriptor, "key": key, "validators": validators, "validated_at": time.time(),
+                   "size": _size_of(content)}
+
+            object_path = self._object_path(ref)
+            if not object_path.exists():
+                try:
+                    os.rename(str(content), str(object_path))
+                except OSError:
+                    if not object_path.exists():  # otherwise, another process stored the same content
+                        raise
+
+        self._write_ref(descriptor, ref)
+        self._evict()
+        return self._hit(ref)
+
+    def clear(self):
+        """
+        removes all the cached entries
+        """
+        shutil.rmtree(str(self._directory), ignore_errors=True)
+
+    def _hit(self, ref: Dict[str, Any]) -> Path:
+        path = self._object_path(ref)
+        os.utime(str(path))  # marking the entry as recently used
+        return path
+
+    def _object_path(self, ref: Dict[str, Any]) -> Path:
+        return self._objects_dir / ref["key"]
+
+    def _ref_path(self, descriptor: str) -> Path:
+        return self._refs_dir / (hashlib.sha1(descriptor.encode("utf-8")).hexdigest() + ".json")
+
+    def _read_ref(self, descriptor: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self._ref_path(descriptor).read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _write_ref(self, descriptor: str, ref: Dict[str, Any]):
+        self._refs_dir.mkdir(parents=True, exist_ok=True)
+        ref_path = self._ref_path(descriptor)
+        temp_path = ref_path.with_name(f"{ref_path.name}.{os.getpid()}.tmp")
+        temp_path.write_text(json.dumps(ref))
+        os.replace(str(temp_path), str(ref_path))
+
+    def _evict(self):
+        sizes: Dict[str, int] = {}
+        refs_by_key: Dict[str, list] = {}
+        for ref_path in self._refs_dir.glob("*.json"):
+            try:
+                ref = json.loads(ref_path.read_text())
+            except (OSError, ValueError):
+                continue
+            sizes[ref["key"]] = ref["size"]
+            refs_by_key.setdefault(ref["key"], []).append(ref_path)
+
+        entries = []
+        for object_path in self._objects_dir.iterdir():
+            if object_path.name not in sizes:  # not referenced by any descriptor
+                _remove(object_path)
+            else:
+                entries.append((object_path.stat().st_mtime, object_path))
+
+        total_size = sum(sizes.values())
+        for _, object_path in sorted(entries)[:-1]:  # the most recently used entry is always kept
+            if total_size <= self._max_size:
+                break
+
+            for ref_path in refs_by_key[object_path.name]:
+                _remove(ref_path)
+            _remove(object_path)
+            total_size -= sizes[object_path.name]
+
+
+def _size_of(path: Path) -> int:
+    if not path.is_dir():
+        return path.stat().st_size
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _remove(path: Path):
+    if path.is_dir():
+        shutil.rmtree(str(path), ignore_errors=True)
+    else:
+        try:
+            path.unlink()
+        except OSError:
+            pass
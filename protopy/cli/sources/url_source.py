@@ -1,26 +1,76 @@
 import functools
-import shutil
+import hashlib
 from contextlib import contextmanager
+from pathlib import Path
 from tempfile import TemporaryFile
-from typing import Callable
+from typing import Callable, BinaryIO, Union, Optional, Dict, Any, Tuple
 
 from protopy.cli.sources import Source
+from protopy.cli.sources.source_cache import SourceCache, CacheFetcher
 import requests
 
 
 class UrlSource(Source):
-    def __init__(self, url: str, sub_source: Callable[[str], Source]):
+    def __init__(self, url: str, sub_source: Callable[[Union[BinaryIO, str]], Source],
+                 cache: Optional[SourceCache] = None):
         self._url = url
         self._sub_source = sub_source
+        self._cache = cache
 
     @contextmanager
     def use(self):
+        if self._cache:
+            downloaded = self._cache.use(self._url, _UrlFetcher(self._url))
+            with self._sub_source(str(downloaded)).use() as result:
+                yield result
+            return
+
         with TemporaryFile() as temp_file:
             with requests.get(self._url, stream=True) as r:
                 r.raise_for_status()
-                r.raw.read = functools.partial(r.raw.read, decode_content=True)
-                with open(temp_file, "wb") as f:
-                    shutil.copyfileobj(r.raw, f)
+                _download(r, temp_file)
 
+            temp_file.seek(0)
             with self._sub_source(temp_file).use() as result:
                 yield result
+
+
+class _UrlFetcher(CacheFetcher):
+    def __init__(self, url: str):
+        self._url = url
+
+    def revalidate(self, validators: Dict[str, Any]) -> bool:
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        if not headers:
+            return False
+
+        with requests.head(self._url, headers=headers, allow_redirects=True) as r:
+            return r.status_code == 304
+
+    def fetch(self, work_dir: Path) -> Tuple[str, Dict[str, Any], Path]:
+        content = work_dir / "content"
+        with requests.get(self._url, stream=True) as r:
+            r.raise_for_status()
+            with content.open("wb") as f:
+                digest = _download(r, f)
+
+            validators = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+
+        return digest, validators, content
+
+
+def _download(response: requests.Response, file: BinaryIO) -> str:
+    # writes the content of the given response into the file and returns its sha256
+    digest = hashlib.sha256()
+    response.raw.read = functools.partial(response.raw.read, decode_content=True)
+    while True:
+        chunk = response.raw.read(64 * 1024)
+        if not chunk:
+            break
+        digest.update(chunk)
+        file.write(chunk)
+    return digest.hexdigest()
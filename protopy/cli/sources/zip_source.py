@@ -1,20 +1,19 @@
 from contextlib import contextmanager
 from pathlib import Path
-from tempfile import TemporaryDirectory
+from typing import Union, BinaryIO
 from zipfile import ZipFile
 
 from protopy.cli.sources import Source
+from protopy.zip_template import ZipTemplatePath
 
 
 class ZipSource(Source):
 
-    def __init__(self, zip_file_path: str):
-        self._zip_file_path = Path(zip_file_path)
+    def __init__(self, zip_file: Union[str, Path, BinaryIO]):
+        self._zip_file = zip_file
 
     @contextmanager
-    def use(self) -> Path:
-        with TemporaryDirectory() as temp_dir:
-            with open(self._zip_file_path) as f:
-                ZipFile(f).extractall(temp_dir)
-            yield temp_dir
-
+    def use(self) -> ZipTemplatePath:
+        # the template is read directly from the archive, without extracting it
+        with ZipFile(self._zip_file) as zip_file:
+            yield ZipTemplatePath(zip_file)
@@ -0,0 +1,221 @@
+import csv
+import hashlib
+import json
+import os
+import shlex
+import sys
+import time
+from collections import deque
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Iterator, TextIO, Optional, Union, Set, List, Dict
+
+from cleo.commands.command import Command
+
+from protopy.batch import RenderJob
+
+
+def read_jobs(stream: TextIO, format: str = "jsonl",
+              base_dir: Optional[Union[Path, str]] = None) -> Iterator[RenderJob]:
+    """
+    reads render jobs from a stream, the stream is consumed lazily. the supported formats are:
+
+    - jsonl: each (non empty) line is an object of the form: {"output_path": "...", "args": [...], "kwargs": {...}}
+    - csv: the first row is a header, the `output_path` column holds the output path, the (optional) `args` column holds
+      the positional arguments (separated by whitespace, shell quoting is supported) and any other column is a named
+      argument (empty cells are not passed to the template)
+
+    :param stream: the stream to read the jobs from
+    :param format: the format of the stream, either 'jsonl' or 'csv'
+    :param base_dir: (optional) the directory to resolve relative output paths against
+    :return: iterator over the read jobs
+    """
+
+    if format == "jsonl":
+        records = _read_jsonl(stream)
+    elif format == "csv":
+        records = _read_csv(stream)
+    else:
+        raise ValueError(f"unsupported jobs format: {format}")
+
+    for line_number, line, record in records:
+        try:
+            output_path = record["output_path"]
+            if base_dir is not None:
+                output_path = os.path.join(str(base_dir), output_path)
+            yield RenderJob(output_path, record.get("args"), record.get("kwargs"))
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"invalid job in line {line_number}: {line}") from e
+
+
+def jobs_format(jobs_file: str) -> str:
+    """
+    :param jobs_file: the path of a jobs file (- for stdin)
+    :return: the format of the given jobs file, by its extension (jsonl unless the file ends with .csv)
+    """
+    return "csv" if jobs_file.lower().endswith(".csv") else "jsonl"
+
+
+def _read_jsonl(stream: TextIO):
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            yield line_number, line, json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"invalid job in line {line_number}: {line}") from e
+
+
+def _read_csv(stream: TextIO):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        output_path, args = row.pop("output_path", None), row.pop("args", None)
+        record = {"args": shlex.split(args) if args else [], "kwargs": {k: v for k, v in row.items() if k and v}}
+        if output_path:
+            record["output_path"] = output_path
+        yield reader.line_num, json.dumps(record), record
+
+
+class JobJournal:
+    """
+    an append only record of the jobs that were rendered successfully, so that a run that was stopped (or that had
+    failing jobs) can be resumed without rendering the completed jobs again. jobs are identified by their output path
+    and arguments, so a job that was modified is rendered again.
+    """
+
+    def __init__(self, path: Union[Path, str], resume: bool):
+        """
+        :param path: the file to keep the journal in
+        :param resume: if True, the jobs that are recorded in the existing journal are considered completed, otherwise
+                       the existing journal is discarded
+        """
+        self._path = Path(path)
+        self._completed: Set[str] = set()
+        if resume and self._path.exists():
+            self._completed = {line.strip() for line in self._path.read_text().splitlines() if line.strip()}
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._stream = open(self._path, "a" if resume else "w")
+
+    def completed(self, job: RenderJob) -> bool:
+        """
+        :param job: a job
+        :return: True if the given job was recorded as completed
+        """
+        return _job_key(job) in self._completed
+
+    def record(self, job: RenderJob):
+        """
+        records the given job as completed, the record is flushed immediately
+        :param job: the completed job
+        """
+        key = _job_key(job)
+        self._completed.add(key)
+        self._stream.write(key + "\n")
+        self._stream.flush()
+
+    def close(self):
+        self._stream.close()
+
+    def __enter__(self) -> "JobJournal":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _job_key(job: RenderJob) -> str:
+    identity = json.dumps([os.path.abspath(str(job.target_dir)), job.args, job.kwargs], sort_keys=True)
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+
+def generate_jobs(command: Command, descriptor: str, jobs_file: str, base_dir: str, args: List[str],
+                  kwargs: Dict[str, str]) -> int:
+    """
+    the implementation of both `generate --jobs` and `generate-batch`: runs the jobs (see `run_jobs`) with the options of
+    the given command (`overwrite`, `copy-strategy`, `processes`, `resume` and `journal`)
+
+    :param command: the command to read the options of and to report the progress through
+    :param descriptor: the template to render (path, git, zip or url to zip)
+    :param jobs_file: the jsonl or csv file to stream the jobs from (- for stdin), see `read_jobs`
+    :param base_dir: the directory to resolve relative output paths against
+    :param args: positional arguments for jobs that do not define their own
+    :param kwargs: named arguments for all the jobs (the arguments of a job take precedence)
+    :return: the exit code of the command
+    """
+    journal_file = command.option("journal") or (f"{jobs_file}.done" if jobs_file != "-" else None)
+    if command.option("resume") and not journal_file:
+        command.line_error("<error>resuming jobs that are read from stdin requires --journal</error>")
+        return 1
+
+    processes = command.option("processes")
+    return run_jobs(
+        command, descriptor, jobs_file, args=args, kwargs=kwargs, base_dir=base_dir,
+        allow_overwrite=command.option("overwrite"), processes=int(processes) if processes else None,
+        copy_strategy=command.option("copy-strategy"), journal_file=journal_file, resume=command.option("resume"))
+
+
+def run_jobs(command: Command, descriptor: str, jobs_file: str, *, args: Optional[List[str]] = None,
+             kwargs: Optional[Dict[str, str]] = None, base_dir: Optional[str] = None, allow_overwrite: bool = False,
+             processes: Optional[int] = None, copy_strategy: str = "copy", journal_file: Optional[str] = None,
+             resume: bool = False) -> int:
+    """
+    renders the given template once per job in the given jobs file, reporting the status of each job (through the
+    given command) as it completes. jobs are rendered non-interactively: a job whose template asks for a value that
+    was not given fails instead of prompting (see `PromptRequiredError`).
+
+    :param command: the command to report the progress through
+    :param descriptor: the template to render (path, git, zip or url to zip)
+    :param jobs_file: the jsonl or csv file to stream the jobs from (- for stdin), see `read_jobs`
+    :param args: (optional) positional arguments for jobs that do not define their own
+    :param kwargs: (optional) named arguments for all the jobs (the arguments of a job take precedence)
+    :param base_dir: (optional) the directory to resolve relative output paths against
+    :param allow_overwrite: if True, files that are already exists will be overridden by the template
+    :param processes: (optional) number of worker processes to render the jobs with
+    :param copy_strategy: how files that are not templates are copied
+    :param journal_file: (optional) a file to record the completed jobs in (see `JobJournal`)
+    :param resume: if True, jobs that were recorded as completed in the journal file are skipped
+    :return: the exit code of the command, 1 if any job failed
+    """
+    from protopy.protopy import Protopy
+
+    if resume and not journal_file:
+        raise ValueError("resuming requires a journal file")
+
+    counts = {"done": 0, "failed": 0, "skipped": 0}
+    start = time.perf_counter()
+    with ExitStack() as resources:
+        journal = resources.enter_context(JobJournal(journal_file, resume)) if journal_file else None
+        jobs_stream = resources.enter_context(open(jobs_file)) if jobs_file != "-" else sys.stdin
+
+        def pending_jobs():
+            for index, job in enumerate(read_jobs(jobs_stream, jobs_format(jobs_file), base_dir), 1):
+                job = RenderJob(job.target_dir, job.args or args, {**(kwargs or {}), **job.kwargs})
+                if journal and journal.completed(job):
+                    counts["skipped"] += 1
+                    command.line(f"<comment>skipped</comment> [{index}]: {job.target_dir} (completed before)")
+                else:
+                    indices.append(index)
+                    yield job
+
+        indices = deque()  # the results are reported in the order of the jobs
+        results = Protopy.instance().render_batch(
+            descriptor, pending_jobs(), allow_overwrite=allow_overwrite, processes=processes,
+            copy_strategy=copy_strategy, fail_on_prompt=True)
+
+        for result in results:
+            index = indices.popleft()
+            if result.ok:
+                counts["done"] += 1
+                if journal:
+                    journal.record(result.job)
+                command.line(f"<info>done</info> [{index}]: {result.job.target_dir}")
+            else:
+                counts["failed"] += 1
+                command.line(f"<error>failed</error> [{index}]: {result.job.target_dir}: {result.error}")
+
+    command.line(f"{counts['done']} done, {counts['failed']} failed, {counts['skipped']} skipped "
+                 f"in {time.perf_counter() - start:.2f}s")
+    return 1 if counts["failed"] else 0
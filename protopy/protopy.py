@@ -1,30 +1,131 @@
+import os
+import time
 import zipfile
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Iterable, Iterator, Optional, Callable, TYPE_CHECKING
 
-import protopy.engine
+from protopy.proto_cache import ProtoCache
 
 from protopy.cli.sources import Source
-from protopy.cli.utils.resources import resource
 import protopy.doc_generator as docgenerator
 
+if TYPE_CHECKING:
+    from protopy.batch import RenderJob, RenderResult
+    from protopy.engine import ProtopyEngine
+    from protopy.instrumentation import EngineObserver
+    from protopy.sinks import DirectorySink
+    from protopy.watch import WatchCycle
+
 _NEW_TEMPLATE_RESOURCE = "templates/new_template.zip"
 
 
 class Protopy:
 
     def __init__(self):
-        self._engine = protopy.engine.ProtopyEngine()
+        self._proto_cache = ProtoCache(_proto_cache_dir())
+        self._engines: Dict[bool, "ProtopyEngine"] = {}
+
+    @property
+    def _engine(self) -> "ProtopyEngine":
+        return self._engine_for(trusted=False)
+
+    def _engine_for(self, trusted: bool) -> "ProtopyEngine":
+        # the engines (and jinja) are only imported and constructed by the commands that render templates
+        engine = self._engines.get(trusted)
+        if engine is None:
+            from protopy.engine import ProtopyEngine
+            engine = self._engines[trusted] = ProtopyEngine(proto_cache=self._proto_cache, trusted=trusted)
+        return engine
 
     def manual(self, descriptor: str) -> str:
         with Source.from_descriptor(descriptor).use() as template_path:
-            return docgenerator.generate(template_path / "proto.py", descriptor)
+            return docgenerator.generate(template_path / "proto.py", descriptor, cache=self._proto_cache)
+
+    def render(self, descriptor: str, out_dir: Path, args: List[str], kwargs: Dict[str, str], allow_overwrite: bool,
+               incremental: bool = False, copy_strategy: str = "copy",
+               observer: Optional["EngineObserver"] = None, trusted: bool = False,
+               compiled: Optional[Path] = None, staged: bool = False) -> "DirectorySink":
+        """
+        renders the given template, without the jinja sandbox if trusted, using the templates that were precompiled
+        into the given archive if compiled (see `compile`), in the mode that they were compiled for. if staged, the
+        output is rendered aside and swapped into out_dir once complete (see `StagedDirectorySink`)
+        """
+        from protopy.manifest import IncrementalDirectorySink
+        from protopy.sinks import DirectorySink
+        from protopy.staging import StagedDirectorySink
+
+        templates = None
+        if compiled:
+            from protopy.compiled import CompiledTemplates
+            templates = CompiledTemplates(compiled)
+            trusted = not templates.sandboxed
+        engine = self._engine_for(trusted)
+
+        if incremental and staged:
+            raise ValueError("incremental generation cannot be staged")
+        elif incremental:
+            sink = IncrementalDirectorySink(out_dir, copy_strategy=copy_strategy)
+        elif staged:
+            sink = StagedDirectorySink(out_dir, copy_strategy)
+        else:
+            sink = DirectorySink(out_dir, copy_strategy)
+
+        if observer:
+            engine.add_observer(observer)
+
+        try:
+            fetch_start = time.perf_counter()
+            with Source.from_descriptor(descriptor).use() as template_path:
+                if observer:
+                    observer.on_phase("fetch", time.perf_counter() - fetch_start)
+                engine.render(template_path, sink, args, kwargs, {}, allow_overwrite=allow_overwrite,
+                              templates=templates)
+        finally:
+            if observer:
+                engine.remove_observer(observer)
+
+        return sink
+
+    def watch(self, descriptor: str, out_dir: Path, args: List[str], kwargs: Dict[str, str], allow_overwrite: bool,
+              on_cycle: Callable[["WatchCycle"], None], copy_strategy: str = "copy"):
+        """
+        renders the given (local directory) template and then renders it again whenever it changes, until interrupted
+        """
+        if not Path(descriptor).is_dir():
+            raise ValueError(f"only local template directories can be watched: {descriptor}")
+
+        self._engine.watch(descriptor, out_dir, args, kwargs, {}, on_cycle=on_cycle, allow_overwrite=allow_overwrite,
+                           copy_strategy=copy_strategy)
+
+    def compile(self, descriptor: str, output: Path, trusted: bool = True) -> int:
+        """
+        compiles the names and `.tmpl` files of the given template into the given archive (see
+        `ProtopyEngine.compile_template`) for trusted (or sandboxed) rendering
+        :return: the number of compiled templates
+        """
+        with Source.from_descriptor(descriptor).use() as template_path:
+            return self._engine_for(trusted).compile_template(template_path, output)
+
+    def serve(self, socket_path: Path, max_templates: int):
+        """
+        runs the render daemon (see `protopy.cli.daemon`) until it is asked to stop
+        """
+        from protopy.cli.daemon.server import RenderDaemon
 
-    def render(self, descriptor: str, out_dir: Path, args: List[str], kwargs: Dict[str, str], allow_overwrite: bool):
+        with RenderDaemon(self._engine, socket_path, max_templates) as daemon:
+            daemon.serve_forever()
+
+    def render_batch(self, descriptor: str, jobs: Iterable["RenderJob"], allow_overwrite: bool,
+                     processes: Optional[int] = None, copy_strategy: str = "copy",
+                     fail_on_prompt: bool = False) -> Iterator["RenderResult"]:
         with Source.from_descriptor(descriptor).use() as template_path:
-            self._engine.render(template_path, out_dir, args, kwargs, {}, allow_overwrite=allow_overwrite)
+            yield from self._engine.render_many(
+                template_path, jobs, allow_overwrite=allow_overwrite, processes=processes, copy_strategy=copy_strategy,
+                fail_on_prompt=fail_on_prompt)
 
     def create_template(self, path: Path):
+        from protopy.cli.utils.resources import resource
+
         if path.exists() and not path.is_dir():
             raise ValueError(f"{path} is not a directory")
         elif not path.exists():
@@ -34,8 +135,37 @@ class Protopy:
             zipfile.ZipFile(nt).extractall(path)
 
     @staticmethod
-    def instance():
+    def instance() -> "Protopy":
+        global _instance
+        if _instance is None:
+            _instance = Protopy()
         return _instance
 
 
-_instance = Protopy()
+def render_summary(sink: "DirectorySink") -> List[str]:
+    """
+    :param sink: the sink that a template was rendered into (see `Protopy.render`)
+    :return: the lines to report to the user about the rendering
+    """
+    from protopy.copier import CopyStrategy
+    from protopy.manifest import IncrementalDirectorySink
+
+    lines = []
+    if sink.copy_strategy != CopyStrategy.COPY:
+        lines.append(sink.copy_stats.summary())
+
+    if isinstance(sink, IncrementalDirectorySink):
+        lines.append(sink.report.summary())
+        lines.extend(f"<comment>orphaned</comment>: {orphan}" for orphan in sink.report.orphaned)
+    return lines
+
+
+def _proto_cache_dir() -> Optional[Path]:
+    # compiled proto.py files are kept next to the cached templates (see `SourceCache.from_environment`)
+    env = os.environ
+    if env.get("PROTOPY_NO_CACHE") == "1":
+        return None
+    return Path(env.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "protopy" / "proto"
+
+
+_instance: Optional[Protopy] = None
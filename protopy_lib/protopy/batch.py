@@ -0,0 +1,136 @@
+import multiprocessing
+import pickle
+from collections import deque
+from pathlib import Path
+from typing import Union, List, Dict, Any, Optional, Iterable, Iterator
+
+from cleo.io.null_io import NullIO
+
+from protopy.copier import CopyStrategy
+from protopy.render_plan import RenderPlan
+from protopy.sinks import OutputSink
+
+
+class RenderJob:
+    """
+    a single rendering of a template (see `ProtopyEngine.render_many`)
+    """
+
+    def __init__(self, target_dir: Union[Path, str, OutputSink], args: Optional[List[str]] = None,
+                 kwargs: Optional[Dict[str, str]] = None, extra_context: Optional[Dict[str, Any]] = None):
+        """
+        :param target_dir: the directory (or sink, see `protopy.sinks`) to output the generated content into
+        :param args: positional arguments for the template
+        :param kwargs: named arguments for the template
+        :param extra_context: extra variables that will be available inside proto.py
+        """
+        self.target_dir = target_dir
+        self.args = args or []
+        self.kwargs = kwargs or {}
+        self.extra_context = extra_context or {}
+
+    @staticmethod
+    def of(job: Union["RenderJob", tuple]) -> "RenderJob":
+        """
+        :param job: a job or a (target_dir, args, kwargs[, extra_context]) tuple
+        :return: the job that the given value represents
+        """
+        return job if isinstance(job, RenderJob) else RenderJob(*job)
+
+    def __repr__(self):
+        return f"RenderJob({self.target_dir}, {self.args}, {self.kwargs})"
+
+
+class RenderResult:
+    """
+    the result of a single rendering job, either holds the executed plan or the error that the job failed with
+    (when rendering using multiple processes, the plan is not available)
+    """
+
+    def __init__(self, job: RenderJob, plan: Optional[RenderPlan], error: Optional[BaseException] = None):
+        self.job = job
+        self.plan = plan
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        return f"RenderResult({self.job}, {'ok' if self.ok else repr(self.error)})"
+
+
+# state of the current worker process (when rendering using a process pool), see `render_in_processes`
+_worker_state = None
+
+
+def render_in_processes(template_dir: Path, excluded_files: Optional[List[Path]], jobs: Iterable[Any],
+                        processes: int, allow_overwrite: bool, max_workers: Optional[int],
+                        copy_strategy: Union[CopyStrategy, str] = CopyStrategy.COPY,
+                        fail_on_prompt: bool = False, trusted: bool = False) -> Iterator[RenderResult]:
+    """
+    renders the given jobs using a pool of worker processes, each worker loads the template (and compiles it) once,
+    the parent process only sends the jobs to the workers and receives their errors back. at most 2 jobs per worker
+    are in flight at any time so that the jobs iterable is consumed lazily.
+
+    inside the workers, the template is evaluated non-interactively (a value that was not given is either replaced by
+    its default or, if `fail_on_prompt` is True, fails the job) and its messages are discarded
+    """
+
+    with multiprocessing.Pool(processes, initializer=_init_worker,
+                              initargs=(template_dir, excluded_files, trusted)) as pool:
+        pending = deque()
+        for job in jobs:
+            job = RenderJob.of(job)
+            pending.append((job, pool.apply_async(
+                _render_job, (job, allow_overwrite, max_workers, copy_strategy, fail_on_prompt))))
+            if len(pending) >= 2 * processes:
+                job, result = pending.popleft()
+                yield RenderResult(job, None, result.get())
+
+        while pending:
+            job, result = pending.popleft()
+            yield RenderResult(job, None, result.get())
+
+
+def _init_worker(template_dir: Path, excluded_files: Optional[List[Path]], trusted: bool):
+    global _worker_state
+    from protopy.engine import ProtopyEngine
+    from protopy.template_cache import TemplateCache
+
+    io = NullIO()
+    io.interactive(False)
+
+    engine = ProtopyEngine(io, template_cache=TemplateCache(), trusted=trusted)
+    try:
+        _worker_state = (engine, engine.load_template(template_dir, excluded_files=excluded_files))
+    except Exception as e:
+        # an initializer that raises is restarted by the pool forever, so the error fails the worker's jobs instead
+        _worker_state = _portable_error(e)
+
+
+def _render_job(job: RenderJob, allow_overwrite: bool, max_workers: Optional[int],
+                copy_strategy: Union[CopyStrategy, str], fail_on_prompt: bool) -> Optional[BaseException]:
+    if isinstance(_worker_state, BaseException):
+        return _worker_state
+
+    engine, template = _worker_state
+    result = next(engine.render_many(
+        template, [job], allow_overwrite=allow_overwrite, max_workers=max_workers, copy_strategy=copy_strategy,
+        fail_on_prompt=fail_on_prompt))
+    return _portable_error(result.error) if result.error else None
+
+
+def _portable_error(error: BaseException) -> BaseException:
+    # exceptions are sent to the parent process without their cause, so the cause is merged into the message
+    if error.__cause__ is None:
+        try:
+            pickle.dumps(error)
+            return error
+        except Exception:
+            pass
+
+    message = f"{type(error).__name__}: {error}"
+    if error.__cause__ is not None:
+        message += f" (caused by {type(error.__cause__).__name__}: {error.__cause__})"
+    return RuntimeError(message)
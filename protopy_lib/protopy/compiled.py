@@ -0,0 +1,126 @@
+import hashlib
+import importlib.util
+import json
+import marshal
+import sys
+import zipfile
+from pathlib import Path
+from typing import Optional, Union, Dict, Iterator
+
+import jinja2
+from jinja2 import Environment, Template
+
+from protopy.ignore import IgnoreMatcher
+from protopy.literals import is_literal
+from protopy.template_cache import TemplateCache
+from protopy.zip_template import TemplatePath
+
+# the name of the file that describes a compiled templates archive
+METADATA_FILE = "protopy-compiled.json"
+
+_FORMAT_VERSION = 1
+
+
+def write_compiled(env: Environment, template_dir: TemplatePath, ignore: IgnoreMatcher,
+                   output: Union[Path, str]) -> int:
+    """
+    compiles the names and the `.tmpl` files of the given template into a zip of python modules (one module per
+    distinct source, named `tmpl_<sha1 of the source>`, in the style of jinja's `Environment.compile_templates`), see
+    `ProtopyEngine.compile_template`
+
+    :param env: the environment to compile the templates for
+    :param template_dir: the directory holding the template
+    :param ignore: the ignore matcher of the template
+    :param output: the zip file to write
+    :return: the number of compiled templates
+    """
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    temp_output = output.with_name(f"{output.name}.tmp")
+
+    compiled = set()
+    with zipfile.ZipFile(temp_output, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(METADATA_FILE, json.dumps({
+            "version": _FORMAT_VERSION, "python": sys.implementation.cache_tag, "jinja": jinja2.__version__,
+            "sandboxed": env.sandboxed, "template": str(template_dir)}))
+
+        for source, filename in _template_sources(template_dir, ignore):
+            module = _module_name(source)
+            if module in compiled:
+                continue
+
+            # deferred initialization, so the module can also be imported (e.g., by zipimport) without an environment
+            python_source = env.compile(source, filename, filename, raw=True, defer_init=True)
+            code = compile(python_source, filename or "<template>", "exec")
+            # a pyc header (magic number, flags and an empty source timestamp and size) followed by the code
+            zf.writestr(f"{module}.pyc", importlib.util.MAGIC_NUMBER + bytes(12) + marshal.dumps(code))
+            compiled.add(module)
+
+    temp_output.replace(output)
+    return len(compiled)
+
+
+class CompiledTemplates(TemplateCache):
+    """
+    a template cache that is backed by templates that were compiled ahead of time (see
+    `ProtopyEngine.compile_template`), templates are looked up by their source so they are never parsed. templates that
+    are missing from the archive (e.g., they were modified since it was compiled) and templates requested by an engine
+    of another mode (trusted or sandboxed) are compiled as usual (and counted in `fallbacks`).
+    """
+
+    def __init__(self, archive: Union[Path, str], *, max_entries: int = 1024):
+        """
+        :param archive: a zip file written by `ProtopyEngine.compile_template`
+        :param max_entries: the maximum number of loaded templates to keep in memory
+        """
+        super().__init__(max_entries=max_entries)
+
+        with zipfile.ZipFile(archive) as zf:
+            try:
+                metadata = json.loads(zf.read(METADATA_FILE))
+            except KeyError:
+                raise ValueError(f"not a compiled protopy template: {archive}") from None
+
+            if metadata.get("version") != _FORMAT_VERSION or metadata["python"] != sys.implementation.cache_tag \
+                    or metadata["jinja"] != jinja2.__version__:
+                raise ValueError(f"{archive} was compiled by another version of protopy, python or jinja, "
+                                 f"compile the template again")
+
+            self._modules: Dict[str, bytes] = {
+                name[:-len(".pyc")]: zf.read(name) for name in zf.namelist() if name.endswith(".pyc")}
+
+        self.sandboxed: bool = metadata["sandboxed"]
+        self.fallbacks = 0
+
+    def _compile(self, env: Environment, source: str, name: Optional[str], filename: Optional[str]) -> Template:
+        data = self._modules.get(_module_name(source)) if env.sandboxed == self.sandboxed else None
+        if data is None:
+            self.fallbacks += 1
+            return super()._compile(env, source, name, filename)
+
+        code = marshal.loads(data[len(importlib.util.MAGIC_NUMBER) + 12:])
+        return env.template_class.from_code(env, code, env.make_globals(None), None)
+
+
+def _module_name(source: str) -> str:
+    return "tmpl_" + hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+def _template_sources(directory: TemplatePath, ignore: IgnoreMatcher) -> Iterator[tuple]:
+    # the (source, filename) of every name and `.tmpl` file that rendering the template may compile, the content of
+    # preserved directories is copied as is and literals are not rendered by jinja (see `protopy.literals`), so they
+    # are not compiled
+    for child in directory.iterdir():
+        is_dir = child.is_dir()
+        if ignore.ignores(child.name, is_dir):
+            continue
+
+        if not is_literal(child.name):
+            yield child.name, None
+        if is_dir:
+            if not (child / ".protopypreserve").exists():
+                yield from _template_sources(child, ignore.enter(child))
+        elif child.name.endswith(".tmpl"):
+            source = child.read_text(encoding="utf-8")  # as the engine reads templates
+            if not is_literal(source):
+                yield source, str(child)
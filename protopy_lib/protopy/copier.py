@@ -0,0 +1,217 @@
+import errno
+import os
+import shutil
+import stat
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from pathlib import Path
+from typing import Union, Optional, Iterator, Tuple, List
+
+from protopy.ignore import IgnoreMatcher
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+# ioctl request that clones the content of a file into another file (linux, supported by btrfs, xfs, overlayfs etc.)
+_FICLONE = 0x40049409
+
+# the default number of threads that copy the files of a directory tree
+_DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+# errors that indicate that a copy acceleration is not supported for the given files
+_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.ENOSYS, errno.EPERM, errno.EBADF,
+                getattr(errno, "EOPNOTSUPP", errno.EINVAL), getattr(errno, "ENOTSUP", errno.EINVAL)}
+
+
+class CopyStrategy(Enum):
+    """
+    how files that are not templates are copied into the target directory
+    """
+
+    COPY = "copy"  # regular copy
+    REFLINK = "reflink"  # copy-on-write clone where the file system supports it, falls back to a regular copy
+    HARDLINK = "hardlink"  # hard link to the template file (changing the generated file changes the template)
+    SYMLINK = "symlink"  # symbolic link to the template file
+
+    @staticmethod
+    def of(strategy: Union["CopyStrategy", str]) -> "CopyStrategy":
+        return strategy if isinstance(strategy, CopyStrategy) else CopyStrategy(strategy)
+
+
+class CopyStats:
+    """
+    counts the bytes that were physically copied compared to the bytes that were linked (or cloned)
+    """
+
+    def __init__(self):
+        self.copied_files = 0
+        self.copied_bytes = 0
+        self.linked_files = 0
+        self.linked_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, size: int, linked: bool):
+        with self._lock:
+            if linked:
+                self.linked_files += 1
+                self.linked_bytes += size
+            else:
+                self.copied_files += 1
+                self.copied_bytes += size
+
+    def summary(self) -> str:
+        return f"copied {self.copied_files} files ({self.copied_bytes} bytes), " \
+               f"linked {self.linked_files} files ({self.linked_bytes} bytes)"
+
+    def __repr__(self):
+        return f"CopyStats({self.summary()})"
+
+
+def copy_file(source: Union[Path, str], target: Union[Path, str], strategy: CopyStrategy = CopyStrategy.COPY,
+              stats: Optional[CopyStats] = None, source_stat: Optional[os.stat_result] = None) -> bool:
+    """
+    copies the source file into the target path (replacing it, if exists) using the given strategy, strategies that
+    are not supported for the given files (e.g., hard links across devices) fall back to a regular copy
+
+    :param source: the file to copy
+    :param target: the path to copy the file into
+    :param strategy: the copy strategy to use
+    :param stats: (optional) statistics to update with the copied file
+    :param source_stat: (optional) the stat of the source file, if already known
+    :return: True if the file was linked (or cloned), False if its content was copied
+    """
+
+    source, target = os.fspath(source), os.fspath(target)
+    source_stat = source_stat or os.stat(source)
+    linked = False
+    if strategy == CopyStrategy.HARDLINK:
+        linked = _link(source, target, os.link)
+    elif strategy == CopyStrategy.SYMLINK:
+        linked = _link(os.path.abspath(source), target, os.symlink)
+
+    if not linked:
+        _detach(target)
+        if strategy == CopyStrategy.REFLINK:
+            linked = _clone(source, target)
+        else:
+            shutil.copyfile(source, target)
+        os.chmod(target, stat.S_IMODE(source_stat.st_mode))
+
+    if stats is not None:
+        stats.add(source_stat.st_size, linked)
+    return linked
+
+
+def copy_tree(source: Path, target: Path, strategy: CopyStrategy = CopyStrategy.COPY,
+              stats: Optional[CopyStats] = None, *, ignore: Optional[IgnoreMatcher] = None,
+              max_workers: Optional[int] = None):
+    """
+    copies the source directory tree, with the modes of its files and directories, into the target directory (creating
+    it if needed). the tree is scanned using `os.scandir` while its files are copied concurrently by a bounded pool of
+    threads, so large trees (e.g., vendored dependencies) are copied at disk speed without holding the whole tree in
+    memory.
+
+    :param source: the directory to copy
+    :param target: the directory to copy the tree into
+    :param strategy: the copy strategy to use for the files of the tree (see `copy_file`)
+    :param stats: (optional) statistics to update with the copied files
+    :param ignore: (optional) a matcher for the entries of the source directory, ignored entries are not copied
+    :param max_workers: (optional) the maximum number of threads to copy the files with
+    """
+
+    max_workers = max_workers or _DEFAULT_WORKERS
+    directories: List[Tuple[str, int]] = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque()
+        for file_source, file_stat, file_target in _scan_tree(source, target, ignore, directories):
+            pending.append(pool.submit(copy_file, file_source, file_target, strategy, stats, file_stat))
+            if len(pending) >= 4 * max_workers:  # bounds the number of scanned files that are waiting to be copied
+                pending.popleft().result()
+
+        while pending:
+            pending.popleft().result()
+
+    # the modes of the directories are copied last (children first), so read only directories can still be filled
+    for directory_target, mode in reversed(directories):
+        os.chmod(directory_target, mode)
+
+
+def _scan_tree(source: Path, target: Path, ignore: Optional[IgnoreMatcher],
+               directories: List[Tuple[str, int]]) -> Iterator[Tuple[str, os.stat_result, str]]:
+    # creates the directories of the tree (parents first, their (target path, mode) pairs are appended to the given
+    # list) and yields its files as (path, stat, target path) tuples
+    stack = [(os.fspath(source), os.fspath(target), ignore)]
+    while stack:
+        directory, directory_target, directory_ignore = stack.pop()
+        os.makedirs(directory_target, exist_ok=True)
+        directories.append((directory_target, stat.S_IMODE(os.stat(directory).st_mode)))
+
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                is_dir = entry.is_dir()
+                if directory_ignore is not None and directory_ignore.ignores(entry.name, is_dir):
+                    continue
+
+                entry_target = os.path.join(directory_target, entry.name)
+                if is_dir:
+                    child_ignore = directory_ignore.enter(Path(entry.path)) if directory_ignore is not None else None
+                    stack.append((entry.path, entry_target, child_ignore))
+                else:
+                    yield entry.path, entry.stat(), entry_target
+
+
+def _link(source: str, target: str, link) -> bool:
+    try:
+        link(source, target)
+        return True
+    except FileExistsError:
+        os.unlink(target)
+        return _link(source, target, link)
+    except OSError as e:
+        if e.errno in _UNSUPPORTED:
+            return False
+        raise
+
+
+def _detach(target: str):
+    # removes the target if it is a link that was created by a previous generation, so that writing into it will not
+    # modify the template
+    try:
+        st = os.lstat(target)
+    except FileNotFoundError:
+        return
+
+    if stat.S_ISLNK(st.st_mode) or st.st_nlink > 1:
+        os.unlink(target)
+
+
+def _clone(source: str, target: str) -> bool:
+    # copies the content of source into target, cloning it if possible, returns True if the content was cloned
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+                return True
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+
+        if hasattr(os, "copy_file_range"):
+            # in-kernel copy, avoids moving the content through user space (and is accelerated by some file systems)
+            try:
+                while os.copy_file_range(src.fileno(), dst.fileno(), 1024 * 1024 * 1024):
+                    pass
+                return False
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                src.seek(0)
+                dst.seek(0)
+                dst.truncate()
+
+        shutil.copyfileobj(src, dst)
+        return False
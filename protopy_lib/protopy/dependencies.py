@@ -0,0 +1,78 @@
+import hashlib
+import json
+from typing import Dict, Any, Optional, FrozenSet, Set, Mapping, Iterable, TypeVar
+
+from jinja2 import Environment, meta, TemplateSyntaxError
+
+K = TypeVar("K")
+
+# only used for parsing, parsing does not depend on the sandbox
+_PARSER = Environment()
+
+
+def template_variables(source: str) -> Optional[FrozenSet[str]]:
+    """
+    :param source: the source of a jinja template (a file or directory name, or the content of a `.tmpl` file)
+    :return: the names of the context variables that the given template reads, or None if they cannot be determined
+             statically (e.g., the template includes other templates or cannot be parsed)
+    """
+    try:
+        ast = _PARSER.parse(source)
+    except TemplateSyntaxError:
+        return None
+
+    if any(True for _ in meta.find_referenced_templates(ast)):
+        return None
+    return frozenset(meta.find_undeclared_variables(ast))
+
+
+def variable_digests(context: Dict[str, Any]) -> Dict[str, str]:
+    """
+    :param context: the variables that a template is rendered with
+    :return: a hash per variable of the given context, variables whose value cannot be hashed are left out (see
+             `opaque_variables`)
+    """
+    digests = {}
+    for name, value in context.items():
+        digest = _digest(value)
+        if digest is not None:
+            digests[name] = digest
+    return digests
+
+
+def opaque_variables(context: Dict[str, Any]) -> Set[str]:
+    """
+    :param context: the variables that a template is rendered with
+    :return: the names of the variables whose value cannot be hashed: functions (e.g., the ones that proto.py defines),
+             modules and other values that are not plain (json) data. what a template that reads such a variable renders
+             may change without any hashed variable changing, so these variables should always be considered changed
+    """
+    return {name for name, value in context.items() if _digest(value) is None}
+
+
+def changed_variables(old: Mapping[str, str], new: Mapping[str, str]) -> Set[str]:
+    """
+    :param old: the variable digests (see `variable_digests`) of a previous render
+    :param new: the variable digests of the current render
+    :return: the names of the variables that were changed, added or removed
+    """
+    return {k for k in old.keys() | new.keys() if old.get(k) != new.get(k)}
+
+
+def affected(dependencies: Mapping[K, Optional[Iterable[str]]], changed: Optional[Set[str]]) -> Set[K]:
+    """
+    :param dependencies: the variables that each entry reads (see `template_variables`), None for unknown
+    :param changed: the changed variables (see `changed_variables`), None if everything should be considered changed
+    :return: the entries that may render differently given the changed variables
+    """
+    if changed is None:
+        return set(dependencies)
+    return {key for key, variables in dependencies.items() if variables is None or not changed.isdisjoint(variables)}
+
+
+def _digest(value: Any) -> Optional[str]:
+    try:
+        encoded = json.dumps(value, sort_keys=True)
+    except (TypeError, ValueError):  # not serializable or circular
+        return None
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
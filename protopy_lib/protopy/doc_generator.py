@@ -1,33 +1,26 @@
 import ast
 from numbers import Number
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, List, Optional, Tuple, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from protopy.proto_cache import ProtoCache
 
 
 def generate(protopy_module_path: Path, template_descriptor: Optional[str] = None,
-             command_prefix: str = "protopy") -> str:
+             command_prefix: str = "protopy", cache: Optional["ProtoCache"] = None) -> str:
     if not template_descriptor:
         template_descriptor = str(protopy_module_path.parent)
 
-    source = protopy_module_path.read_text()
-    source_tree: ast.Module = compile(source, "proto.py", "exec", ast.PyCF_ONLY_AST)
+    source = protopy_module_path.read_bytes()
+    doc_str, args = cache.arg_docs(source) if cache else extract(source)
 
+    # creating the description section
     doc = "Description:\n  "
-
-    # extracting the doc string and creating the description section
-    first_expr = next((expr for expr in source_tree.body if isinstance(expr, ast.Expr)), None)
-    doc_str = 'Not Given.'
-    if first_expr and isinstance(first_expr.value, ast.Str):
-        doc_str = first_expr.value.s.strip()
-
     doc += "  ".join(doc_str.splitlines())
 
-    # extracting the arguments
-    visitor = _ArgsVisitor()
-    visitor.visit(source_tree)
-
     # creating the usage section
-    positional_args = sorted((it for it in visitor.args if it.position is not None), key=lambda it: it.position)
+    positional_args = sorted((it for it in args if it.position is not None), key=lambda it: it.position)
     usage = f"{command_prefix} {template_descriptor} "
     depth = 0
     for i, pa in enumerate(positional_args):
@@ -47,13 +40,33 @@ def generate(protopy_module_path: Path, template_descriptor: Optional[str] = Non
 
     # creating the arguments section
     doc += f"\n\nArguments:"
-    max_len = max(len(a.arg_name) for a in visitor.args)
-    for arg in visitor.args:
+    max_len = max(len(a.arg_name) for a in args)
+    for arg in args:
         doc += f"\n  {arg.doc(max_len)}"
 
     return doc
 
 
+def extract(source: Union[bytes, str]) -> Tuple[str, List["_ArgDoc"]]:
+    """
+    :param source: the source of a proto.py file
+    :return: the template description (the module doc string) and the documentation of the arguments it uses
+    """
+    source_tree: ast.Module = compile(source, "proto.py", "exec", ast.PyCF_ONLY_AST)
+
+    # extracting the doc string
+    first_expr = next((expr for expr in source_tree.body if isinstance(expr, ast.Expr)), None)
+    doc_str = 'Not Given.'
+    if first_expr and isinstance(first_expr.value, ast.Str):
+        doc_str = first_expr.value.s.strip()
+
+    # extracting the arguments
+    visitor = _ArgsVisitor()
+    visitor.visit(source_tree)
+
+    return doc_str, visitor.args
+
+
 class _ArgDoc:
     def __init__(self, arg_name: str, default_value: Any, prompt: str, choices: Optional[List[str]],
                  position: Optional[int]):
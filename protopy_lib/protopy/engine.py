@@ -1,8 +1,14 @@
-import importlib.util
+import asyncio
+import locale
+import os
 import shutil
-from pathlib import Path
-from types import ModuleType
-from typing import Union, Set, Optional, List, Any, Dict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Executor, CancelledError
+from contextlib import contextmanager
+from pathlib import Path, PurePath
+from types import ModuleType, CodeType
+from typing import Union, Optional, List, Any, Dict, Iterable, Iterator, Callable, Set, ContextManager, TYPE_CHECKING
 
 import sys
 from cleo.io.inputs.argv_input import ArgvInput
@@ -11,24 +17,82 @@ from cleo.io.outputs.stream_output import StreamOutput
 from cleo.ui.choice_question import ChoiceQuestion
 from cleo.ui.confirmation_question import ConfirmationQuestion
 from cleo.ui.question import Question
-from jinja2 import FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, Template
 from jinja2.sandbox import SandboxedEnvironment
-from distutils.dir_util import copy_tree
+
+from protopy.batch import RenderJob, RenderResult, render_in_processes
+from protopy.copier import CopyStrategy
+from protopy.ignore import IgnoreMatcher, IGNORE_FILE
+from protopy.instrumentation import EngineObserver
+from protopy.literals import LiteralIndex, is_literal, literal_output, TEMPLATE, VERBATIM
+from protopy.proto_cache import ProtoCache
+from protopy.render_plan import RenderPlan, RenderOperation, RenderAction
+from protopy.sinks import OutputSink, DirectorySink, as_sink
+from protopy.template_cache import TemplateCache
+from protopy.zip_template import TemplatePath, ZipTemplatePath
+
+if TYPE_CHECKING:
+    from protopy.watch import WatchCycle
+
+
+# the encoding of rendered files
+_ENCODING = locale.getpreferredencoding(False)
+
+
+class PromptRequiredError(RuntimeError):
+    """
+    raised when a template that is rendered with `fail_on_prompt` asks for a value that was not given in its arguments
+    """
+
+    def __init__(self, argument: str):
+        super().__init__(f"the template requires a value for: {argument}")
+        self.argument = argument
+
+    def __reduce__(self):
+        return PromptRequiredError, (self.argument,)
 
 
 class ProtopyEngine:
 
-    def __init__(self, io: Optional[IO] = None):
+    def __init__(self, io: Optional[IO] = None, *, template_cache: Optional[TemplateCache] = None,
+                 proto_cache: Optional[ProtoCache] = None, trusted: bool = False):
+        """
+        :param io: (optional) the io to interact with the user through, defaults to the standard streams
+        :param template_cache: (optional) a cache of compiled templates to use, may be shared between engines
+        :param proto_cache: (optional) a cache of compiled proto.py files (and their documentation) to use, may be
+                            shared between engines, defaults to an in-memory cache owned by this engine
+        :param trusted: if True, templates are rendered without the jinja sandbox (which intercepts every attribute
+                        access and call), this is faster but must only be used with templates that are trusted
+        """
         if io:
             self._io = io
         else:
             input = ArgvInput()
             input.set_stream(sys.stdin)
             self._io = io or IO(input, StreamOutput(sys.stdout), StreamOutput(sys.stderr))
-        self._jinja = SandboxedEnvironment(loader=FileSystemLoader("/"))
+        self._observers: List[EngineObserver] = []
+        self.trusted = trusted
+        environment_type = _TrustedEnvironment if trusted else _ObservedEnvironment
+        self._jinja = environment_type(self._observers, loader=FileSystemLoader("/"))
+        self._template_cache = template_cache
+        self._zip_templates = TemplateCache()
+        self._proto_cache = proto_cache or ProtoCache()
+
+    def add_observer(self, observer: EngineObserver):
+        """
+        registers an observer that will receive the instrumentation events of this engine (see `EngineObserver`)
+        :param observer: the observer to add
+        """
+        self._observers.append(observer)
+
+    def remove_observer(self, observer: EngineObserver):
+        """
+        :param observer: a previously added observer to remove
+        """
+        self._observers.remove(observer)
 
     def render_doc(
-            self, template_dir: Union[Path, str],
+            self, template_dir: Union[TemplatePath, str],
             template_descriptor: Optional[str] = None,
             command_prefix: str = "protopy") -> str:
 
@@ -41,141 +105,673 @@ class ProtopyEngine:
         """
 
         import protopy.doc_generator as dg
-        return dg.generate(Path(template_dir), template_descriptor, command_prefix)
+        return dg.generate(
+            _as_template_path(template_dir) / "proto.py", template_descriptor, command_prefix, self._proto_cache)
+
+    def load_template(self, template_dir: Union[TemplatePath, str], *,
+                      excluded_files: Optional[List[Path]] = None,
+                      templates: Optional[TemplateCache] = None) -> "LoadedTemplate":
 
-    def render(self, template_dir: Union[Path, str], target_dir: Union[Path, str],
+        """
+        loads and indexes the given template so that it can be rendered many times (see `render_many`) without
+        re-reading its proto.py and ignore files
+
+        :param template_dir: the directory holding the template
+        :param excluded_files:  list of path objects that represents files in the template directory that should be
+                                excluded from the generation process
+        :param templates: (optional) a cache of compiled templates to keep with the loaded template, used (instead of
+                          the engine's cache) whenever the loaded template is rendered
+        :return: the loaded template
+        """
+
+        with self._phase("load"):
+            template_dir = _as_template_path(template_dir)
+            excluded_files = [*(excluded_files or []), template_dir / "proto.py", template_dir / "__pycache__"]
+            ignore = IgnoreMatcher.for_template(template_dir, excluded_files)
+
+            proto_file = template_dir / "proto.py"
+            try:
+                proto_code = self._proto_cache.compile(proto_file.read_bytes(), str(proto_file))
+            except Exception as e:
+                raise RuntimeError(f"Error while evaluating: {proto_file}") from e
+
+            return LoadedTemplate(template_dir, proto_code, ignore, templates)
+
+    def compile_template(self, template_dir: Union[TemplatePath, str], output: Union[Path, str], *,
+                         excluded_files: Optional[List[Path]] = None) -> int:
+        """
+        compiles the names and the `.tmpl` files of the given template ahead of time into a zip of python modules,
+        the compiled templates can then be rendered without parsing them by passing `CompiledTemplates(output)` as
+        the templates of a render (see `protopy.compiled`). templates are compiled for the mode of this engine
+        (trusted or sandboxed) and can only be used by engines of the same mode.
+
+        :param template_dir: the directory holding the template
+        :param output: the zip file to write
+        :param excluded_files:  list of path objects that represents files in the template directory that should be
+                                excluded from the compilation
+        :return: the number of compiled templates
+        """
+        from protopy.compiled import write_compiled
+
+        template = self.load_template(template_dir, excluded_files=excluded_files)
+        return write_compiled(self._jinja, template.template_dir, template.ignore, output)
+
+    def render(self, template_dir: Union[TemplatePath, str], target_dir: Union[Path, str, OutputSink],
                args: List[str], kwargs: Dict[str, str], extra_context: Dict[str, Any], *,
-               excluded_files: Optional[List[Path]] = None, allow_overwrite: bool = False):
+               excluded_files: Optional[List[Path]] = None, allow_overwrite: bool = False,
+               max_workers: Optional[int] = None, copy_strategy: Union[CopyStrategy, str] = CopyStrategy.COPY,
+               templates: Optional[TemplateCache] = None):
 
         """
         renders the given template into the target directory
 
         :param template_dir: the directory holding the template
-        :param target_dir: the directory to output the generated content into
+        :param target_dir: the directory (or sink, see `protopy.sinks`) to output the generated content into
         :param args: positional arguments for the template
         :param kwargs: named arguments for the template
         :param extra_context: extra variables that will be available inside proto.py
         :param excluded_files:  list of path objects that represents files in the template directory that should be
                                 excluded from the generation process
         :param allow_overwrite: if True, files that are already exists will be overridden by the template
+        :param max_workers: (optional) if given and larger than 1, files will be emitted concurrently using a pool of
+                            at most this many threads
+        :param copy_strategy: (optional) how files that are not templates are copied into the target directory (one of
+                              'copy', 'reflink', 'hardlink' or 'symlink', see `CopyStrategy`), ignored if the target is
+                              a sink (the sink's own strategy is used)
+        :param templates: (optional) the compiled templates to use for this render instead of the engine's cache
+                          (e.g., `CompiledTemplates`)
         """
 
-        template_dir = (template_dir if isinstance(template_dir, Path) else Path(template_dir)).absolute()
-        target_dir = (target_dir if isinstance(target_dir, Path) else Path(target_dir)).absolute()
-        excluded_files = [*(excluded_files or []), template_dir / "proto.py", template_dir / "__pycache__"]
+        template = self.load_template(template_dir, excluded_files=excluded_files)
+        options = _RenderOptions(allow_overwrite, max_workers, templates or self._template_cache,
+                                 copy_strategy=copy_strategy)
+        self._render_loaded(template, RenderJob(target_dir, args, kwargs, extra_context), options)
 
-        target_dir.mkdir(exist_ok=True)
+    async def arender(self, template_dir: Union[TemplatePath, str], target_dir: Union[Path, str, OutputSink],
+                      args: List[str], kwargs: Dict[str, str], extra_context: Dict[str, Any], *,
+                      excluded_files: Optional[List[Path]] = None, allow_overwrite: bool = False,
+                      max_workers: Optional[int] = None, copy_strategy: Union[CopyStrategy, str] = CopyStrategy.COPY,
+                      limit: Optional[asyncio.Semaphore] = None, executor: Optional[Executor] = None):
 
-        ui = _UserInteractor(self._io, args, kwargs)
-        module = self._load_proto(template_dir.joinpath("proto.py"), ui,
-                                  {**extra_context, "args": args, "kwargs": kwargs})
+        """
+        asyncio version of `render`, all the blocking work (including the evaluation of proto.py) is done in the given
+        executor so that many renders can be in flight without blocking the event loop.
 
-        context = {k: v for k, v in vars(module).items() if not k.startswith("_")}
+        if the calling task is cancelled, the rendering stops before emitting its next file and the cancellation is
+        propagated once it stopped (files that were already emitted are not removed).
 
-        ignored_files = set(self._load_ignored_files_list(template_dir))
-        ignored_files.update(p.absolute() for p in excluded_files)
+        :param template_dir: the directory holding the template
+        :param target_dir: the directory (or sink, see `protopy.sinks`) to output the generated content into
+        :param args: positional arguments for the template
+        :param kwargs: named arguments for the template
+        :param extra_context: extra variables that will be available inside proto.py
+        :param excluded_files:  list of path objects that represents files in the template directory that should be
+                                excluded from the generation process
+        :param allow_overwrite: if True, files that are already exists will be overridden by the template
+        :param max_workers: (optional) if given and larger than 1, files will be emitted concurrently using a pool of
+                            at most this many threads
+        :param copy_strategy: (optional) how files that are not templates are copied into the target directory (one of
+                              'copy', 'reflink', 'hardlink' or 'symlink', see `CopyStrategy`), ignored if the target is
+                              a sink (the sink's own strategy is used)
+        :param limit: (optional) a semaphore to acquire for the duration of the rendering, can be shared between
+                      calls in order to limit the number of concurrent renders
+        :param executor: (optional) the executor to perform the rendering in, defaults to the loop's default executor
+        """
 
-        if not allow_overwrite:
-            self._check_override(template_dir, target_dir, context, ignored_files)
+        if limit is not None:
+            await limit.acquire()
 
-        self._render(template_dir, target_dir, context, ignored_files)
+        try:
+            cancelled = threading.Event()
+            options = _RenderOptions(allow_overwrite, max_workers, self._template_cache, cancelled, copy_strategy)
+            job = RenderJob(target_dir, args, kwargs, extra_context)
+
+            def render():
+                template = self.load_template(template_dir, excluded_files=excluded_files)
+                self._render_loaded(template, job, options)
+
+            future = asyncio.get_event_loop().run_in_executor(executor, render)
+            try:
+                await asyncio.shield(future)
+            except asyncio.CancelledError:
+                cancelled.set()
+                await asyncio.wait([future])
+                future.exception()  # the cancellation takes precedence over the error of the stopped rendering
+                raise
+        finally:
+            if limit is not None:
+                limit.release()
+
+    def render_many(self, template: Union[TemplatePath, str, "LoadedTemplate"],
+                    jobs: Iterable[Union[RenderJob, tuple]], *,
+                    excluded_files: Optional[List[Path]] = None, allow_overwrite: bool = False,
+                    max_workers: Optional[int] = None, processes: Optional[int] = None,
+                    copy_strategy: Union[CopyStrategy, str] = CopyStrategy.COPY, io: Optional[IO] = None,
+                    fail_on_prompt: bool = False,
+                    proto_scope: Optional[Callable[[], ContextManager]] = None) -> Iterator[RenderResult]:
 
-        if hasattr(module, "post_generation") and callable(module.post_generation):
-            module.post_generation()
+        """
+        renders the given template once per job, the template is loaded, indexed and compiled only once and shared
+        between all the jobs. jobs are consumed lazily and their results are streamed back as they complete, a failing
+        job does not stop the rendering of the jobs that follow it.
 
-    def _check_override(self, template_dir: Path, target_dir: Path, context: dict, ignored_files: Set[Path]):
+        :param template: the directory holding the template (or a template that was loaded using `load_template`)
+        :param jobs: the jobs to render, either `RenderJob` objects or (target_dir, args, kwargs) tuples
+        :param excluded_files:  list of path objects that represents files in the template directory that should be
+                                excluded from the generation process (ignored if the template is already loaded)
+        :param allow_overwrite: if True, files that are already exists will be overridden by the template
+        :param max_workers: (optional) if given and larger than 1, the files of each job will be emitted concurrently
+                            using a pool of at most this many threads
+        :param processes: (optional) if given, the jobs will be rendered by a pool of this many worker processes, each
+                          loads the template once. inside the workers, the template is evaluated non-interactively, its
+                          messages are discarded and the results do not include the executed plans
+        :param copy_strategy: (optional) how files that are not templates are copied into the target directories (one of
+                              'copy', 'reflink', 'hardlink' or 'symlink', see `CopyStrategy`), ignored if the target is
+                              a sink (the sink's own strategy is used)
+        :param io: (optional) the io to interact with the user through while rendering these jobs, defaults to the
+                   engine's io (ignored when rendering using multiple processes)
+        :param fail_on_prompt: if True, a job whose template asks for a value that was not given in the job's arguments
+                               fails with `PromptRequiredError` instead of prompting the user
+        :param proto_scope: (optional) creates a context manager that the evaluation of proto.py and its
+                            `post_generation` run in (e.g., one that switches the working directory), the rest of the
+                            rendering runs outside of it (ignored when rendering using multiple processes)
+        :return: an iterator over the results of the jobs (in the order of the given jobs)
+        """
 
-        jinja = self._jinja
+        # loaded here even when the jobs are rendered by worker processes, so that a template that cannot be loaded
+        # (e.g., its proto.py does not compile) fails once instead of failing every worker
+        if not isinstance(template, LoadedTemplate):
+            template = self.load_template(template, excluded_files=excluded_files)
+
+        if processes:
+            yield from render_in_processes(
+                template.template_dir, list(template.ignore.excluded), jobs, processes, allow_overwrite, max_workers,
+                copy_strategy, fail_on_prompt, self.trusted)
+            return
+
+        options = _RenderOptions(
+            allow_overwrite, max_workers, template.templates or self._template_cache or TemplateCache(),
+            copy_strategy=copy_strategy, io=io, fail_on_prompt=fail_on_prompt, proto_scope=proto_scope)
+        for job in jobs:
+            job = RenderJob.of(job)
+            try:
+                plan = self._render_loaded(template, job, options)
+                yield RenderResult(job, plan)
+            except Exception as e:
+                yield RenderResult(job, None, e)
+
+    def create_plan(self, template_dir: Union[TemplatePath, str], target_dir: Union[Path, str, OutputSink],
+                    context: Dict[str, Any], *, excluded_files: Optional[List[Path]] = None) -> RenderPlan:
 
-        for template_child in template_dir.iterdir():
-            if template_child in ignored_files:
-                continue
+        """
+        computes the operations required in order to render the given template into the target directory, the
+        resulted plan can be inspected and then executed using `execute_plan`
 
-            name = jinja.from_string(template_child.name).render(context)
+        :param template_dir: the directory holding the template
+        :param target_dir: the directory (or sink, see `protopy.sinks`) to output the generated content into
+        :param context: the variables to render the template with (usually, the variables defined by proto.py)
+        :param excluded_files:  list of path objects that represents files in the template directory that should be
+                                excluded from the generation process
+        :return: the render plan
+        """
 
-            if not name:  # empty names indicate unneeded files
-                continue
+        template = self.load_template(template_dir, excluded_files=excluded_files)
+        options = _RenderOptions(templates=self._template_cache)
+        return self._create_plan(template, as_sink(target_dir), context, options)
 
-            target_child = (target_dir / name).resolve()
+    def execute_plan(self, plan: RenderPlan, context: Dict[str, Any], *, allow_overwrite: bool = False,
+                     max_workers: Optional[int] = None, sink: Optional[OutputSink] = None):
+        """
+        executes the given render plan
 
-            if not target_child.parent.exists():
-                return
+        :param plan: the plan to execute (see `create_plan`)
+        :param context: the variables to render the template files with, should be the same context that was used
+                        in order to create the plan
+        :param allow_overwrite: if True, files that are already exists will be overridden by the template
+        :param max_workers: (optional) if given and larger than 1, files will be emitted concurrently using a pool of
+                            at most this many threads, the result is identical to the sequential emission and
+                            if some files failed, the error of the first of them (in plan order) is raised
+        :param sink: (optional) the sink to write the rendered content into, must be the same type of sink that was
+                     used in order to create the plan, defaults to the target directory of the plan
+        """
 
-            if template_child.is_dir():
-                if template_child.exists():
-                    self._check_override(template_child, target_child, context, ignored_files)
-            else:
-                if target_child.suffix == '.tmpl':
-                    target_child = target_child.with_suffix('')
+        options = _RenderOptions(allow_overwrite, max_workers, self._template_cache)
+        sink = sink or DirectorySink(plan.target_dir)
+        try:
+            self._execute_plan(plan, context, sink, options)
+        except BaseException:
+            sink.abort()
+            raise
+        sink.complete()
+
+    def watch(self, template_dir: Union[Path, str], target_dir: Union[Path, str], args: List[str],
+              kwargs: Dict[str, str], extra_context: Dict[str, Any], *, on_cycle: Callable[["WatchCycle"], None],
+              allow_overwrite: bool = False, copy_strategy: Union[CopyStrategy, str] = CopyStrategy.COPY,
+              stop: Optional[threading.Event] = None, poll_interval: float = 0.25):
+        """
+        renders the given template into the target directory and then renders it again whenever its files change,
+        until stopped. the engine is kept warm between the renders: only the changed files are rendered again (using
+        the compiled templates of the previous renders), the template tree is only walked again when entries are
+        added, removed or renamed and proto.py is only evaluated again when it changes (values that the user was
+        prompted for are reused). an error (e.g., a template that is in the middle of being edited) is reported
+        through its cycle, the files that failed are retried on the next change.
+
+        :param template_dir: the (local) directory holding the template
+        :param target_dir: the directory to output the generated content into
+        :param args: positional arguments for the template
+        :param kwargs: named arguments for the template
+        :param extra_context: extra variables that will be available inside proto.py
+        :param on_cycle: called with the outcome (see `protopy.watch.WatchCycle`) of each render, starting with the
+                         initial one
+        :param allow_overwrite: if True, files that are already exists will be overridden by the template
+        :param copy_strategy: (optional) how files that are not templates are copied into the target directory
+        :param stop: (optional) an event that stops the watch once set
+        :param poll_interval: the time in seconds between scans of the template, if inotify is not available
+        """
+        from protopy.watch import TemplateWatcher, EVERYTHING
+
+        session = _WatchSession(self, _as_path(template_dir), DirectorySink(target_dir, copy_strategy), args, kwargs,
+                                extra_context, _RenderOptions(allow_overwrite, templates=TemplateCache()))
+
+        # the watch starts before the initial render, so changes made while rendering are not missed
+        with TemplateWatcher(template_dir, poll_interval) as watcher:
+            changes = {EVERYTHING}
+            while not (stop is not None and stop.is_set()):
+                if changes:
+                    on_cycle(session.cycle(changes))
+                changes = watcher.wait(timeout=0.5 if stop is not None else None)
+
+    def _render_loaded(self, template: "LoadedTemplate", job: RenderJob, options: "_RenderOptions") -> RenderPlan:
+
+        sink = as_sink(job.target_dir, options.copy_strategy)
+        options.literals = template.literals
+
+        ui = _UserInteractor(options.io or self._io, job.args, job.kwargs, options.fail_on_prompt)
+        with self._phase("proto"), options.proto_scope():
+            module = self._load_proto(template, ui, {**job.extra_context, "args": job.args, "kwargs": job.kwargs})
+
+        context = {k: v for k, v in vars(module).items() if not k.startswith("_")}
 
-                if target_child.exists():
-                    raise IOError(f"file already exists: {target_child}")
+        try:
+            with self._phase("plan"):
+                plan = self._create_plan(template, sink, context, options)
+            with self._phase("execute"):
+                self._execute_plan(plan, context, sink, options)
+
+            if hasattr(module, "post_generation") and callable(module.post_generation):
+                with self._phase("post_generation"), options.proto_scope():
+                    module.post_generation()
+        except BaseException:
+            sink.abort()
+            raise
+        sink.complete()
+
+        self._report_caches(options)
+        return plan
+
+    @contextmanager
+    def _phase(self, phase: str):
+        if not self._observers:
+            yield
+            return
+
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        for observer in self._observers:
+            observer.on_phase(phase, seconds)
+
+    def _report_caches(self, options: "_RenderOptions"):
+        caches = {"templates": options.templates, "proto": self._proto_cache}
+        for observer in self._observers:
+            for name, cache in caches.items():
+                if cache is not None:
+                    observer.on_cache(name, cache.hits, cache.misses)
+
+    def _create_plan(self, template: "LoadedTemplate", sink: OutputSink, context: Dict[str, Any],
+                     options: "_RenderOptions") -> RenderPlan:
+
+        sink.prepare(template.template_dir, context)
+        operations = []
+        self._plan(template.template_dir, sink.root, context, template.ignore, sink, options.templates,
+                   operations)
+        return RenderPlan(template.template_dir, sink.root, operations)
+
+    def _execute_plan(self, plan: RenderPlan, context: Dict[str, Any], sink: OutputSink, options: "_RenderOptions"):
+
+        if not options.allow_overwrite:
+            existing = next(plan.existing_targets(sink.exists), None)
+            if existing:
+                raise IOError(f"file already exists: {existing}")
+
+        # directories are created upfront (in plan order) so that files can be emitted in any order
+        sink.mkdir(plan.target_dir)
+        created_dirs = {plan.target_dir}
+        file_ops = []
+        for op in plan:
+            target_dir = op.target if op.action == RenderAction.MKDIR else op.target.parent
+            if target_dir not in created_dirs:
+                sink.mkdir(target_dir)
+                created_dirs.add(target_dir)
+
+            if op.action != RenderAction.MKDIR:
+                file_ops.append(op)
+
+        max_workers = options.max_workers if sink.concurrent else None
+        if not max_workers or max_workers <= 1 or len(file_ops) <= 1:
+            for op in file_ops:
+                self._emit(op, context, sink, options)
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                futures = [pool.submit(self._emit, op, context, sink, options) for op in file_ops]
+
+            for future in futures:
+                future.result()
+
+        sink.finish(plan, context)
+
+    def _emit(self, op: RenderOperation, context: Dict[str, Any], sink: OutputSink, options: "_RenderOptions"):
+        if options.cancelled is not None and options.cancelled.is_set():
+            raise CancelledError("rendering was cancelled")
+
+        if op.action == RenderAction.RENDER and sink.is_current(op):
+            return
+
+        start = time.perf_counter() if self._observers else None
+        size = None
+        if op.action == RenderAction.PRESERVE:
+            sink.copy_tree(op.source, op.target, op.ignore)
+        elif op.action == RenderAction.RENDER:
+            kind, source = (options.literals or LiteralIndex()).classify(op.source, _ENCODING)
+            # the content is rendered before the target is opened, so that a template that fails to compile or to
+            # render (e.g., one that is in the middle of being edited in watch mode) does not truncate its target
+            if kind == TEMPLATE:
+                content = self._file_template(op.source, options.templates).render(context).encode(_ENCODING)
+            elif kind == VERBATIM:
+                content = source.encode(_ENCODING) if source is not None else op.source.read_bytes()
+            else:
+                content = literal_output(source if source is not None else op.source.read_text(
+                    encoding="utf-8")).encode(_ENCODING)
+            with sink.open(op.target) as f:
+                f.write(content)
+            size = len(content)
+        else:
+            sink.copy_file(op.source, op.target)
+            size = op.source.stat().st_size if start is not None else None
 
-    def _render(self, template_dir: Path, target_dir: Path, context: dict, ignored_files: Set[Path]):
+        if start is not None:
+            seconds = time.perf_counter() - start
+            for observer in self._observers:
+                observer.on_file(op.action, op.source, op.target, seconds, size)
 
-        jinja = self._jinja
+    def _plan(self, template_dir: TemplatePath, target_dir: PurePath, context: dict,
+              ignore: IgnoreMatcher, sink: OutputSink, templates: Optional[TemplateCache],
+              operations: List[RenderOperation]):
 
         for template_child in template_dir.iterdir():
-            if template_child in ignored_files:
+            is_dir = template_child.is_dir()
+            if ignore.ignores(template_child.name, is_dir):
                 continue
 
-            name = jinja.from_string(template_child.name).render(context)
+            name = sink.render_name(template_child, lambda: self._render_name(template_child.name, context, templates))
 
             if not name:  # empty names indicate unneeded files
                 continue
 
-            target_child = (target_dir / name).resolve()
-
-            if not target_child.parent.exists():
-                target_child.parent.mkdir(parents=True)
+            target_child = sink.resolve(target_dir / name)
 
-            if template_child.is_dir():
+            if is_dir:
+                child_ignore = ignore.enter(template_child)
                 if (template_child / ".protopypreserve").exists():
-                    copy_tree(str(template_child.absolute()), str(target_child.absolute()))
-                    return
-
-                target_child.mkdir(exist_ok=True)
-                self._render(template_child, target_child, context, ignored_files)
+                    operations.append(
+                        RenderOperation(RenderAction.PRESERVE, template_child, target_child, child_ignore))
+                else:
+                    operations.append(RenderOperation(RenderAction.MKDIR, template_child, target_child))
+                    self._plan(template_child, target_child, context, child_ignore, sink, templates, operations)
             elif target_child.suffix == ".tmpl":
-                with target_child.with_suffix("").open("w") as f:
-                    jinja.get_template(str(template_child)).stream(context).dump(f)
+                operations.append(RenderOperation(RenderAction.RENDER, template_child, target_child.with_suffix("")))
             else:
-                shutil.copy(template_child, target_child)
-
-    def _load_ignored_files_list(self, template_root: Path):
-        result = []
-        pi_file = template_root.joinpath(".protopyignore")
-
-        if pi_file.exists():
-            lines = pi_file.read_text().splitlines()
-            result = [f.absolute() for line in lines if line.strip() for f in template_root.glob(line)]
-
-        for sub_dir in template_root.iterdir():
-            if sub_dir.is_dir():
-                result.extend(self._load_ignored_files_list(sub_dir))
-
-        return result
-
-    def _load_proto(self, proto_file: Path, ui: "_UserInteractor", context: dict):
+                operations.append(RenderOperation(RenderAction.COPY, template_child, target_child))
+
+    def _render_name(self, name: str, context: Dict[str, Any], templates: Optional[TemplateCache]) -> str:
+        if is_literal(name):  # most names are plain, they are used as is
+            return name
+        return self._name_template(name, templates).render(context)
+
+    def _name_template(self, name: str, templates: Optional[TemplateCache]) -> Template:
+        if templates:
+            return templates.name_template(self._jinja, name)
+        return self._jinja.from_string(name)
+
+    def _file_template(self, path: TemplatePath, templates: Optional[TemplateCache]) -> Template:
+        if templates:
+            return templates.file_template(self._jinja, path)
+        if isinstance(path, ZipTemplatePath):  # jinja's loaders (and their caches) can only read from the file system
+            return self._zip_templates.file_template(self._jinja, path)
+        return self._jinja.get_template(str(path))
+
+    def _load_proto(self, template: "LoadedTemplate", ui: "_UserInteractor", context: dict):
+        proto_file = template.template_dir / "proto.py"
         try:
-            spec = importlib.util.spec_from_file_location("__PROTO__", proto_file)
-            module = importlib.util.module_from_spec(spec)
+            module = ModuleType("__PROTO__")
+            module.__file__ = str(proto_file)
 
             ui.install(module)
             for k, v in context.items():
                 setattr(module, k, v)
 
-            spec.loader.exec_module(module)
+            exec(template.proto_code, vars(module))
             return module
+        except PromptRequiredError:
+            raise
         except Exception as e:
             raise RuntimeError(f"Error while evaluating: {proto_file}") from e
 
 
+class _CompileObserver(Environment):
+    # reports the compilations of jinja templates to the observers of the engine
+
+    def __init__(self, observers: List[EngineObserver], **kwargs):
+        super().__init__(**kwargs)
+        self._observers = observers
+
+    def compile(self, source, name=None, filename=None, raw=False, defer_init=False):
+        if not self._observers:
+            return super().compile(source, name, filename, raw, defer_init)
+
+        start = time.perf_counter()
+        result = super().compile(source, name, filename, raw, defer_init)
+        seconds = time.perf_counter() - start
+        for observer in self._observers:
+            observer.on_compile(filename, seconds)
+        return result
+
+
+class _ObservedEnvironment(_CompileObserver, SandboxedEnvironment):
+    pass
+
+
+class _TrustedEnvironment(_CompileObserver):
+    pass
+
+
+class LoadedTemplate:
+    """
+    a template that was loaded by `ProtopyEngine.load_template`, can be rendered many times
+    """
+
+    def __init__(self, template_dir: TemplatePath, proto_code: CodeType, ignore: IgnoreMatcher,
+                 templates: Optional[TemplateCache] = None):
+        self.template_dir = template_dir
+        self.proto_code = proto_code
+        self.ignore = ignore
+        self.templates = templates
+        self.literals = LiteralIndex()
+
+
+class _WatchSession:
+    # the state that a watched template keeps between its renders (see `ProtopyEngine.watch`)
+
+    def __init__(self, engine: ProtopyEngine, template_dir: Path, sink: OutputSink, args: List[str],
+                 kwargs: Dict[str, str], extra_context: Dict[str, Any], options: "_RenderOptions"):
+        self._engine = engine
+        self._template_dir = template_dir
+        self._sink = sink
+        self._args = args
+        self._kwargs = kwargs
+        self._answers = dict(kwargs)
+        self._extra_context = extra_context
+        self._options = options
+
+        self._template: Optional[LoadedTemplate] = None
+        self._context: Dict[str, Any] = {}
+        self._plan: Optional[RenderPlan] = None
+        self._sources: Dict[str, RenderOperation] = {}
+        self._pending: Set[str] = set()  # changes of cycles that failed, retried by the next cycle
+
+    def cycle(self, changes: Set[str]) -> "WatchCycle":
+        from protopy.watch import WatchCycle
+
+        changes = changes | self._pending
+        cycle = WatchCycle(changes)
+        start = time.perf_counter()
+        try:
+            self._render(changes, cycle)
+            self._pending.clear()
+        except Exception as e:
+            cycle.error = e
+            self._pending = changes
+        cycle.seconds = time.perf_counter() - start
+        return cycle
+
+    def _render(self, changes: Set[str], cycle: "WatchCycle"):
+        from protopy.watch import EVERYTHING
+
+        evaluate = self._plan is None or EVERYTHING in changes or "proto.py" in changes
+        reload = evaluate or any(change.rsplit("/", 1)[-1] == IGNORE_FILE for change in changes)
+
+        template, context = self._template, self._context
+        if reload:
+            template = self._engine.load_template(self._template_dir, templates=self._options.templates)
+            self._options.literals = template.literals
+        if evaluate:
+            ui = _UserInteractor(self._engine._io, self._args, self._answers)
+            module = self._engine._load_proto(
+                template, ui, {**self._extra_context, "args": self._args, "kwargs": self._kwargs})
+            self._answers.update(ui.answers)
+            context = {k: v for k, v in vars(module).items() if not k.startswith("_")}
+            cycle.proto = True
+
+        ops = None if reload else self._changed_operations(template, changes)
+        plan = self._plan
+        if ops is None:  # the tree has to be walked again
+            plan = self._engine._create_plan(template, self._sink, context, self._options)
+            cycle.planned = True
+
+            previous = {op.target for op in self._plan} if self._plan is not None else set()
+            ops = [op for op in plan
+                   if evaluate or op.target not in previous or self._operation_source(op, changes) is not None]
+
+            if not self._options.allow_overwrite:
+                new_ops = [op for op in ops if op.target not in previous]
+                existing = next(RenderPlan(plan.template_dir, plan.target_dir, new_ops).existing_targets(
+                    self._sink.exists), None)
+                if existing:
+                    raise IOError(f"file already exists: {existing}")
+
+        self._sink.mkdir(plan.target_dir)
+        for op in ops:
+            self._sink.mkdir(op.target if op.action == RenderAction.MKDIR else op.target.parent)
+            if op.action != RenderAction.MKDIR:
+                self._engine._emit(op, context, self._sink, self._options)
+                cycle.rendered.append(Path(os.path.relpath(str(op.target), str(plan.target_dir))).as_posix())
+
+        self._template, self._context, self._plan = template, context, plan
+        self._sources = {op.source.relative_to(self._template_dir).as_posix(): op for op in plan}
+
+    def _changed_operations(self, template: LoadedTemplate,
+                            changes: Set[str]) -> Optional[List[RenderOperation]]:
+        # the operations to execute again given the changed files, None if the tree should be walked again (e.g.,
+        # since files were added or removed)
+        ops = {}
+        for change in changes:
+            op = self._sources.get(change) or self._preserving(change)
+            if op is None:
+                if self._ignored(template, change):
+                    continue
+                return None
+            if not (self._template_dir / change).exists():
+                return None
+            if op.action != RenderAction.MKDIR:  # the content of a directory is reported by its own changes
+                ops[op.target] = op
+        return list(ops.values())
+
+    def _operation_source(self, op: RenderOperation, changes: Set[str]) -> Optional[str]:
+        source = op.source.relative_to(self._template_dir).as_posix()
+        if source in changes:
+            return source
+        if op.action == RenderAction.PRESERVE:
+            return next((change for change in changes if change.startswith(source + "/")), None)
+        return None
+
+    def _preserving(self, change: str) -> Optional[RenderOperation]:
+        # the operation of the preserved directory that holds the given file, if any
+        parts = change.split("/")
+        for i in range(len(parts) - 1, 0, -1):
+            op = self._sources.get("/".join(parts[:i]))
+            if op is not None:
+                return op if op.action == RenderAction.PRESERVE else None
+        return None
+
+    def _ignored(self, template: LoadedTemplate, change: str) -> bool:
+        matcher, path = template.ignore, self._template_dir
+        parts = change.split("/")
+        for i, part in enumerate(parts):
+            path = path / part
+            is_last = i == len(parts) - 1
+            if matcher.ignores(part, not is_last or path.is_dir()):
+                return True
+            if not is_last:
+                matcher = matcher.enter(path)
+        return False
+
+
+class _RenderOptions:
+    def __init__(self, allow_overwrite: bool = False, max_workers: Optional[int] = None,
+                 templates: Optional[TemplateCache] = None, cancelled: Optional[threading.Event] = None,
+                 copy_strategy: Union[CopyStrategy, str] = CopyStrategy.COPY, io: Optional[IO] = None,
+                 fail_on_prompt: bool = False, proto_scope: Optional[Callable[[], ContextManager]] = None):
+        self.allow_overwrite = allow_overwrite
+        self.max_workers = max_workers
+        self.templates = templates
+        self.cancelled = cancelled
+        self.copy_strategy = CopyStrategy.of(copy_strategy)
+        self.io = io
+        self.fail_on_prompt = fail_on_prompt
+        self.proto_scope = proto_scope or _unscoped
+        self.literals: Optional[LiteralIndex] = None
+
+
+@contextmanager
+def _unscoped():
+    yield
+
+
+def _as_path(path: Union[Path, str]) -> Path:
+    return (path if isinstance(path, Path) else Path(path)).absolute()
+
+
+def _as_template_path(path: Union[TemplatePath, str]) -> TemplatePath:
+    return path if isinstance(path, ZipTemplatePath) else _as_path(path)
+
+
 class _UserInteractor:
-    def __init__(self, io: IO, args: list, kwargs: dict):
+    def __init__(self, io: IO, args: list, kwargs: dict, fail_on_prompt: bool = False):
         self._args = args or []
         self._kwargs = kwargs
         self._io = io
+        self._fail_on_prompt = fail_on_prompt
+        self.answers: Dict[str, str] = {}  # the values that the user was prompted for, by their argument name
 
     def _pre_answered(self, named_arg: str, positional_arg: int) -> Optional[str]:
         if named_arg in self._kwargs:
@@ -210,10 +806,14 @@ class _UserInteractor:
         pre_answered = self._pre_answered(named_arg, positional_arg)
         if pre_answered:
             return pre_answered.lower() in ('y', 'yes', 'true')
+        if self._fail_on_prompt:
+            raise PromptRequiredError(named_arg)
 
         q = ConfirmationQuestion(prompt, default)
         r = q.ask(self._io)
-        return r if isinstance(r, bool) else r.lower() in ('y', 'yes')
+        r = r if isinstance(r, bool) else r.lower() in ('y', 'yes')
+        self.answers[named_arg] = "yes" if r else "no"
+        return r
 
     def arg(self, named_arg: str, *, doc: str = "", default: str = "", positional_arg=-1):
         """
@@ -253,6 +853,8 @@ class _UserInteractor:
         pre_answered = self._pre_answered(named_arg, positional_arg)
         if pre_answered:
             return pre_answered
+        if self._fail_on_prompt:
+            raise PromptRequiredError(named_arg)
 
         if choices:
             q = ChoiceQuestion(prompt, choices, default or 0)
@@ -269,7 +871,9 @@ class _UserInteractor:
         if secret:
             q.hide(True)
 
-        return q.ask(self._io)
+        r = q.ask(self._io)
+        self.answers[named_arg] = r
+        return r
 
     def install(self, module: ModuleType):
         module.ask = self.ask
@@ -0,0 +1,203 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Tuple, Iterable, Set, Dict, Optional, Pattern
+
+from protopy.zip_template import TemplatePath
+
+# the name of the files that hold the ignore rules of their directory (and its sub directories)
+IGNORE_FILE = ".protopyignore"
+
+_CACHE_SIZE = 256
+
+
+class IgnoreRule:
+    """
+    a single compiled line of an ignore file, follows the semantics of .gitignore patterns
+    """
+
+    __slots__ = ("pattern", "negated", "dir_only", "_regex")
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.negated = pattern.startswith("!")
+        if self.negated:
+            pattern = pattern[1:]
+
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+
+        # patterns with a slash (other than a trailing one) are relative to the ignore file directory,
+        # others match at any depth
+        anchored = "/" in pattern
+        self._regex: Pattern = re.compile(("" if anchored else "(?:.*/)?") + _translate(pattern.lstrip("/")))
+
+    def matches(self, relative_path: str, is_dir: bool) -> bool:
+        """
+        :param relative_path: posix path, relative to the directory of the ignore file
+        :param is_dir: True if the path denotes a directory
+        :return: True if this rule matches the given path
+        """
+        return (is_dir or not self.dir_only) and self._regex.fullmatch(relative_path) is not None
+
+    def __repr__(self):
+        return f"IgnoreRule({self.pattern})"
+
+
+def parse_rules(text: str) -> Tuple[IgnoreRule, ...]:
+    """
+    :param text: the content of an ignore file
+    :return: the compiled rules of the given content, in order
+    """
+    rules = []
+    for line in text.splitlines():
+        line = re.sub(r"(?<!\\) +$", "", line)  # trailing spaces are ignored unless escaped
+        if line and not line.startswith("#"):
+            rules.append(IgnoreRule(line))
+    return tuple(rules)
+
+
+class IgnoreMatcher:
+    """
+    decides which entries of a template directory should be ignored, according to the .protopyignore files of the
+    directory and of its parents (a rule in a deeper ignore file takes precedence, and inside an ignore file, the last
+    matching rule wins) and to an explicit set of excluded paths.
+
+    ignore files are read lazily, only for the directories that are actually visited (so the content of ignored
+    directories is never scanned), the matchers of visited sub directories are kept so a template that is rendered
+    many times reads its ignore files once.
+    """
+
+    def __init__(self, directory: TemplatePath, excluded: Set[TemplatePath],
+                 levels: Tuple[Tuple[Tuple[IgnoreRule, ...], str], ...] = ()):
+        """
+        :param directory: the directory whose entries this matcher decides about
+        :param excluded: (absolute) paths that are always ignored
+        :param levels: the rules of the parent directories, as (rules, path of directory relative to the rules) pairs
+        """
+        self.directory = directory
+        self.excluded = excluded
+        self._excluded_names = {p.name for p in excluded if p.parent == directory}
+
+        self._ignore_stamp = _stamp_of(directory / IGNORE_FILE)
+        rules = _load_rules(directory / IGNORE_FILE, self._ignore_stamp)
+        # deepest level first
+        self._levels = ((rules, ""), *levels) if rules else levels
+        self._children: Dict[str, "IgnoreMatcher"] = {}
+
+    @staticmethod
+    def for_template(template_dir: TemplatePath, excluded: Iterable[TemplatePath] = ()) -> "IgnoreMatcher":
+        """
+        :param template_dir: the template root directory
+        :param excluded: paths that should always be ignored
+        :return: a matcher for the entries of the template root directory
+        """
+        return IgnoreMatcher(template_dir, {p.absolute() for p in excluded})
+
+    def ignores(self, name: str, is_dir: bool) -> bool:
+        """
+        :param name: the name of an entry of this matcher's directory
+        :param is_dir: True if the entry is a directory
+        :return: True if the entry should be ignored
+        """
+        if name in self._excluded_names:
+            return True
+
+        for rules, prefix in self._levels:
+            relative_path = prefix + name
+            for rule in reversed(rules):
+                if rule.matches(relative_path, is_dir):
+                    return not rule.negated
+
+        return False
+
+    def enter(self, directory: TemplatePath) -> "IgnoreMatcher":
+        """
+        :param directory: a (not ignored) sub directory of this matcher's directory
+        :return: the matcher for the entries of the given directory
+        """
+        child = self._children.get(directory.name)
+        if child is None:
+            levels = tuple((rules, f"{prefix}{directory.name}/") for rules, prefix in self._levels)
+            child = self._children[directory.name] = IgnoreMatcher(directory, self.excluded, levels)
+        return child
+
+    def is_stale(self) -> bool:
+        """
+        :return: True if the ignore file of this matcher's directory, or of a sub directory that was entered through
+                 it, was modified, created or removed since the matcher was created
+        """
+        if _stamp_of(self.directory / IGNORE_FILE) != self._ignore_stamp:
+            return True
+        return any(child.is_stale() for child in list(self._children.values()))
+
+
+# compiled ignore files, keyed by their location and stat (so that modified files are recompiled)
+_compiled_rules: "OrderedDict[Tuple[str, int, int], Tuple[IgnoreRule, ...]]" = OrderedDict()
+_compiled_rules_lock = threading.Lock()
+
+
+def _stamp_of(ignore_file: TemplatePath) -> Optional[Tuple[int, int]]:
+    try:
+        st = ignore_file.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _load_rules(ignore_file: TemplatePath, stamp: Optional[Tuple[int, int]]) -> Optional[Tuple[IgnoreRule, ...]]:
+    if stamp is None:
+        return None
+
+    key = (str(ignore_file), *stamp)
+    with _compiled_rules_lock:
+        rules = _compiled_rules.get(key)
+        if rules is not None:
+            _compiled_rules.move_to_end(key)
+            return rules
+
+    rules = parse_rules(ignore_file.read_text(encoding="utf-8"))
+    with _compiled_rules_lock:
+        _compiled_rules[key] = rules
+        while len(_compiled_rules) > _CACHE_SIZE:
+            _compiled_rules.popitem(last=False)
+    return rules
+
+
+def _translate(pattern: str) -> str:
+    # translates a gitignore glob into a regular expression
+    result: List[str] = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i) and (i == 0 or pattern[i - 1] == "/") and \
+                    (i + 2 == n or pattern[i + 2] == "/"):
+                if i + 2 == n:  # trailing '/**' matches everything inside
+                    result.append(".*")
+                    i += 2
+                else:  # '**/' matches zero or more directories
+                    result.append("(?:.*/)?")
+                    i += 3
+                continue
+            result.append("[^/]*")
+        elif c == "?":
+            result.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2 if pattern[i + 1:i + 2] in ("!", "]") else i + 1)
+            if end < 0:
+                result.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                result.append(f"[{body}]")
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            result.append(re.escape(pattern[i]))
+        else:
+            result.append(re.escape(c))
+        i += 1
+
+    return "".join(result)
@@ -0,0 +1,114 @@
+import json
+import threading
+from collections import OrderedDict
+from pathlib import PurePath
+from typing import Optional, Dict, Any, List
+
+from protopy.render_plan import RenderAction
+from protopy.zip_template import TemplatePath
+
+
+class EngineObserver:
+    """
+    receives instrumentation events from the protopy engine (see `ProtopyEngine.add_observer`), all the methods do
+    nothing by default. events may be reported concurrently from several threads (e.g., when files are emitted by a
+    pool of threads).
+    """
+
+    def on_phase(self, phase: str, seconds: float):
+        """
+        called when a phase of the generation completes, the phases are: 'fetch' (obtaining the template from its
+        source, reported by the cli), 'load' (reading and compiling proto.py and the ignore rules), 'proto' (executing
+        proto.py), 'plan' (rendering the file names and matching the ignore rules), 'execute' (rendering and copying
+        the files) and 'post_generation' (the post generation hook of proto.py)
+
+        :param phase: the name of the phase
+        :param seconds: the wall time of the phase
+        """
+
+    def on_file(self, action: RenderAction, source: TemplatePath, target: PurePath, seconds: float,
+                size: Optional[int]):
+        """
+        called once a file (or a preserved directory) was emitted
+
+        :param action: the action that was performed
+        :param source: the template file (or directory)
+        :param target: the output file (or directory)
+        :param seconds: the wall time of the emission
+        :param size: the number of bytes that were written, None for preserved directories
+        """
+
+    def on_compile(self, name: Optional[str], seconds: float):
+        """
+        called once a jinja template (a file or a file name) was compiled
+
+        :param name: the name of the template file, None for file names and other inline templates
+        :param seconds: the wall time of the compilation
+        """
+
+    def on_cache(self, cache: str, hits: int, misses: int):
+        """
+        called at the end of each render with the (cumulative) statistics of the engine's caches
+
+        :param cache: the name of the cache, 'templates' (see `TemplateCache`) or 'proto' (see `ProtoCache`)
+        :param hits: the number of lookups that were found in the cache
+        :param misses: the number of lookups that were not found in the cache
+        """
+
+
+class Profiler(EngineObserver):
+    """
+    an observer that collects the instrumentation events into a profile that can be exported as json
+    """
+
+    def __init__(self, per_file: bool = True):
+        """
+        :param per_file: if True, the profile will include an entry per emitted file (and not only the totals)
+        """
+        self._per_file = per_file
+        self._lock = threading.Lock()
+        self.phases: Dict[str, Dict[str, Any]] = OrderedDict()
+        self.files: List[Dict[str, Any]] = []
+        self.totals: Dict[str, Dict[str, Any]] = OrderedDict()
+        self.compiles = {"count": 0, "seconds": 0.0}
+        self.caches: Dict[str, Dict[str, Any]] = OrderedDict()
+
+    def on_phase(self, phase: str, seconds: float):
+        with self._lock:
+            entry = self.phases.setdefault(phase, {"count": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+
+    def on_file(self, action: RenderAction, source: TemplatePath, target: PurePath, seconds: float,
+                size: Optional[int]):
+        with self._lock:
+            totals = self.totals.setdefault(action.value, {"files": 0, "seconds": 0.0, "bytes": 0})
+            totals["files"] += 1
+            totals["seconds"] += seconds
+            totals["bytes"] += size or 0
+
+            if self._per_file:
+                self.files.append(
+                    {"action": action.value, "source": str(source), "target": str(target), "seconds": seconds,
+                     "bytes": size})
+
+    def on_compile(self, name: Optional[str], seconds: float):
+        with self._lock:
+            self.compiles["count"] += 1
+            self.compiles["seconds"] += seconds
+
+    def on_cache(self, cache: str, hits: int, misses: int):
+        with self._lock:
+            lookups = hits + misses
+            self.caches[cache] = {"hits": hits, "misses": misses, "hit_rate": hits / lookups if lookups else None}
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {"phases": dict(self.phases), "totals": dict(self.totals), "compiles": dict(self.compiles),
+                      "caches": dict(self.caches)}
+            if self._per_file:
+                result["files"] = list(self.files)
+            return result
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
@@ -0,0 +1,78 @@
+import threading
+from typing import Dict, Tuple, Optional
+
+from protopy.zip_template import TemplatePath
+
+# the classification of a `.tmpl` file (see `LiteralIndex`)
+TEMPLATE = "template"  # holds jinja syntax, must be rendered
+LITERAL = "literal"  # holds no jinja syntax, its rendered content is `literal_output` of its content
+VERBATIM = "verbatim"  # holds no jinja syntax and renders into exactly its own bytes, so they are written as is
+
+# the delimiters that start jinja syntax (variables, blocks and comments) in the default environment settings
+_MARKERS = ("{{", "{%", "{#")
+
+# jinja loads template files as utf-8 (see `FileSystemLoader`)
+_SOURCE_ENCODING = "utf-8"
+
+
+def is_literal(source: str) -> bool:
+    """
+    :param source: the source of a jinja template (a file or directory name, or the content of a `.tmpl` file)
+    :return: True if the given source holds no jinja syntax, so rendering it does not depend on the context
+    """
+    return not any(marker in source for marker in _MARKERS)
+
+
+def literal_output(source: str) -> str:
+    """
+    :param source: the source of a literal template (see `is_literal`)
+    :return: the content that jinja renders for the given source: newlines are normalized and a single trailing newline
+             is removed
+    """
+    source = source.replace("\r\n", "\n").replace("\r", "\n")
+    return source[:-1] if source.endswith("\n") else source
+
+
+class LiteralIndex:
+    """
+    remembers which `.tmpl` files of a template hold no jinja syntax, so that they are written without going through
+    jinja. files are classified by a scan of their content, the classification is kept by the path of the file and
+    is scanned again once the file's modification time or size change.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+
+    def classify(self, path: TemplatePath, encoding: str) -> Tuple[str, Optional[str]]:
+        """
+        :param path: a `.tmpl` file
+        :param encoding: the encoding that rendered files are written in
+        :return: the classification of the file (`TEMPLATE`, `LITERAL` or `VERBATIM`) and, if it was read in order to
+                 classify it, its content
+        """
+        st = path.stat()
+        key = str(path)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return entry[2], None
+
+        data = path.read_bytes()
+        kind, source = _classify(data, encoding)
+        with self._lock:
+            self._entries[key] = (st.st_mtime_ns, st.st_size, kind)
+        return kind, source
+
+
+def _classify(data: bytes, encoding: str) -> Tuple[str, Optional[str]]:
+    try:
+        source = data.decode(_SOURCE_ENCODING)
+    except UnicodeDecodeError:
+        return TEMPLATE, None  # left for jinja, which reports the error
+
+    if not is_literal(source):
+        return TEMPLATE, source
+    if "\r" in source or source.endswith("\n") or source.encode(encoding, "replace") != data:
+        return LITERAL, source
+    return VERBATIM, source
@@ -0,0 +1,322 @@
+import hashlib
+import io
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path, PurePath
+from types import ModuleType
+from typing import Dict, Any, Optional, List, Union, Iterator, BinaryIO, Callable, Set
+
+from protopy.copier import CopyStrategy
+from protopy.dependencies import template_variables, variable_digests, opaque_variables, changed_variables, affected
+from protopy.ignore import IgnoreMatcher
+from protopy.render_plan import RenderPlan, RenderAction, RenderOperation
+from protopy.sinks import DirectorySink, OutputSink
+from protopy.zip_template import TemplatePath
+
+# the name of the manifest file, kept at the root of the target directory
+MANIFEST_FILE = ".protopy-manifest.json"
+
+_MANIFEST_VERSION = 1
+_CHUNK_SIZE = 1024 * 1024
+
+
+class RenderReport:
+    """
+    the outcome of an incremental render, lists the target files (relative to the target directory, in posix form)
+    by what happened to them
+    """
+
+    def __init__(self):
+        self.created: List[str] = []  # files that did not exist before
+        self.updated: List[str] = []  # files whose content was changed
+        self.unchanged: List[str] = []  # files that already had the rendered content (and were not written)
+        self.reused: List[str] = []  # unchanged templates that were not rendered at all, as nothing they read changed
+        self.orphaned: List[str] = []  # files that were generated by the previous render but not by this one
+
+    def summary(self) -> str:
+        return f"{len(self.created)} created, {len(self.updated)} updated, {len(self.unchanged)} unchanged, " \
+               f"{len(self.orphaned)} orphaned"
+
+    def __repr__(self):
+        return f"RenderReport({self.summary()})"
+
+
+class IncrementalDirectorySink(DirectorySink):
+    """
+    a directory sink that supports incremental regeneration: it keeps a manifest of the files it generated (their
+    content hash, source template and the fingerprint of the context they were rendered with) and skips writing files
+    whose rendered content is identical to the content that is already on disk.
+
+    files that are listed in the manifest are considered as owned by the template, so they can be regenerated without
+    allowing the render to overwrite existing files. once the render completes, the outcome is available in `report`.
+
+    the manifest also records the context variables that each templated name and each `.tmpl` file reads (see
+    `template_variables`), so that when the template is rendered again, only the names and files that read a changed
+    variable are rendered (see `affected_files`). a change to proto.py renders everything again.
+    """
+
+    def __init__(self, target_dir: Union[Path, str], manifest_name: str = MANIFEST_FILE,
+                 copy_strategy: Union[CopyStrategy, str] = CopyStrategy.COPY):
+        """
+        :param target_dir: the directory to render into
+        :param manifest_name: (optional) the name of the manifest file inside the target directory
+        :param copy_strategy: (optional) how files that are not templates are copied into the directory
+        """
+        super().__init__(target_dir, copy_strategy)
+        self._manifest_path = self.root / manifest_name
+        self._previous = _read_manifest(self._manifest_path)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._names: Dict[str, Dict[str, Any]] = {}
+        self._source_hashes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._template_dir: Optional[TemplatePath] = None
+        self._proto: Optional[str] = None
+        self._variables: Dict[str, str] = {}
+        self._changed: Optional[Set[str]] = None  # None until prepared or if everything should be rendered
+        self.report = RenderReport()
+
+    def exists(self, path: Path) -> bool:
+        return self._name(path) not in self._previous["files"] and path.exists()
+
+    @contextmanager
+    def open(self, path: Path) -> Iterator[BinaryIO]:
+        buffer = io.BytesIO()
+        yield buffer
+
+        content = buffer.getvalue()
+        digest = hashlib.sha256(content).hexdigest()
+        self._store(path, digest, len(content), lambda: path.write_bytes(content))
+
+    def copy_file(self, source: TemplatePath, path: Path):
+        with source.open("rb") as f:
+            digest = _hash_stream(f)
+        self._store(path, digest, source.stat().st_size,
+                    lambda: super(IncrementalDirectorySink, self).copy_file(source, path))
+
+    def copy_tree(self, source: TemplatePath, path: Path, ignore: Optional[IgnoreMatcher] = None):
+        OutputSink.copy_tree(self, source, path, ignore)  # file by file, so that unchanged files are skipped
+
+    def prepare(self, template_dir: TemplatePath, context: Dict[str, Any]):
+        self._template_dir = template_dir
+        self._proto = _hash_source(template_dir / "proto.py")
+        self._variables = variable_digests(context)
+        if self._previous.get("proto") == self._proto:
+            self._changed = changed_variables(self._previous.get("variables", {}), self._variables) | \
+                            opaque_variables(context)
+
+    def render_name(self, source: TemplatePath, render: Callable[[], str]) -> str:
+        if "{" not in source.name or self._template_dir is None:
+            return render()
+
+        key = source.relative_to(self._template_dir).as_posix()
+        previous = self._previous.get("names", {}).get(key)
+        if previous and previous["template"] == source.name and not self._affects(previous["depends"]):
+            self._names[key] = previous
+            return previous["name"]
+
+        variables = template_variables(source.name)
+        name = render()
+        self._names[key] = {"template": source.name, "name": name,
+                            "depends": sorted(variables) if variables is not None else None}
+        return name
+
+    def is_current(self, op: RenderOperation) -> bool:
+        name = self._name(op.target)
+        previous = self._previous["files"].get(name)
+        if self._changed is None or not previous or previous.get("depends", None) is None:
+            return False
+
+        source_hash = _hash_source(op.source)
+        with self._lock:
+            self._source_hashes[name] = source_hash
+
+        if previous["source"] != op.source.relative_to(self._template_dir).as_posix() or \
+                previous.get("source_hash") != source_hash or self._affects(previous["depends"]):
+            return False
+
+        try:
+            st = Path(op.target).stat()
+        except FileNotFoundError:
+            return False
+        if st.st_size != previous["size"] or st.st_mtime_ns != previous["mtime_ns"]:
+            return False  # modified since it was generated
+
+        with self._lock:
+            self.report.unchanged.append(name)
+            self.report.reused.append(name)
+            self._entries[name] = {k: previous[k] for k in ("hash", "size", "mtime_ns")}
+        return True
+
+    def finish(self, plan: RenderPlan, context: Dict[str, Any]):
+        sources = {}
+        for op in plan:
+            if op.action == RenderAction.PRESERVE:
+                for name in self._entries:
+                    if _is_under(self.root / name, op.target):
+                        sources[name] = (op.source / (self.root / name).relative_to(op.target)).relative_to(
+                            plan.template_dir).as_posix()
+            elif op.action != RenderAction.MKDIR:
+                name = self._name(op.target)
+                sources[name] = op.source.relative_to(plan.template_dir).as_posix()
+                if op.action == RenderAction.RENDER and name in self._entries:
+                    self._entries[name].update(self._source_dependencies(name, op.source))
+
+        for name, entry in self._entries.items():
+            entry["source"] = sources.get(name)
+
+        self.report.orphaned = sorted(
+            name for name in self._previous["files"]
+            if name not in self._entries and (self.root / name).is_file())
+
+        manifest = {"version": _MANIFEST_VERSION, "template": str(plan.template_dir),
+                    "context": context_fingerprint(context), "proto": self._proto,
+                    "variables": self._variables or variable_digests(context),
+                    "files": dict(sorted(self._entries.items())), "names": dict(sorted(self._names.items()))}
+        temp_path = self._manifest_path.with_name(f"{self._manifest_path.name}.{os.getpid()}.tmp")
+        temp_path.write_text(json.dumps(manifest, indent=1))
+        os.replace(str(temp_path), str(self._manifest_path))
+
+    def _affects(self, variables: Optional[List[str]]) -> bool:
+        # True if an entry that reads the given variables (None for unknown) may render differently now
+        return self._changed is None or variables is None or not self._changed.isdisjoint(variables)
+
+    def _source_dependencies(self, name: str, source: TemplatePath) -> Dict[str, Any]:
+        # the hash of the source template of the given rendered file and the variables that it reads, the variables are
+        # only analyzed if the source was changed since the previous render
+        source_hash = self._source_hashes.get(name)
+        if source_hash is None:
+            source_hash = _hash_source(source)
+
+        previous = self._previous["files"].get(name)
+        if previous and previous.get("source_hash") == source_hash and "depends" in previous:
+            return {"source_hash": source_hash, "depends": previous["depends"]}
+
+        variables = template_variables(source.read_text(encoding="utf-8"))
+        return {"source_hash": source_hash, "depends": sorted(variables) if variables is not None else None}
+
+    def _store(self, path: Path, digest: str, size: int, write):
+        name = self._name(path)
+        previous = self._previous["files"].get(name)
+
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            st = None
+
+        if st is not None and st.st_size == size and _is_same(path, st, digest, previous):
+            outcome = self.report.unchanged
+        else:
+            outcome = self.report.created if st is None else self.report.updated
+            write()
+            st = path.stat()
+
+        with self._lock:
+            outcome.append(name)
+            self._entries[name] = {"hash": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    def _name(self, path: PurePath) -> str:
+        return Path(os.path.relpath(str(path), str(self.root))).as_posix()
+
+
+def context_fingerprint(context: Dict[str, Any]) -> str:
+    """
+    :param context: the variables that a template is rendered with
+    :return: a hash of the given context, functions and modules (e.g., the ones that proto.py imports) are ignored
+    """
+    values = {k: v for k, v in context.items() if not callable(v) and not isinstance(v, ModuleType)}
+    encoded = json.dumps(values, sort_keys=True, default=repr)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def affected_files(target_dir: Union[Path, str], context: Dict[str, Any],
+                   manifest_name: str = MANIFEST_FILE) -> Optional[List[str]]:
+    """
+    computes which of the files that were generated into the given directory may change if the template is rendered
+    again with the given context, i.e., the files whose content or name (or the name of one of their parent
+    directories) reads a variable that was changed. only the context is considered, changes to the template itself
+    are not detected.
+
+    :param target_dir: a directory that was rendered using `IncrementalDirectorySink`
+    :param context: the variables that the template would be rendered with
+    :param manifest_name: (optional) the name of the manifest file inside the target directory
+    :return: the affected files (relative to the target directory, in posix form) or None if the directory has no
+             (valid) manifest
+    """
+    manifest = read_manifest(target_dir, manifest_name)
+    if manifest is None:
+        return None
+
+    changed = changed_variables(manifest.get("variables", {}), variable_digests(context)) | opaque_variables(context)
+    names = affected({key: entry["depends"] for key, entry in manifest.get("names", {}).items()}, changed)
+
+    dependencies = {}
+    for name, entry in manifest["files"].items():
+        source = entry.get("source")
+        if source is None:
+            dependencies[name] = None
+            continue
+
+        # a file is affected by the names of its source and of the directories that contain it
+        parts = source.split("/")
+        if any("/".join(parts[:i]) in names for i in range(1, len(parts) + 1)):
+            dependencies[name] = None
+        elif source.endswith(".tmpl"):
+            dependencies[name] = entry.get("depends")
+        else:
+            dependencies[name] = ()
+    return sorted(affected(dependencies, changed))
+
+
+def read_manifest(target_dir: Union[Path, str], manifest_name: str = MANIFEST_FILE) -> Optional[Dict[str, Any]]:
+    """
+    :param target_dir: a directory that was rendered using `IncrementalDirectorySink`
+    :param manifest_name: (optional) the name of the manifest file inside the target directory
+    :return: the manifest of the given directory or None if it has no (valid) manifest
+    """
+    manifest = _read_manifest(Path(target_dir) / manifest_name)
+    return manifest if manifest["version"] else None
+
+
+def _read_manifest(path: Path) -> Dict[str, Any]:
+    try:
+        manifest = json.loads(path.read_text())
+        if manifest.get("version") == _MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": None, "files": {}}
+
+
+def _hash_source(path: TemplatePath) -> Optional[str]:
+    try:
+        with path.open("rb") as f:
+            return _hash_stream(f)
+    except FileNotFoundError:
+        return None
+
+
+def _is_same(path: Path, st: os.stat_result, digest: str, previous: Optional[Dict[str, Any]]) -> bool:
+    # checks if the file on disk has the given content hash, the manifest is trusted if the file was not touched since
+    # it was written, otherwise the file is hashed
+    if previous and previous["size"] == st.st_size and previous["mtime_ns"] == st.st_mtime_ns:
+        return previous["hash"] == digest
+
+    with path.open("rb") as f:
+        return _hash_stream(f) == digest
+
+
+def _hash_stream(stream: BinaryIO) -> str:
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _is_under(path: PurePath, directory: PurePath) -> bool:
+    try:
+        path.relative_to(directory)
+        return True
+    except ValueError:
+        return False
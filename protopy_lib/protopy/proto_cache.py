@@ -0,0 +1,191 @@
+import hashlib
+import importlib.util
+import marshal
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from types import CodeType
+from typing import Optional, Union, Any, Tuple
+
+import protopy.doc_generator as dg
+
+_CODE_SUFFIX = ".pyc"
+_DOC_SUFFIX = ".doc.pickle"
+
+
+class ProtoCache:
+    """
+    a cache of compiled `proto.py` code objects and of the argument documentation that is extracted from them (see
+    `protopy.doc_generator`), keyed by a hash of the proto.py source. so a template is parsed and compiled once per
+    version instead of once per render (or per documentation request).
+
+    entries are kept in memory (bounded by `max_entries`, evicted in LRU order) and, if a directory is given, are also
+    persisted to disk (bounded by `max_disk_size` bytes, evicted in LRU order) so that they can be shared between
+    processes.
+    """
+
+    def __init__(self, directory: Optional[Union[Path, str]] = None, *, max_entries: int = 256,
+                 max_disk_size: int = 16 * 1024 * 1024):
+        """
+        :param directory: (optional) directory to persist the cached entries into, if not given, only the in-memory
+                          cache will be used
+        :param max_entries: the maximum number of entries to keep in memory
+        :param max_disk_size: the maximum number of bytes to keep in the on-disk cache directory
+        """
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._directory = Path(directory) if directory else None
+        self._max_disk_size = max_disk_size
+
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, source: Union[bytes, str], filename: str) -> CodeType:
+        """
+        :param source: the source of a proto.py file (bytes are decoded the same as python modules are: as utf-8,
+                       unless the source declares its encoding in a coding comment)
+        :param filename: the file name to compile the source with (appears in tracebacks), it is not a part of the
+                         key, so the same source that is read from different locations (e.g., the temporary
+                         directories of fetched templates) shares its entry
+        :return: the compiled code object of the given source
+        """
+        key = ("code", _digest(source))
+        code = self._get(key)
+        if code is None:
+            code = self._load(key, _CODE_SUFFIX, _read_code)
+            if code is None:
+                code = compile(source, filename, "exec")
+                self._store(key, _CODE_SUFFIX, _write_code, code)
+            self._put(key, code)
+        return _with_filename(code, filename)
+
+    def arg_docs(self, source: Union[bytes, str]) -> Tuple[str, list]:
+        """
+        :param source: the source of a proto.py file
+        :return: the (description, arguments documentation) that were extracted from the given source (see
+                 `protopy.doc_generator.extract`)
+        """
+        key = ("doc", _digest(source))
+        docs = self._get(key)
+        if docs is None:
+            docs = self._load(key, _DOC_SUFFIX, _read_docs)
+            if docs is None:
+                docs = dg.extract(source)
+                self._store(key, _DOC_SUFFIX, _write_docs, docs)
+            self._put(key, docs)
+        return docs
+
+    def clear(self):
+        """
+        removes all the entries from the in-memory and the on-disk caches
+        """
+        with self._lock:
+            self._entries.clear()
+            if self._directory and self._directory.exists():
+                for path in self._directory.iterdir():
+                    _remove(path)
+
+    def _get(self, key: Tuple[str, str]) -> Any:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return value
+
+    def _put(self, key: Tuple[str, str], value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, key: Tuple[str, str], suffix: str) -> Path:
+        return self._directory / (key[1] + suffix)
+
+    def _load(self, key: Tuple[str, str], suffix: str, read) -> Any:
+        if not self._directory:
+            return None
+
+        path = self._path(key, suffix)
+        try:
+            value = read(path.read_bytes())
+            os.utime(str(path))  # marking the entry as recently used
+            return value
+        except (OSError, ValueError, EOFError, TypeError, pickle.UnpicklingError, AttributeError):
+            return None
+
+    def _store(self, key: Tuple[str, str], suffix: str, write, value: Any):
+        if not self._directory:
+            return
+
+        self._directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key, suffix)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        temp_path.write_bytes(write(value))
+        os.replace(str(temp_path), str(path))
+
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        total_size = 0
+        with os.scandir(str(self._directory)) as it:
+            for entry in it:
+                if entry.name.endswith((_CODE_SUFFIX, _DOC_SUFFIX)) and entry.is_file():
+                    st = entry.stat()
+                    entries.append((st.st_mtime_ns, st.st_size, entry.path))
+                    total_size += st.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self._max_disk_size:
+                break
+            _remove(Path(path))
+            total_size -= size
+
+
+def _digest(source: Union[bytes, str]) -> str:
+    return hashlib.sha256(source if isinstance(source, bytes) else source.encode("utf-8")).hexdigest()
+
+
+def _with_filename(code: CodeType, filename: str) -> CodeType:
+    # the given code with its file name (and the file names of the functions and classes it defines) replaced
+    if code.co_filename == filename or not hasattr(code, "replace"):  # code objects cannot be modified before 3.8
+        return code
+
+    consts = tuple(_with_filename(c, filename) if isinstance(c, CodeType) else c for c in code.co_consts)
+    return code.replace(co_filename=filename, co_consts=consts)
+
+
+def _read_code(data: bytes) -> CodeType:
+    # code objects are only valid for the python version that created them
+    magic = importlib.util.MAGIC_NUMBER
+    if not data.startswith(magic):
+        raise ValueError("stale bytecode")
+    return marshal.loads(data[len(magic):])
+
+
+def _write_code(code: CodeType) -> bytes:
+    return importlib.util.MAGIC_NUMBER + marshal.dumps(code)
+
+
+def _read_docs(data: bytes) -> Tuple[str, list]:
+    return pickle.loads(data)
+
+
+def _write_docs(docs: Tuple[str, list]) -> bytes:
+    return pickle.dumps(docs)
+
+
+def _remove(path: Path):
+    try:
+        path.unlink()
+    except OSError:
+        pass
@@ -0,0 +1,96 @@
+from enum import Enum
+from pathlib import Path
+from typing import List, Iterator, Optional, Callable
+
+from protopy.ignore import IgnoreMatcher
+
+
+class RenderAction(Enum):
+    MKDIR = "mkdir"  # create the target directory
+    RENDER = "render"  # render the source (.tmpl) file into the target file
+    COPY = "copy"  # copy the source file as is into the target file
+    PRESERVE = "preserve"  # copy the source directory tree as is into the target directory
+
+
+class RenderOperation:
+    __slots__ = ("action", "source", "target", "ignore")
+
+    def __init__(self, action: RenderAction, source: Path, target: Path, ignore: Optional[IgnoreMatcher] = None):
+        """
+        :param action: the action to perform
+        :param source: the template file (or directory) that the action is performed on
+        :param target: the output file (or directory)
+        :param ignore: (optional, only for PRESERVE operations) a matcher for the entries of the preserved directory
+        """
+        self.action = action
+        self.source = source
+        self.target = target
+        self.ignore = ignore
+
+    def __eq__(self, other):
+        return isinstance(other, RenderOperation) and \
+               (self.action, self.source, self.target) == (other.action, other.source, other.target)
+
+    def __hash__(self):
+        return hash((self.action, self.source, self.target))
+
+    def __repr__(self):
+        return f"RenderOperation({self.action.value}, {self.source}, {self.target})"
+
+
+class RenderPlan:
+    """
+    the list of operations needed in order to render a template into a target directory given a specific context.
+    operations are ordered such that a directory is always created before its content.
+    """
+
+    def __init__(self, template_dir: Path, target_dir: Path, operations: List[RenderOperation]):
+        self.template_dir = template_dir
+        self.target_dir = target_dir
+        self.operations = operations
+
+    def __iter__(self) -> Iterator[RenderOperation]:
+        return iter(self.operations)
+
+    def __len__(self):
+        return len(self.operations)
+
+    def targets(self) -> Iterator[Path]:
+        """
+        :return: the files that will be written when this plan will be executed (including the content of preserved
+                 directories)
+        """
+        for op in self.operations:
+            if op.action == RenderAction.PRESERVE:
+                for source in _walk_files(op.source, op.ignore):
+                    yield op.target / source.relative_to(op.source)
+            elif op.action != RenderAction.MKDIR:
+                yield op.target
+
+    def existing_targets(self, exists: Callable[[Path], bool] = Path.exists) -> Iterator[Path]:
+        """
+        :param exists: (optional) checks if a path (file or directory) already exists in the output, defaults to
+                       checking the file system
+        :return: the files that will be overwritten if this plan will be executed
+        """
+        for op in self.operations:
+            if op.action == RenderAction.PRESERVE:
+                if exists(op.target):  # the content of new preserved directories is not scanned
+                    for source in _walk_files(op.source, op.ignore):
+                        target = op.target / source.relative_to(op.source)
+                        if exists(target):
+                            yield target
+            elif op.action != RenderAction.MKDIR and exists(op.target):
+                yield op.target
+
+
+def _walk_files(root: Path, ignore: Optional[IgnoreMatcher]) -> Iterator[Path]:
+    for child in root.iterdir():
+        is_dir = child.is_dir()
+        if ignore is not None and ignore.ignores(child.name, is_dir):
+            continue
+
+        if is_dir:
+            yield from _walk_files(child, ignore.enter(child) if ignore is not None else None)
+        else:
+            yield child
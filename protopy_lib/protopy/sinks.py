@@ -0,0 +1,360 @@
+import io
+import posixpath
+import shutil
+import stat
+import tarfile
+import threading
+import time
+import zipfile
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path, PurePath, PurePosixPath
+from typing import BinaryIO, ContextManager, Dict, Set, Union, Iterator, Optional, List, Any, Callable
+
+from protopy.copier import CopyStrategy, CopyStats, copy_file, copy_tree
+from protopy.ignore import IgnoreMatcher
+from protopy.render_plan import RenderPlan, RenderOperation
+from protopy.zip_template import TemplatePath
+
+
+class OutputSink(ABC):
+    """
+    the destination that the protopy engine writes the rendered content into.
+    sinks receive the target paths of the render plan (see `RenderPlan`), these are always under the sink's root
+    unless the template explicitly positions its files outside of it.
+    """
+
+    # True if the sink supports writing several files concurrently
+    concurrent: bool = False
+
+    @property
+    @abstractmethod
+    def root(self) -> PurePath:
+        """
+        :return: the path that the template is rendered into
+        """
+
+    @abstractmethod
+    def resolve(self, path: PurePath) -> PurePath:
+        """
+        :param path: a path under the root that may include relative parts (e.g., '..')
+        :return: the normalized version of the given path
+        """
+
+    @abstractmethod
+    def exists(self, path: PurePath) -> bool:
+        """
+        :param path: a target path
+        :return: True if the given path (file or directory) was already written into this sink
+        """
+
+    @abstractmethod
+    def mkdir(self, path: PurePath):
+        """
+        creates the given directory (and its missing parents)
+        :param path: the directory to create
+        """
+
+    @abstractmethod
+    def open(self, path: PurePath) -> ContextManager[BinaryIO]:
+        """
+        :param path: the file to write
+        :return: a context manager that provides a binary stream to write the content of the file into
+        """
+
+    def copy_file(self, source: TemplatePath, path: PurePath):
+        """
+        copies the given file into the sink as is
+        :param source: the file to copy
+        :param path: the target path of the file
+        """
+        with source.open("rb") as src, self.open(path) as dst:
+            shutil.copyfileobj(src, dst)
+
+    def copy_tree(self, source: TemplatePath, path: PurePath, ignore: Optional[IgnoreMatcher] = None):
+        """
+        copies the given directory tree into the sink as is
+        :param source: the directory to copy
+        :param path: the target path of the directory
+        :param ignore: (optional) a matcher for the entries of the source directory, ignored entries are not copied
+        """
+        self.mkdir(path)
+        for child in source.iterdir():
+            is_dir = child.is_dir()
+            if ignore is not None and ignore.ignores(child.name, is_dir):
+                continue
+
+            if is_dir:
+                self.copy_tree(child, path / child.name, ignore.enter(child) if ignore is not None else None)
+            else:
+                self.copy_file(child, path / child.name)
+
+    def prepare(self, template_dir: TemplatePath, context: Dict[str, Any]):
+        """
+        called before a plan is created for this sink
+        :param template_dir: the template that is rendered into this sink
+        :param context: the variables that the template is rendered with
+        """
+
+    def render_name(self, source: TemplatePath, render: Callable[[], str]) -> str:
+        """
+        :param source: a file or directory of the template
+        :param render: renders the name template of the given entry
+        :return: the rendered name of the given entry (sinks may reuse a name that was rendered before)
+        """
+        return render()
+
+    def is_current(self, op: RenderOperation) -> bool:
+        """
+        :param op: a render operation of the plan (of a `.tmpl` file)
+        :return: True if the target of the given operation already holds its rendered content, so that the template
+                 does not need to be rendered again
+        """
+        return False
+
+    def finish(self, plan: RenderPlan, context: Dict[str, Any]):
+        """
+        called once the given plan was fully executed into this sink
+        :param plan: the executed plan
+        :param context: the variables that the plan was rendered with
+        """
+
+    def complete(self):
+        """
+        called once the render completed successfully (after the plan was executed and proto.py's `post_generation`
+        returned)
+        """
+
+    def abort(self):
+        """
+        called if the render failed after the plan was created, sinks may discard (or roll back) what was written
+        """
+
+
+class DirectorySink(OutputSink):
+    """
+    writes the rendered content into a directory on the file system (the default sink)
+    """
+
+    concurrent = True
+
+    def __init__(self, target_dir: Union[Path, str], copy_strategy: Union[CopyStrategy, str] = CopyStrategy.COPY):
+        """
+        :param target_dir: the directory to render into
+        :param copy_strategy: (optional) how files that are not templates are copied into the directory (see
+                              `CopyStrategy`), files that are read from zip templates are always copied
+        """
+        self._root = Path(target_dir).absolute()
+        self.copy_strategy = CopyStrategy.of(copy_strategy)
+        self.copy_stats = CopyStats()
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    def resolve(self, path: Path) -> Path:
+        if path.name in ("", ".", ".."):
+            return path.resolve()
+        # the file itself is not resolved, it may be a link created by a previous generation (see `CopyStrategy`)
+        return path.parent.resolve() / path.name
+
+    def exists(self, path: Path) -> bool:
+        return path.exists()
+
+    def mkdir(self, path: Path):
+        path.mkdir(parents=True, exist_ok=True)
+
+    def open(self, path: Path) -> ContextManager[BinaryIO]:
+        return path.open("wb")
+
+    def copy_file(self, source: TemplatePath, path: Path):
+        if isinstance(source, Path):
+            copy_file(source, path, self.copy_strategy, self.copy_stats)
+        else:
+            super().copy_file(source, path)
+            path.chmod(stat.S_IMODE(source.stat().st_mode))
+            self.copy_stats.add(source.stat().st_size, linked=False)
+
+    def copy_tree(self, source: TemplatePath, path: Path, ignore: Optional[IgnoreMatcher] = None):
+        if isinstance(source, Path):
+            copy_tree(source, path, self.copy_strategy, self.copy_stats, ignore=ignore)
+        else:
+            super().copy_tree(source, path, ignore)
+
+
+class _VirtualSink(OutputSink):
+    # base class for sinks that are not backed by the file system, their root is a virtual '/' directory
+
+    _ROOT = PurePosixPath("/")
+
+    @property
+    def root(self) -> PurePosixPath:
+        return self._ROOT
+
+    def resolve(self, path: PurePath) -> PurePosixPath:
+        return PurePosixPath(posixpath.normpath(path.as_posix()))
+
+    def _name(self, path: PurePath) -> str:
+        return path.relative_to(self._ROOT).as_posix()
+
+    def _missing_directories(self, path: PurePath, existing: Set[str]) -> List[str]:
+        # the names of the given directory and its parents that are not in existing, parents first
+        result = []
+        name = self._name(path)
+        while name not in ("", ".") and name not in existing:
+            result.append(name)
+            name = posixpath.dirname(name)
+        return result[::-1]
+
+
+class MemorySink(_VirtualSink):
+    """
+    keeps the rendered content in memory, as a dictionary of relative (posix) paths to their content
+    """
+
+    concurrent = True
+
+    def __init__(self):
+        self.files: Dict[str, bytes] = {}
+        self.directories: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def exists(self, path: PurePath) -> bool:
+        name = self._name(path)
+        return name in self.files or name in self.directories
+
+    def mkdir(self, path: PurePath):
+        with self._lock:
+            self.directories.update(self._missing_directories(path, self.directories))
+
+    @contextmanager
+    def open(self, path: PurePath) -> Iterator[BinaryIO]:
+        buffer = io.BytesIO()
+        yield buffer
+        with self._lock:
+            self.files[self._name(path)] = buffer.getvalue()
+
+
+class ZipSink(_VirtualSink):
+    """
+    streams the rendered content into a zip archive written to the given file-like object (which does not have to be
+    seekable), the archive is finalized when the sink is closed
+    """
+
+    def __init__(self, file: Union[BinaryIO, Path, str], compression: int = zipfile.ZIP_DEFLATED):
+        self._zip = zipfile.ZipFile(file, "w", compression=compression)
+        self._names: Set[str] = set()
+
+    def exists(self, path: PurePath) -> bool:
+        return self._name(path) in self._names
+
+    def mkdir(self, path: PurePath):
+        for name in self._missing_directories(path, self._names):
+            info = zipfile.ZipInfo(name + "/", time.localtime()[:6])
+            info.external_attr = (stat.S_IFDIR | 0o755) << 16 | 0x10  # 0x10 is the MS-DOS directory flag
+            self._zip.writestr(info, b"")
+            self._names.add(name)
+
+    def open(self, path: PurePath) -> ContextManager[BinaryIO]:
+        return self._open(path, 0o644)
+
+    def copy_file(self, source: TemplatePath, path: PurePath):
+        with source.open("rb") as src, self._open(path, stat.S_IMODE(source.stat().st_mode)) as dst:
+            shutil.copyfileobj(src, dst)
+
+    def _open(self, path: PurePath, mode: int) -> ContextManager[BinaryIO]:
+        name = self._name(path)
+        self._names.add(name)
+
+        info = zipfile.ZipInfo(name, time.localtime()[:6])
+        info.compress_type = self._zip.compression
+        info.external_attr = (stat.S_IFREG | mode) << 16
+        return self._zip.open(info, "w")
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self) -> "ZipSink":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TarSink(_VirtualSink):
+    """
+    streams the rendered content into a tar archive written to the given file-like object (which does not have to be
+    seekable), the archive is finalized when the sink is closed.
+    since tar entries must declare their size upfront, rendered files are buffered in memory before being written,
+    copied files are streamed directly from the template.
+    """
+
+    def __init__(self, file: Union[BinaryIO, Path, str], compression: Optional[str] = "gz"):
+        """
+        :param file: the file (or path) to write the archive into
+        :param compression: (optional) one of 'gz', 'bz2', 'xz' or None for no compression
+        """
+        mode = f"w|{compression or ''}"
+        if isinstance(file, (str, PurePath)):
+            self._tar = tarfile.open(str(file), mode)
+        else:
+            self._tar = tarfile.open(fileobj=file, mode=mode)
+        self._names: Set[str] = set()
+
+    def exists(self, path: PurePath) -> bool:
+        return self._name(path) in self._names
+
+    def mkdir(self, path: PurePath):
+        for name in self._missing_directories(path, self._names):
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.DIRTYPE
+            info.mode = 0o755
+            info.mtime = int(time.time())
+            self._tar.addfile(info)
+            self._names.add(name)
+
+    @contextmanager
+    def open(self, path: PurePath) -> Iterator[BinaryIO]:
+        buffer = io.BytesIO()
+        yield buffer
+
+        info = tarfile.TarInfo(self._name(path))
+        info.size = buffer.tell()
+        info.mode = 0o644
+        info.mtime = int(time.time())
+        buffer.seek(0)
+        self._tar.addfile(info, buffer)
+        self._names.add(info.name)
+
+    def copy_file(self, source: TemplatePath, path: PurePath):
+        name = self._name(path)
+        if isinstance(source, Path):
+            self._tar.add(str(source), name, recursive=False)
+        else:
+            st = source.stat()
+            info = tarfile.TarInfo(name)
+            info.size = st.st_size
+            info.mode = stat.S_IMODE(st.st_mode)
+            info.mtime = st.st_mtime_ns // 1_000_000_000
+            with source.open("rb") as f:
+                self._tar.addfile(info, f)
+        self._names.add(name)
+
+    def close(self):
+        self._tar.close()
+
+    def __enter__(self) -> "TarSink":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def as_sink(target: Union[Path, str, OutputSink],
+            copy_strategy: Union[CopyStrategy, str] = CopyStrategy.COPY) -> OutputSink:
+    """
+    :param target: a sink or a directory to render into
+    :param copy_strategy: (optional) the copy strategy of the created directory sink (see `DirectorySink`)
+    :return: the given sink, or a directory sink for the given directory
+    """
+    return target if isinstance(target, OutputSink) else DirectorySink(target, copy_strategy)
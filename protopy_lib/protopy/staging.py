@@ -0,0 +1,244 @@
+import ctypes
+import os
+import secrets
+import shutil
+import sys
+import threading
+from enum import Enum
+from pathlib import Path
+from typing import Union, Optional, List, Tuple, Set, Dict, Any
+
+from protopy.copier import CopyStrategy
+from protopy.ignore import IgnoreMatcher
+from protopy.render_plan import RenderPlan
+from protopy.sinks import DirectorySink
+from protopy.zip_template import TemplatePath
+
+
+class SyncMode(Enum):
+    """
+    how the staged content is flushed to the disk before it is swapped into the target directory
+    """
+
+    SYNCFS = "syncfs"  # a single syncfs call for the file system of the staging directory (linux), falls back to FILES
+    FILES = "files"  # a single pass over the staged tree that fsyncs each of its files and directories
+    NONE = "none"  # no flushing, the swap is atomic but not durable
+
+    @staticmethod
+    def of(mode: Union["SyncMode", str]) -> "SyncMode":
+        return mode if isinstance(mode, SyncMode) else SyncMode(mode)
+
+
+class StagedDirectorySink(DirectorySink):
+    """
+    a directory sink that renders into a staging directory (a hidden sibling of the target directory) and only once the
+    whole plan was written, flushes the staged content to the disk in one batch (see `SyncMode`) and moves it into the
+    target directory using renames.
+
+    if the target directory does not exist, it is created by a single (atomic) rename of the staging directory,
+    otherwise each staged file (or new directory) replaces its target by a rename and the files that it replaced are
+    kept aside until the render completes. a render that fails before the swap leaves the target directory untouched,
+    a render that fails after it (e.g., in proto.py's `post_generation`, which runs on the swapped content) is rolled
+    back: the new files are removed and the replaced files are restored.
+
+    all the rendered files must be under the target directory.
+    """
+
+    def __init__(self, target_dir: Union[Path, str], copy_strategy: Union[CopyStrategy, str] = CopyStrategy.COPY,
+                 sync: Union[SyncMode, str] = SyncMode.SYNCFS):
+        """
+        :param target_dir: the directory to render into
+        :param copy_strategy: (optional) how files that are not templates are copied into the directory
+        :param sync: (optional) how the staged content is flushed to the disk before it is swapped in (see `SyncMode`)
+        """
+        super().__init__(target_dir, copy_strategy)
+        # the rendered paths are resolved (see `resolve`), so the root they are staged relative to must be resolved too
+        self._root = self._root.resolve()
+        self.sync = SyncMode.of(sync)
+        self._staging: Optional[Path] = None
+        self._backup: Optional[Path] = None
+        self._journal: List[Tuple[Path, Optional[Path]]] = []  # (swapped target, its backup), in swap order
+        self._lock = threading.Lock()
+
+    @property
+    def staging_dir(self) -> Optional[Path]:
+        """
+        :return: the directory that the content is staged in, None if nothing was staged yet
+        """
+        return self._staging
+
+    def exists(self, path: Path) -> bool:
+        return path.exists() or (self._staging is not None and self._staged(path).exists())
+
+    def mkdir(self, path: Path):
+        super().mkdir(self._staged(path))
+
+    def open(self, path: Path):
+        return super().open(self._staged(path))
+
+    def copy_file(self, source: TemplatePath, path: Path):
+        super().copy_file(source, self._staged(path))
+
+    def copy_tree(self, source: TemplatePath, path: Path, ignore: Optional[IgnoreMatcher] = None):
+        super().copy_tree(source, self._staged(path), ignore)
+
+    def finish(self, plan: RenderPlan, context: Dict[str, Any]):
+        if self._staging is None:
+            return
+
+        _sync_tree(self._staging, self.sync)
+        try:
+            self._swap()
+        except BaseException:
+            self.abort()
+            raise
+
+    def complete(self):
+        with self._lock:
+            self._journal.clear()
+            self._discard()
+
+    def abort(self):
+        with self._lock:
+            self._rollback()
+            self._discard()
+
+    def _staged(self, path: Path) -> Path:
+        # the path in the staging directory that stands for the given target path
+        try:
+            relative = path.relative_to(self.root)
+        except ValueError:
+            raise IOError(f"staged output can only be written under the target directory: {path}") from None
+
+        with self._lock:
+            if self._staging is None:
+                self._staging = _sibling(self.root, "staging")
+                self._staging.mkdir(parents=True)
+        return self._staging / relative
+
+    def _swap(self):
+        changed_dirs = set()
+        with self._lock:
+            if not os.path.lexists(self.root):
+                os.rename(self._staging, self.root)
+                self._journal.append((self.root, None))
+                self._staging = None
+                changed_dirs.add(self.root.parent)
+            else:
+                self._merge(self._staging, self.root, changed_dirs)
+
+        if self.sync != SyncMode.NONE:
+            for directory in changed_dirs:
+                _fsync_path(directory)
+
+    def _merge(self, staged: Path, target: Path, changed_dirs: Set[Path]):
+        # moves the content of the staged directory into the (existing) target directory
+        with os.scandir(staged) as it:
+            entries = list(it)
+
+        for entry in entries:
+            destination = target / entry.name
+            if entry.is_dir(follow_symlinks=False) and destination.is_dir() and not destination.is_symlink():
+                self._merge(Path(entry.path), destination, changed_dirs)
+                continue
+
+            if os.path.lexists(destination):
+                backup = self._backup_path(destination)
+                os.rename(destination, backup)
+                self._journal.append((destination, backup))
+                os.rename(entry.path, destination)
+            else:
+                os.rename(entry.path, destination)
+                self._journal.append((destination, None))
+            changed_dirs.add(target)
+
+    def _backup_path(self, target: Path) -> Path:
+        if self._backup is None:
+            self._backup = _sibling(self.root, "backup")
+            self._backup.mkdir()
+
+        backup = self._backup / target.relative_to(self.root)
+        backup.parent.mkdir(parents=True, exist_ok=True)
+        return backup
+
+    def _rollback(self):
+        # undoes the swap, newest first
+        while self._journal:
+            target, backup = self._journal.pop()
+            if os.path.lexists(target):
+                _remove(target)
+            if backup is not None:
+                os.rename(backup, target)
+
+    def _discard(self):
+        for directory in (self._staging, self._backup):
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+        self._staging = self._backup = None
+
+
+def _sibling(path: Path, kind: str) -> Path:
+    # a hidden sibling of the given path, on the same file system so that renames between them are possible
+    return path.parent / f".{path.name}.protopy-{kind}-{secrets.token_hex(4)}"
+
+
+def _remove(path: Path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+def _sync_tree(root: Path, mode: SyncMode):
+    if mode == SyncMode.NONE:
+        return
+    if mode == SyncMode.SYNCFS and _syncfs(root):
+        return
+
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    _fsync_path(Path(entry.path))
+        _fsync_path(directory)
+
+
+def _fsync_path(path: Path):
+    if os.name == "nt" and path.is_dir():
+        return  # directories cannot be opened (nor synced) on windows
+
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+_libc = None
+
+
+def _syncfs(path: Path) -> bool:
+    # flushes the whole file system that holds the given path, returns False if syncfs is not available
+    global _libc
+    if not sys.platform.startswith("linux"):
+        return False
+
+    try:
+        if _libc is None:
+            _libc = ctypes.CDLL(None, use_errno=True)
+        syncfs = _libc.syncfs
+    except (OSError, AttributeError):
+        return False
+
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        if syncfs(fd) != 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), str(path))
+    finally:
+        os.close(fd)
+    return True
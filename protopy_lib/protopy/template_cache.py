@@ -0,0 +1,197 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union, Any, List, Tuple
+
+from jinja2 import Environment, Template
+from jinja2.bccache import FileSystemBytecodeCache, Bucket
+
+from protopy.zip_template import TemplatePath
+
+_CACHE_FILE_PATTERN = "__protopy_%s.cache"
+
+# once the on-disk cache exceeds its maximum size, entries are evicted until it is this fraction of the maximum size
+_EVICTION_TARGET = 0.9
+
+
+class TemplateCache:
+    """
+    an (opt-in) cache of compiled jinja templates, used by the protopy engine for both file/dir names and for the
+    content of `.tmpl` files.
+
+    compiled templates are kept in memory (bounded by `max_entries`, evicted in LRU order) and, if a directory is
+    given, their bytecode is also persisted to disk (bounded by `max_disk_size` bytes, evicted in LRU order) so that
+    it can be shared between processes. file templates are keyed by their path, modification time and content hash
+    (templates that are read from zip archives by their path and content hash only).
+    """
+
+    def __init__(self, directory: Optional[Union[Path, str]] = None, *, max_entries: int = 1024,
+                 max_disk_size: int = 64 * 1024 * 1024):
+        """
+        :param directory: (optional) directory to persist compiled bytecode into, if not given, only the in-memory
+                          cache will be used
+        :param max_entries: the maximum number of compiled templates to keep in memory
+        :param max_disk_size: the maximum number of bytes to keep in the on-disk cache directory
+        """
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[Any, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytecode = _BoundedBytecodeCache(Path(directory), max_disk_size) if directory else None
+
+        self.hits = 0
+        self.misses = 0
+
+    def name_template(self, env: Environment, name: str) -> Template:
+        """
+        :param env: the environment that the template should be compiled for
+        :param name: a file or directory name
+        :return: a compiled template that renders the given name
+        """
+        key = (env, "name", name)
+        entry = self._get(key)
+        if entry:
+            return entry.template
+
+        template = self._compile(env, name, None, None)
+        self._put(key, _CacheEntry(template, None, None))
+        return template
+
+    def file_template(self, env: Environment, path: TemplatePath) -> Template:
+        """
+        :param env: the environment that the template should be compiled for
+        :param path: the absolute path of a template file (or a path inside a zip template)
+        :return: a compiled template for the content of the given file
+        """
+        key = (env, "file", str(path))
+        # archives that were not opened from a file share their location ("<zip>"), so their entries are always checked
+        # by content
+        mtime = path.stat().st_mtime_ns if isinstance(path, Path) else None
+
+        entry = self._get(key)
+        if entry and mtime is not None and entry.mtime == mtime:
+            return entry.template
+
+        source = path.read_text(encoding="utf-8")  # as jinja's loaders read templates
+        digest = hashlib.sha1(source.encode("utf-8")).hexdigest()
+        if entry and entry.digest == digest:
+            entry.mtime = mtime
+            return entry.template
+
+        template = self._compile(env, source, str(path), str(path))
+        self._put(key, _CacheEntry(template, mtime, digest))
+        return template
+
+    def clear(self):
+        """
+        removes all the entries from the in-memory and the on-disk caches
+        """
+        with self._lock:
+            self._entries.clear()
+        if self._bytecode:
+            self._bytecode.clear()
+
+    def _get(self, key) -> Optional["_CacheEntry"]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def _put(self, key, entry: "_CacheEntry"):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def _compile(self, env: Environment, source: str, name: Optional[str], filename: Optional[str]) -> Template:
+        bcc = self._bytecode
+        code = bucket = None
+        if bcc:
+            # the generated code depends on the environment type (e.g., sandboxed or not)
+            bucket = bcc.get_bucket(env, f"{type(env).__qualname__}|{name or source}", filename, source)
+            code = bucket.code
+
+        if code is None:
+            code = env.compile(source, name, filename)
+            if bucket:
+                bucket.code = code
+                bcc.set_bucket(bucket)
+
+        return env.template_class.from_code(env, code, env.make_globals(None), None)
+
+
+class _CacheEntry:
+    def __init__(self, template: Template, mtime: Optional[int], digest: Optional[str]):
+        self.template = template
+        self.mtime = mtime
+        self.digest = digest
+
+
+class _BoundedBytecodeCache(FileSystemBytecodeCache):
+
+    def __init__(self, directory: Path, max_size: int):
+        directory.mkdir(parents=True, exist_ok=True)
+        super().__init__(str(directory), _CACHE_FILE_PATTERN)
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        # maintained incrementally, the directory is only scanned on startup and when evicting (other processes may
+        # write into the same directory)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def load_bytecode(self, bucket: Bucket):
+        super().load_bytecode(bucket)
+        if bucket.code is not None:
+            try:  # marking the entry as recently used
+                os.utime(self._get_cache_filename(bucket))
+            except OSError:
+                pass
+
+    def dump_bytecode(self, bucket: Bucket):
+        filename = self._get_cache_filename(bucket)
+        previous_size = _file_size(filename)
+        super().dump_bytecode(bucket)
+        with self._lock:
+            self._size += _file_size(filename) - previous_size
+            if self._size > self._max_size:
+                self._evict()
+
+    def clear(self):
+        super().clear()
+        with self._lock:
+            self._size = 0
+
+    def _entries(self) -> List[Tuple[int, int, str]]:
+        # the (mtime, size, path) of the cached files
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.startswith("__protopy_") and entry.is_file():
+                    st = entry.stat()
+                    entries.append((st.st_mtime_ns, st.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total_size <= self._max_size * _EVICTION_TARGET:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_size -= size
+        self._size = total_size
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
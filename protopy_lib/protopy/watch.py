@@ -0,0 +1,237 @@
+import ctypes
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Set, Optional, Tuple, Union, List
+
+# stands for "anything may have changed" in the changes reported by `TemplateWatcher` (e.g., when events were lost)
+EVERYTHING = "."
+
+# once a change is detected, the watcher waits this long for related changes (editors often save in several steps)
+_SETTLE_SECONDS = 0.02
+
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ISDIR = 0x40000000
+
+_IN_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | \
+           _IN_DELETE_SELF | _IN_MOVE_SELF
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class WatchCycle:
+    """
+    the outcome of a single regeneration of a watched template (see `ProtopyEngine.watch`)
+    """
+
+    def __init__(self, changes: Set[str]):
+        self.changes = sorted(changes)  # the template files that triggered the cycle
+        self.proto = False  # True if proto.py was evaluated in this cycle
+        self.planned = False  # True if the template tree was walked (planned) again in this cycle
+        self.rendered: List[str] = []  # the target files that were written in this cycle (relative to the target)
+        self.seconds = 0.0  # the time it took from detecting the changes until the files were written
+        self.error: Optional[BaseException] = None  # the error that stopped the cycle, if any
+
+    def summary(self) -> str:
+        steps = [s for s, done in (("proto.py", self.proto), ("plan", self.planned)) if done]
+        details = f" (+{', '.join(steps)})" if steps else ""
+        return f"{len(self.rendered)} files written in {self.seconds * 1000:.1f}ms{details}"
+
+    def __repr__(self):
+        return f"WatchCycle({self.summary()})"
+
+
+class TemplateWatcher:
+    """
+    detects changes to the files of a template directory, using inotify where available (linux) and by periodically
+    scanning the modification times of the files otherwise
+    """
+
+    def __init__(self, root: Union[Path, str], poll_interval: float = 0.25, use_inotify: bool = True):
+        """
+        :param root: the directory to watch (recursively)
+        :param poll_interval: the time in seconds between scans, when inotify is not used
+        :param use_inotify: if False, changes are detected by scanning even if inotify is available
+        """
+        self._root = Path(root).absolute()
+        self._poll_interval = poll_interval
+        self._inotify: Optional[_Inotify] = None
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify(self._root)
+            except (OSError, AttributeError):
+                pass  # e.g., the limit of watches was reached, falling back to scanning
+
+        if self._inotify is None:
+            self._snapshot = _scan(self._root)
+
+    @property
+    def method(self) -> str:
+        """
+        :return: the way changes are detected, either 'inotify' or 'scan'
+        """
+        return "inotify" if self._inotify is not None else "scan"
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        blocks until some files of the template were changed (or until the timeout passed)
+        :param timeout: (optional) the maximum time in seconds to wait, waits for a change if not given
+        :return: the changed, created and deleted files and directories (relative to the root, in posix form), may
+                 include `EVERYTHING`. empty if no change was detected in time.
+        """
+        if self._inotify is not None:
+            return self._inotify.read(timeout)
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            remaining = deadline - time.monotonic() if deadline is not None else self._poll_interval
+            if remaining <= 0:
+                return set()
+            time.sleep(min(self._poll_interval, remaining))
+
+            snapshot = _scan(self._root)
+            changes = {name for name in snapshot.keys() | self._snapshot.keys()
+                       if snapshot.get(name) != self._snapshot.get(name)}
+            self._snapshot = snapshot
+            if changes:
+                return changes
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+
+    def __enter__(self) -> "TemplateWatcher":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class _Inotify:
+    # a recursive inotify watch, through the c library (the standard library has no inotify bindings)
+
+    def __init__(self, root: Path):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._root = root
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise _os_error(str(root))
+
+        self._dirs: Dict[int, str] = {}
+        try:
+            self._add_tree(root, "")
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def read(self, timeout: Optional[float]) -> Set[str]:
+        changes = set()
+        if select.select([self._fd], [], [], timeout)[0]:
+            self._drain(changes)
+            while select.select([self._fd], [], [], _SETTLE_SECONDS)[0]:
+                self._drain(changes)
+        return changes
+
+    def close(self):
+        os.close(self._fd)
+
+    def _add_tree(self, path: Path, name: str) -> List[str]:
+        # watches the given directory and its sub directories, returns the entries that were found in them
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(str(path)), _IN_MASK)
+        if wd < 0:
+            raise _os_error(str(path))
+        self._dirs[wd] = name
+
+        found = []
+        with os.scandir(path) as it:
+            for entry in it:
+                child = f"{name}/{entry.name}" if name else entry.name
+                found.append(child)
+                if entry.is_dir(follow_symlinks=False):
+                    found.extend(self._add_tree(Path(entry.path), child))
+        return found
+
+    def _remove_tree(self, name: str):
+        # stops watching a directory that was moved away (its watches would report the old paths)
+        for wd, directory in list(self._dirs.items()):
+            if directory == name or directory.startswith(name + "/"):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._dirs[wd]
+
+    def _drain(self, changes: Set[str]):
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+
+                directory = self._dirs.get(wd)
+                if mask & _IN_Q_OVERFLOW:
+                    changes.add(EVERYTHING)
+                    continue
+                elif directory is None:
+                    continue
+                elif mask & _IN_IGNORED:
+                    del self._dirs[wd]
+                    continue
+
+                path = f"{directory}/{name}" if directory and name else directory or name
+                changes.add(path or EVERYTHING)  # the root itself was deleted or moved
+
+                if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                    try:
+                        changes.update(self._add_tree(self._root / path, path))
+                    except OSError:
+                        pass  # removed right after it was created
+                elif mask & _IN_ISDIR and mask & _IN_MOVED_FROM:
+                    self._remove_tree(path)
+
+
+def _scan(root: Path) -> Dict[str, Tuple[int, int]]:
+    # the modification time and size of every entry under the given directory, by its relative posix path
+    result = {}
+    pending = [(root, "")]
+    while pending:
+        path, name = pending.pop()
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        for entry in entries:
+            child = f"{name}/{entry.name}" if name else entry.name
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            result[child] = (st.st_mtime_ns, st.st_size)
+            if entry.is_dir(follow_symlinks=False):  # links are not followed, they may form loops
+                pending.append((Path(entry.path), child))
+    return result
+
+
+def _os_error(path: str) -> OSError:
+    error = ctypes.get_errno()
+    return OSError(error, os.strerror(error), path)
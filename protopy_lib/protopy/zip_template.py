@@ -0,0 +1,170 @@
+import io
+import posixpath
+import stat
+import time
+from pathlib import PurePosixPath, Path
+from typing import Dict, Set, Iterator, Union, BinaryIO
+from zipfile import ZipFile, ZipInfo
+
+
+class ZipTemplatePath:
+    """
+    a path inside a template that is stored in a zip archive, the template is read directly from the archive (without
+    extracting it). supports the subset of the `pathlib.Path` api that the protopy engine uses, so it can be passed to
+    the engine wherever a template directory is expected.
+    """
+
+    __slots__ = ("_archive", "_name")
+
+    def __init__(self, archive: Union["_ZipIndex", ZipFile], name: str = ""):
+        """
+        :param archive: the (opened) zip file holding the template
+        :param name: the posix path of this entry inside the archive, the empty string denotes the archive root
+        """
+        self._archive = archive if isinstance(archive, _ZipIndex) else _ZipIndex(archive)
+        self._name = name
+
+    @property
+    def name(self) -> str:
+        return posixpath.basename(self._name)
+
+    @property
+    def suffix(self) -> str:
+        return PurePosixPath(self.name).suffix
+
+    @property
+    def parent(self) -> "ZipTemplatePath":
+        return ZipTemplatePath(self._archive, posixpath.dirname(self._name))
+
+    def joinpath(self, *parts: str) -> "ZipTemplatePath":
+        name = posixpath.normpath(posixpath.join(self._name, *parts))
+        return ZipTemplatePath(self._archive, "" if name == "." else name)
+
+    def __truediv__(self, part: str) -> "ZipTemplatePath":
+        return self.joinpath(part)
+
+    def absolute(self) -> "ZipTemplatePath":
+        return self
+
+    def relative_to(self, other: "ZipTemplatePath") -> PurePosixPath:
+        return PurePosixPath(self._name).relative_to(other._name or ".")
+
+    def exists(self) -> bool:
+        return self.is_dir() or self.is_file()
+
+    def is_dir(self) -> bool:
+        return self._name in self._archive.children
+
+    def is_file(self) -> bool:
+        return self._name in self._archive.files
+
+    def iterdir(self) -> Iterator["ZipTemplatePath"]:
+        children = self._archive.children.get(self._name)
+        if children is None:
+            raise NotADirectoryError(str(self))
+
+        for child in sorted(children):
+            yield ZipTemplatePath(self._archive, posixpath.join(self._name, child))
+
+    def stat(self) -> "_ZipStat":
+        info = self._archive.files.get(self._name)
+        if info is None:
+            if not self.is_dir():
+                raise FileNotFoundError(str(self))
+            return _ZipStat(0, 0, stat.S_IFDIR | 0o755)
+
+        mtime_ns = int(time.mktime(info.date_time + (0, 0, -1))) * 1_000_000_000
+        mode = info.external_attr >> 16 or (stat.S_IFREG | 0o644)
+        return _ZipStat(mtime_ns, info.file_size, mode)
+
+    def open(self, mode: str = "r", encoding: str = "utf-8") -> Union[BinaryIO, io.TextIOWrapper]:
+        if mode not in ("r", "rb"):
+            raise ValueError(f"zip templates are read only, unsupported mode: {mode}")
+
+        info = self._archive.files.get(self._name)
+        if info is None:
+            raise FileNotFoundError(str(self))
+
+        stream = self._archive.zip.open(info)
+        return stream if mode == "rb" else io.TextIOWrapper(stream, encoding)
+
+    def read_bytes(self) -> bytes:
+        with self.open("rb") as f:
+            return f.read()
+
+    def read_text(self, encoding: str = "utf-8") -> str:
+        with self.open("r", encoding) as f:
+            return f.read()
+
+    def __eq__(self, other):
+        return isinstance(other, ZipTemplatePath) and self._archive is other._archive and self._name == other._name
+
+    def __hash__(self):
+        return hash((id(self._archive), self._name))
+
+    def __str__(self):
+        return posixpath.join(self._archive.location, self._name) if self._name else self._archive.location
+
+    def __repr__(self):
+        return f"ZipTemplatePath({self})"
+
+    def __reduce__(self):
+        # allows sending the path to other processes (e.g., when rendering in a process pool)
+        if not isinstance(self._archive.zip.filename, str):
+            raise TypeError(f"zip templates that were not opened from a file cannot be pickled: {self}")
+        return _reopen, (self._archive.zip.filename, self._name)
+
+
+class _ZipStat:
+    __slots__ = ("st_mtime_ns", "st_size", "st_mode")
+
+    def __init__(self, st_mtime_ns: int, st_size: int, st_mode: int):
+        self.st_mtime_ns = st_mtime_ns
+        self.st_size = st_size
+        self.st_mode = st_mode
+
+
+class _ZipIndex:
+    # the directory structure of a zip archive (which may not contain explicit entries for its directories)
+
+    def __init__(self, zip_file: ZipFile):
+        self.zip = zip_file
+        self.location = zip_file.filename if isinstance(zip_file.filename, str) else "<zip>"
+        self.files: Dict[str, ZipInfo] = {}
+        self.children: Dict[str, Set[str]] = {"": set()}
+
+        for info in zip_file.infolist():
+            name = info.filename.rstrip("/")
+            if not name:
+                continue
+
+            if info.filename.endswith("/"):
+                self._add_dir(name)
+            else:
+                self.files[name] = info
+                self._add_dir(posixpath.dirname(name))
+                self.children[posixpath.dirname(name)].add(posixpath.basename(name))
+
+    def _add_dir(self, name: str):
+        if name in self.children:
+            return
+
+        self.children[name] = set()
+        parent = posixpath.dirname(name)
+        self._add_dir(parent)
+        self.children[parent].add(posixpath.basename(name))
+
+
+# archives that were re-opened after unpickling, so that all the unpickled paths of an archive share its index
+_reopened_archives: Dict[str, _ZipIndex] = {}
+
+
+def _reopen(zip_file_path: str, name: str) -> ZipTemplatePath:
+    archive = _reopened_archives.get(zip_file_path)
+    if archive is None:
+        archive = _reopened_archives[zip_file_path] = _ZipIndex(ZipFile(zip_file_path))
+    return ZipTemplatePath(archive, name)
+
+
+# a path inside a template - either a file system path or a path inside a zip archive
+TemplatePath = Union[Path, ZipTemplatePath]
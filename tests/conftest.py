@@ -0,0 +1,76 @@
+import os
+import stat
+import zipfile
+from pathlib import Path
+from typing import Dict, Union, Optional, Tuple, Callable
+
+import pytest
+
+# a file tree as {relative posix path: content}, a None content denotes a directory
+Tree = Dict[str, Union[str, bytes, None]]
+
+# the content of a file tree as {relative posix path: (mode, content)}, directories have a None content
+Snapshot = Dict[str, Tuple[int, Optional[bytes]]]
+
+
+@pytest.fixture(autouse=True)
+def umask():
+    # the modes of rendered files and directories depend on the umask, so it is fixed during the tests
+    previous = os.umask(0o022)
+    yield
+    os.umask(previous)
+
+
+@pytest.fixture
+def write_tree() -> Callable[[Path, Tree], Path]:
+    """
+    :return: a function that writes a file tree into a directory and returns the directory
+    """
+
+    def write(root: Path, tree: Tree) -> Path:
+        root.mkdir(parents=True, exist_ok=True)
+        for name, content in tree.items():
+            path = root / name
+            if content is None:
+                path.mkdir(parents=True, exist_ok=True)
+                continue
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if isinstance(content, str):
+                path.write_text(content, encoding="utf-8")
+            else:
+                path.write_bytes(content)
+        return root
+
+    return write
+
+
+@pytest.fixture
+def snapshot() -> Callable[[Path], Snapshot]:
+    """
+    :return: a function that captures the (modes and contents of the) entries under a directory
+    """
+
+    def capture(root: Path) -> Snapshot:
+        result = {}
+        for path in sorted(root.rglob("*")):
+            mode = stat.S_IMODE(path.lstat().st_mode)
+            result[path.relative_to(root).as_posix()] = (mode, None if path.is_dir() else path.read_bytes())
+        return result
+
+    return capture
+
+
+@pytest.fixture
+def zip_dir() -> Callable[[Path, Path], Path]:
+    """
+    :return: a function that archives a directory (including its directory entries and modes) into a zip file
+    """
+
+    def archive(root: Path, zip_file: Path) -> Path:
+        with zipfile.ZipFile(zip_file, "w", zipfile.ZIP_DEFLATED) as zf:
+            for path in sorted(root.rglob("*")):
+                zf.write(path, path.relative_to(root).as_posix())
+        return zip_file
+
+    return archive
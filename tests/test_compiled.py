@@ -0,0 +1,90 @@
+import json
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from protopy.compiled import CompiledTemplates, METADATA_FILE
+from protopy.engine import ProtopyEngine
+
+_TEMPLATE = {
+    "proto.py": 'name = ask("name")\n'
+                'items = ["a", "b"]\n'
+                'def shout(text):\n'
+                '    return text.upper()\n',
+    "{{ name }}.txt.tmpl": "hello {{ name }}\n",
+    "{{ name }}-dir/{% if items %}nested{% endif %}.txt.tmpl": "{% for i in items %}{{ i }}{% endfor %}\n\n",
+    "unicode-{{ name }}.txt.tmpl": "héllo {{ shout(name) }} {{ 'ü' | length }}",
+    "macros.txt.tmpl": "{% macro m(x) %}[{{ x }}]{% endmacro %}{{ m(name) }}\n{# comment #}",
+    "literal.txt.tmpl": "no jinja here\n",
+    "copied.txt": "{{ not rendered }}",
+    "kept/.protopypreserve": "",
+    "kept/{{ name }}.txt.tmpl": "{{ raw }}",
+    ".protopyignore": "*.bak\n",
+    "broken.txt.tmpl.bak": "{{ broken",
+}
+
+
+@pytest.fixture
+def template(tmp_path: Path, write_tree) -> Path:
+    return write_tree(tmp_path / "template", _TEMPLATE)
+
+
+def _render(engine: ProtopyEngine, template: Path, target: Path, templates=None):
+    engine.render(template, target, [], {"name": "x"}, {}, templates=templates)
+
+
+@pytest.mark.parametrize("trusted", [False, True])
+def test_compiled_output_is_identical(template: Path, tmp_path: Path, snapshot, trusted: bool):
+    engine = ProtopyEngine(trusted=trusted)
+    assert engine.compile_template(template, tmp_path / "compiled.zip") == 8  # 4 names and 4 files
+
+    _render(ProtopyEngine(trusted=trusted), template, tmp_path / "expected")
+    templates = CompiledTemplates(tmp_path / "compiled.zip")
+    _render(ProtopyEngine(trusted=trusted), template, tmp_path / "out", templates)
+
+    assert snapshot(tmp_path / "out") == snapshot(tmp_path / "expected")
+    assert templates.sandboxed == (not trusted)
+    assert templates.fallbacks == 0
+
+
+def test_modified_templates_fall_back(template: Path, tmp_path: Path, snapshot):
+    ProtopyEngine().compile_template(template, tmp_path / "compiled.zip")
+    (template / "{{ name }}.txt.tmpl").write_text("changed {{ name }}")
+    (template / "new-{{ name }}.txt.tmpl").write_text("new {{ name }}")
+
+    templates = CompiledTemplates(tmp_path / "compiled.zip")
+    _render(ProtopyEngine(), template, tmp_path / "out", templates)
+    _render(ProtopyEngine(), template, tmp_path / "expected")
+
+    assert snapshot(tmp_path / "out") == snapshot(tmp_path / "expected")
+    assert (tmp_path / "out" / "x.txt").read_text() == "changed x"
+    assert templates.fallbacks == 3  # the modified file, the new file and the new name
+
+
+def test_other_mode_falls_back(template: Path, tmp_path: Path, snapshot):
+    ProtopyEngine().compile_template(template, tmp_path / "compiled.zip")
+
+    templates = CompiledTemplates(tmp_path / "compiled.zip")
+    _render(ProtopyEngine(trusted=True), template, tmp_path / "out", templates)
+    _render(ProtopyEngine(), template, tmp_path / "expected")
+
+    assert snapshot(tmp_path / "out") == snapshot(tmp_path / "expected")
+    assert templates.fallbacks == 8
+
+
+def test_incompatible_archives(template: Path, tmp_path: Path):
+    with zipfile.ZipFile(tmp_path / "other.zip", "w") as zf:
+        zf.writestr("file.txt", "")
+    with pytest.raises(ValueError):
+        CompiledTemplates(tmp_path / "other.zip")
+
+    ProtopyEngine().compile_template(template, tmp_path / "compiled.zip")
+    with zipfile.ZipFile(tmp_path / "compiled.zip") as zf, zipfile.ZipFile(tmp_path / "old.zip", "w") as old:
+        for info in zf.infolist():
+            data = zf.read(info)
+            if info.filename == METADATA_FILE:
+                data = json.dumps({**json.loads(data), "jinja": "0.0"})
+            old.writestr(info, data)
+    with pytest.raises(ValueError):
+        CompiledTemplates(tmp_path / "old.zip")
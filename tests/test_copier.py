@@ -0,0 +1,182 @@
+import errno
+import os
+import shutil
+import types
+from pathlib import Path
+
+import pytest
+
+from protopy import copier
+from protopy.copier import CopyStrategy, CopyStats, copy_file, copy_tree
+from protopy.engine import ProtopyEngine
+from protopy.ignore import IgnoreMatcher
+from protopy.sinks import DirectorySink
+
+
+def _unsupported(*args):
+    raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+
+@pytest.fixture
+def source(tmp_path: Path) -> Path:
+    source = tmp_path / "source.sh"
+    source.write_bytes(b"#!/bin/sh\n" * 1000)
+    source.chmod(0o755)
+    return source
+
+
+@pytest.mark.parametrize("strategy", list(CopyStrategy))
+def test_copy_file(source: Path, tmp_path: Path, strategy: CopyStrategy):
+    target = tmp_path / "target.sh"
+    stats = CopyStats()
+
+    linked = copy_file(source, target, strategy, stats)
+
+    assert target.read_bytes() == source.read_bytes()
+    assert os.access(target, os.X_OK)
+    if strategy == CopyStrategy.HARDLINK:
+        assert linked and target.stat().st_ino == source.stat().st_ino
+    elif strategy == CopyStrategy.SYMLINK:
+        assert linked and os.readlink(target) == str(source.absolute())
+    elif strategy == CopyStrategy.COPY:
+        assert not linked and target.stat().st_ino != source.stat().st_ino
+
+    size = source.stat().st_size
+    expected = (0, 0, 1, size) if linked else (1, size, 0, 0)
+    assert (stats.copied_files, stats.copied_bytes, stats.linked_files, stats.linked_bytes) == expected
+
+
+@pytest.mark.parametrize("strategy, link", [(CopyStrategy.HARDLINK, "link"), (CopyStrategy.SYMLINK, "symlink")])
+def test_unsupported_links_fall_back_to_a_copy(source: Path, tmp_path: Path, monkeypatch, strategy, link):
+    monkeypatch.setattr(os, link, _unsupported)
+    target = tmp_path / "target.sh"
+    stats = CopyStats()
+
+    assert not copy_file(source, target, strategy, stats)
+    assert target.read_bytes() == source.read_bytes() and not target.is_symlink()
+    assert target.stat().st_ino != source.stat().st_ino
+    assert os.access(target, os.X_OK)
+    assert (stats.copied_files, stats.linked_files) == (1, 0)
+
+
+def test_unsupported_reflink_falls_back_to_a_copy(source: Path, tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(copier, "fcntl", types.SimpleNamespace(ioctl=_unsupported))
+    if hasattr(os, "copy_file_range"):
+        monkeypatch.setattr(os, "copy_file_range", _unsupported)
+    target = tmp_path / "target.sh"
+    target.write_bytes(b"previous content that is longer than the source" * 1000)
+    stats = CopyStats()
+
+    assert not copy_file(source, target, CopyStrategy.REFLINK, stats)
+    assert target.read_bytes() == source.read_bytes()
+    assert os.access(target, os.X_OK)
+    assert (stats.copied_files, stats.linked_files) == (1, 0)
+
+
+@pytest.mark.parametrize("previous", [CopyStrategy.HARDLINK, CopyStrategy.SYMLINK])
+@pytest.mark.parametrize("strategy", [CopyStrategy.COPY, CopyStrategy.REFLINK])
+def test_copying_over_a_link_does_not_modify_the_source(source: Path, tmp_path: Path, previous, strategy):
+    target = tmp_path / "target.sh"
+    copy_file(source, target, previous)
+    other = tmp_path / "other"
+    other.write_text("other")
+
+    copy_file(other, target, strategy)
+
+    assert target.read_text() == "other" and not target.is_symlink()
+    assert source.read_bytes() == b"#!/bin/sh\n" * 1000
+
+
+@pytest.mark.parametrize("strategy", list(CopyStrategy))
+def test_render_with_copy_strategy(tmp_path: Path, write_tree, strategy: CopyStrategy):
+    template = write_tree(tmp_path / "template", {
+        "proto.py": "",
+        "copied.txt": "copied",
+        "rendered.txt.tmpl": "{{ 1 + 1 }}",
+        "kept/.protopypreserve": "",
+        "kept/a.txt": "a",
+        "kept/sub/b.txt": "bb",
+    })
+    sink = DirectorySink(tmp_path / "out", strategy)
+    ProtopyEngine().render(template, sink, [], {}, {})
+
+    assert (tmp_path / "out" / "rendered.txt").read_text() == "2"
+    for name in ("copied.txt", "kept/a.txt", "kept/sub/b.txt"):
+        assert (tmp_path / "out" / name).read_bytes() == (template / name).read_bytes()
+    stats = sink.copy_stats
+    assert stats.copied_files + stats.linked_files == 4
+    assert stats.copied_bytes + stats.linked_bytes == len("copied") + len("a") + len("bb")
+    if strategy in (CopyStrategy.HARDLINK, CopyStrategy.SYMLINK):
+        assert stats.copied_files == 0
+    elif strategy == CopyStrategy.COPY:
+        assert stats.linked_files == 0
+
+
+@pytest.fixture
+def tree(tmp_path: Path, write_tree) -> Path:
+    files = {f"d{i % 7}/s{i % 3}/f{i}.txt": f"file {i}\n" * i for i in range(300)}
+    tree = write_tree(tmp_path / "tree", {**files, "empty/deeper": None, "top.bin": bytes(range(256)) * 100})
+    (tree / "d1" / "s1" / "f1.txt").chmod(0o755)
+    (tree / "d2" / "s2").chmod(0o700)
+    return tree
+
+
+@pytest.mark.parametrize("max_workers", [1, 2, 16])
+def test_copy_tree_matches_copytree(tree: Path, tmp_path: Path, snapshot, max_workers):
+    shutil.copytree(str(tree), str(tmp_path / "expected"))
+    stats = CopyStats()
+
+    copy_tree(tree, tmp_path / "out", stats=stats, max_workers=max_workers)
+
+    expected = snapshot(tmp_path / "expected")
+    assert snapshot(tmp_path / "out") == expected
+    assert stats.copied_files == sum(1 for _, content in expected.values() if content is not None)
+    assert stats.copied_bytes == sum(len(content) for _, content in expected.values() if content is not None)
+
+
+def test_copy_tree_into_existing_directory(tree: Path, tmp_path: Path, snapshot, write_tree):
+    shutil.copytree(str(tree), str(tmp_path / "expected"))
+    write_tree(tmp_path / "expected", {"d0/s0/f0.txt": "", "extra.txt": "extra"})
+    write_tree(tmp_path / "out", {"d0/s0/f0.txt": "previous", "extra.txt": "extra"})
+
+    copy_tree(tree, tmp_path / "out", CopyStrategy.REFLINK)
+
+    assert snapshot(tmp_path / "out") == snapshot(tmp_path / "expected")
+
+
+def test_copy_tree_respects_ignore_files(tmp_path: Path, write_tree, snapshot):
+    tree = write_tree(tmp_path / "tree", {
+        ".protopyignore": "*.log\n/build/\n",
+        "a.txt": "a",
+        "a.log": "ignored",
+        "build/out.txt": "ignored",
+        "src/build/out.txt": "kept, the rule is anchored",
+        "src/.protopyignore": "!keep.log\n",
+        "src/keep.log": "negated",
+        "src/drop.log": "ignored",
+    })
+
+    copy_tree(tree, tmp_path / "out", ignore=IgnoreMatcher.for_template(tree), max_workers=2)
+
+    assert sorted(name for name, (_, content) in snapshot(tmp_path / "out").items() if content is not None) == [
+        ".protopyignore", "a.txt", "src/.protopyignore", "src/build/out.txt", "src/keep.log"]
+
+
+@pytest.mark.parametrize("strategy", list(CopyStrategy))
+def test_preserved_trees_respect_ignore_files(tmp_path: Path, write_tree, strategy: CopyStrategy):
+    template = write_tree(tmp_path / "template", {
+        "proto.py": "",
+        ".protopyignore": "*.pyc\n",
+        "vendor/.protopypreserve": "",
+        "vendor/.protopyignore": "tests/\n",
+        "vendor/lib/module.py": "code",
+        "vendor/lib/module.pyc": "ignored by the root ignore file",
+        "vendor/tests/test_module.py": "ignored by the nested ignore file",
+        "vendor/lib/tests": "a file, directory rules do not match it",
+    })
+
+    ProtopyEngine().render(template, DirectorySink(tmp_path / "out", strategy), [], {}, {})
+
+    out = tmp_path / "out" / "vendor"
+    assert sorted(p.relative_to(out).as_posix() for p in out.rglob("*") if not p.is_dir()) == [
+        ".protopyignore", ".protopypreserve", "lib/module.py", "lib/tests"]
@@ -0,0 +1,92 @@
+import os
+import sys
+import threading
+import types
+from pathlib import Path
+
+import pytest
+
+from protopy.cli.daemon.client import DaemonClient
+from protopy.cli.daemon.server import RenderDaemon
+from protopy.engine import ProtopyEngine
+
+pytestmark = pytest.mark.skipif(not hasattr(__import__("socket"), "AF_UNIX"), reason="requires unix sockets")
+
+
+@pytest.fixture
+def client(tmp_path: Path) -> DaemonClient:
+    socket_path = tmp_path / "d.sock"
+    with RenderDaemon(ProtopyEngine(), socket_path) as daemon:
+        thread = threading.Thread(target=daemon.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield DaemonClient(socket_path)
+        finally:
+            daemon.shutdown()
+            thread.join(10)
+
+
+def test_proto_runs_in_the_client_directory_and_environment(client: DaemonClient, tmp_path: Path, write_tree,
+                                                            monkeypatch):
+    template = write_tree(tmp_path / "template", {
+        "proto.py": "import os\n"
+                    "cwd = os.getcwd()\n"
+                    "flavor = os.environ.get('FLAVOR')\n"
+                    "def post_generation():\n"
+                    "    open('post.txt', 'w').write(os.environ.get('FLAVOR'))\n",
+        "out.txt.tmpl": "{{ cwd }} {{ flavor }}",
+    })
+    client_dir = tmp_path / "client"
+    client_dir.mkdir()
+    monkeypatch.chdir(client_dir)
+    monkeypatch.setenv("FLAVOR", "spicy")
+
+    response = client.render(str(template), "out", [], {}, allow_overwrite=False)
+    daemon_cwd = os.getcwd()
+
+    assert response["ok"], response
+    assert (client_dir / "out" / "out.txt").read_text() == f"{client_dir} spicy"
+    assert (client_dir / "post.txt").read_text() == "spicy"
+    assert daemon_cwd == str(client_dir)  # the daemon runs in this process, it restored the working directory
+
+
+def test_missing_prompts_fall_back_before_proto_runs(client: DaemonClient, tmp_path: Path, write_tree):
+    template = write_tree(tmp_path / "template", {
+        "proto.py": f"open({str(tmp_path / 'side_effect.txt')!r}, 'a').write('x')\n"
+                    "name = ask('name', positional_arg=0)\n",
+        "out.txt.tmpl": "{{ name }}",
+    })
+
+    response = client.render(str(template), str(tmp_path / "out"), [], {}, allow_overwrite=False)
+    assert not response["ok"] and response["fallback"]
+    assert not (tmp_path / "side_effect.txt").exists()
+
+    response = client.render(str(template), str(tmp_path / "out"), ["given"], {}, allow_overwrite=False)
+    assert response["ok"], response
+    assert (tmp_path / "out" / "out.txt").read_text() == "given"
+    assert (tmp_path / "side_effect.txt").read_text() == "x"
+
+
+def test_requests_are_rendered_concurrently(client: DaemonClient, tmp_path: Path, write_tree, monkeypatch):
+    # both renders wait for each other while rendering, which only completes if they run at the same time
+    barrier = threading.Barrier(2, timeout=10)
+    monkeypatch.setitem(sys.modules, "_daemon_test_barrier", types.SimpleNamespace(wait=barrier.wait))
+    template = write_tree(tmp_path / "template", {
+        "proto.py": "from _daemon_test_barrier import wait\n",
+        "out.txt.tmpl": "{{ wait() >= 0 }}",
+    })
+
+    responses = {}
+
+    def render(name: str):
+        responses[name] = client.render(str(template), str(tmp_path / name), [], {}, allow_overwrite=False)
+
+    threads = [threading.Thread(target=render, args=(name,)) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+
+    assert all(response["ok"] for response in responses.values()), responses
+    assert (tmp_path / "a" / "out.txt").read_text() == "True"
+    assert (tmp_path / "b" / "out.txt").read_text() == "True"
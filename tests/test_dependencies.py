@@ -0,0 +1,121 @@
+from pathlib import Path
+
+import pytest
+
+from protopy.dependencies import template_variables, changed_variables, affected, variable_digests, \
+    opaque_variables
+from protopy.engine import ProtopyEngine
+from protopy.manifest import IncrementalDirectorySink, RenderReport, affected_files
+
+_TEMPLATE = {
+    "proto.py": 'a = ask("a")\n'
+                'b = ask("b")\n'
+                'def shout(text):\n'
+                '    return text.upper()\n',
+    "a.txt.tmpl": "{{ a }}",
+    "b.txt.tmpl": "{{ b }}",
+    "both.txt.tmpl": "{{ a }} {{ b }}",
+    "static.txt.tmpl": "static",
+    "unicode.txt.tmpl": "héllo {{ b }}",
+    "shout.txt.tmpl": "{{ shout('x') }}",
+    "{{ a }}/inner.txt.tmpl": "inner",
+}
+
+
+@pytest.fixture
+def template(tmp_path: Path, write_tree) -> Path:
+    return write_tree(tmp_path / "template", _TEMPLATE)
+
+
+def _render(template: Path, target: Path, **kwargs) -> RenderReport:
+    sink = IncrementalDirectorySink(target)
+    ProtopyEngine().render(template, sink, [], {"a": "1", "b": "1", **kwargs}, {})
+    return sink.report
+
+
+def test_template_variables():
+    assert template_variables("{{ a }} {% for x in items %}{{ x.b }}{% endfor %}{% set c = 1 %}{{ c }}") == \
+        {"a", "items"}
+    assert template_variables("{{ name }}.txt") == {"name"}
+    assert template_variables("no variables") == frozenset()
+    assert template_variables("{% include 'other' %}") is None
+    assert template_variables("{{ unclosed") is None
+
+
+def test_changed_variables():
+    old = variable_digests({"a": 1, "b": [1, 2], "c": {"x": 1, "y": 2}, "removed": None})
+    new = variable_digests({"a": 2, "b": [1, 2], "c": {"y": 2, "x": 1}, "added": None})
+    assert changed_variables(old, new) == {"a", "removed", "added"}
+    assert opaque_variables({"f": len, "path": Path("."), "plain": "x"}) == {"f", "path"}
+
+
+def test_affected():
+    dependencies = {"a": ["x"], "b": ["y"], "both": ["x", "y"], "none": [], "unknown": None}
+    assert affected(dependencies, {"x"}) == {"a", "both", "unknown"}
+    assert affected(dependencies, set()) == {"unknown"}
+    assert affected(dependencies, None) == set(dependencies)
+
+
+def test_only_files_that_read_a_changed_variable_are_rendered(template: Path, tmp_path: Path):
+    target = tmp_path / "out"
+    _render(template, target)
+    assert affected_files(target, {"a": "1", "b": "2"}) == ["b.txt", "both.txt", "unicode.txt"]
+
+    report = _render(template, target, b="2")
+
+    assert sorted(report.updated) == ["b.txt", "both.txt", "unicode.txt"]
+    assert sorted(report.reused) == ["1/inner.txt", "a.txt", "static.txt"]
+    assert (target / "unicode.txt").read_bytes() == "héllo 2".encode()
+
+
+def test_renamed_directories_are_rendered(template: Path, tmp_path: Path):
+    target = tmp_path / "out"
+    _render(template, target)
+    assert affected_files(target, {"a": "2", "b": "1"}) == ["1/inner.txt", "a.txt", "both.txt"]
+
+    report = _render(template, target, a="2")
+
+    assert report.created == ["2/inner.txt"]
+    assert report.orphaned == ["1/inner.txt"]
+    assert sorted(report.reused) == ["b.txt", "static.txt", "unicode.txt"]
+
+
+def test_functions_and_opaque_values_are_always_rendered(template: Path, tmp_path: Path):
+    target = tmp_path / "out"
+    _render(template, target)
+
+    report = _render(template, target)
+    assert "shout.txt" not in report.reused and "shout.txt" in report.unchanged
+
+    with (template / "proto.py").open("a") as f:
+        f.write("import pathlib\npath = pathlib.Path('x')\n")
+    (template / "path.txt.tmpl").write_text("{{ path.name }}")
+    _render(template, target)
+    report = _render(template, target)
+    assert "path.txt" not in report.reused and "path.txt" in report.unchanged
+    assert "a.txt" in report.reused
+
+
+def test_changed_proto_renders_everything(template: Path, tmp_path: Path):
+    target = tmp_path / "out"
+    _render(template, target)
+    with (template / "proto.py").open("a") as f:
+        f.write("# changed\n")
+
+    report = _render(template, target)
+    assert report.reused == []
+    assert len(report.unchanged) == len(_TEMPLATE) - 1
+
+
+def test_changed_templates_are_rendered(template: Path, tmp_path: Path):
+    target = tmp_path / "out"
+    _render(template, target)
+    (template / "static.txt.tmpl").write_text("changed")
+    (template / "{{ a }}").rename(template / "{{ a }}-v2")
+
+    report = _render(template, target)
+
+    assert report.updated == ["static.txt"]
+    assert report.created == ["1-v2/inner.txt"]
+    assert report.orphaned == ["1/inner.txt"]
+    assert (target / "static.txt").read_text() == "changed"
@@ -0,0 +1,23 @@
+import pytest
+
+from protopy.cli.sources.git_source import _parse
+
+
+@pytest.mark.parametrize("descriptor, expected", [
+    ("https://github.com/org/repo.git", ("https://github.com/org/repo.git", None, None)),
+    ("https://github.com/org/repo.git@v1.0#subdir=templates/service",
+     ("https://github.com/org/repo.git", "v1.0", "templates/service")),
+    ("https://user@github.com/org/repo@feature/x", ("https://user@github.com/org/repo", "feature/x", None)),
+    ("ssh://git@github.com/org/repo.git", ("ssh://git@github.com/org/repo.git", None, None)),
+    ("ssh://git@github.com/org/repo.git@main#subdir=/a/", ("ssh://git@github.com/org/repo.git", "main", "a")),
+    ("git@github.com:org/repo.git", ("git@github.com:org/repo.git", None, None)),
+    ("git@github.com:org/repo.git@feature/x#subdir=t", ("git@github.com:org/repo.git", "feature/x", "t")),
+    ("git@github.com:repo@v1", ("git@github.com:repo", "v1", None)),
+])
+def test_parse(descriptor, expected):
+    assert _parse(descriptor) == expected
+
+
+def test_parse_rejects_unknown_selectors():
+    with pytest.raises(ValueError):
+        _parse("https://github.com/org/repo.git#egg=repo")
@@ -0,0 +1,139 @@
+from pathlib import Path
+
+import pytest
+
+from protopy.engine import ProtopyEngine
+from protopy.ignore import IgnoreMatcher, parse_rules, IGNORE_FILE
+
+
+def _ignores(rules: str, path: str, is_dir: bool = False) -> bool:
+    # matches the given path against the rules of a single ignore file, the way the matchers see it
+    result = False
+    for rule in parse_rules(rules):
+        if rule.matches(path, is_dir):
+            result = not rule.negated
+    return result
+
+
+@pytest.mark.parametrize("rules, path, is_dir, expected", [
+    # unanchored patterns match at any depth
+    ("*.log", "a.log", False, True),
+    ("*.log", "x/y/a.log", False, True),
+    ("*.log", "a.log/b", False, False),
+    ("build", "x/build", True, True),
+    # a leading or inner slash anchors the pattern to the directory of the ignore file
+    ("/build", "build", True, True),
+    ("/build", "x/build", True, False),
+    ("docs/*.md", "docs/a.md", False, True),
+    ("docs/*.md", "x/docs/a.md", False, False),
+    ("docs/*.md", "docs/x/a.md", False, False),
+    # a trailing slash only matches directories
+    ("build/", "build", True, True),
+    ("build/", "build", False, False),
+    ("build/", "x/build", True, True),
+    ("/x/build/", "x/build", True, True),
+    # '**'
+    ("**/cache", "cache", True, True),
+    ("**/cache", "a/b/cache", True, True),
+    ("a/**/b", "a/b", False, True),
+    ("a/**/b", "a/x/y/b", False, True),
+    ("a/**/b", "x/a/b", False, False),
+    ("a/**", "a/x/y", False, True),
+    ("a/**", "a", True, False),
+    ("a**b", "axxb", False, True),
+    ("a**b", "ax/xb", False, False),
+    # other globs
+    ("?.txt", "a.txt", False, True),
+    ("?.txt", "ab.txt", False, False),
+    ("[ab].txt", "b.txt", False, True),
+    ("[!ab].txt", "b.txt", False, False),
+    ("[!ab].txt", "c.txt", False, True),
+    (r"\#hash", "#hash", False, True),
+    (r"\!bang", "!bang", False, True),
+    ("space\\ ", "space ", False, True),
+    ("trailing   ", "trailing", False, True),
+    ("# comment\n\n", "# comment", False, False),
+    # negation, the last matching rule wins
+    ("*.log\n!keep.log", "keep.log", False, False),
+    ("*.log\n!keep.log", "drop.log", False, True),
+    ("!keep.log\n*.log", "keep.log", False, True),
+])
+def test_patterns(rules: str, path: str, is_dir: bool, expected: bool):
+    assert _ignores(rules, path, is_dir) == expected
+
+
+def _visible(matcher: IgnoreMatcher, directory: Path, prefix: str = ""):
+    # the (not ignored) files under the given directory, as the engine walks it
+    result = []
+    for child in sorted(directory.iterdir()):
+        if matcher.ignores(child.name, child.is_dir()):
+            continue
+        if child.is_dir():
+            result += _visible(matcher.enter(child), child, f"{prefix}{child.name}/")
+        else:
+            result.append(prefix + child.name)
+    return result
+
+
+def test_nested_ignore_files(tmp_path: Path, write_tree):
+    root = write_tree(tmp_path / "root", {
+        IGNORE_FILE: "*.log\n/top-only.txt\nsub/anchored.txt\nexcluded/\n",
+        "a.log": "",
+        "top-only.txt": "",
+        "sub/" + IGNORE_FILE: "!keep.log\n*.tmp\n",
+        "sub/keep.log": "",
+        "sub/drop.log": "",
+        "sub/x.tmp": "",
+        "sub/top-only.txt": "",
+        "sub/anchored.txt": "",
+        "sub/deeper/keep.log": "",
+        "sub/deeper/x.tmp": "",
+        "sub/deeper/" + IGNORE_FILE: "!x.tmp\n",
+        "excluded/" + IGNORE_FILE: "!*\n",
+        "excluded/file.txt": "",
+        "other/x.tmp": "",
+    })
+
+    assert _visible(IgnoreMatcher.for_template(root), root) == [
+        IGNORE_FILE, "other/x.tmp", "sub/" + IGNORE_FILE, "sub/deeper/" + IGNORE_FILE, "sub/deeper/keep.log",
+        "sub/deeper/x.tmp", "sub/keep.log", "sub/top-only.txt"]
+
+
+def test_excluded_paths(tmp_path: Path, write_tree):
+    root = write_tree(tmp_path / "root", {"a.txt": "", "sub/a.txt": ""})
+    matcher = IgnoreMatcher.for_template(root, [root / "sub" / "a.txt"])
+    assert _visible(matcher, root) == ["a.txt"]
+
+
+def test_ignore_files_are_read_as_utf8(tmp_path: Path, write_tree):
+    root = write_tree(tmp_path / "root", {IGNORE_FILE: "ünïcode.txt\n", "ünïcode.txt": "", "a.txt": ""})
+    assert _visible(IgnoreMatcher.for_template(root), root) == [IGNORE_FILE, "a.txt"]
+
+
+def test_modified_ignore_files_are_reloaded(tmp_path: Path, write_tree):
+    root = write_tree(tmp_path / "root", {IGNORE_FILE: "a.txt\n", "a.txt": "", "sub/b.txt": ""})
+    matcher = IgnoreMatcher.for_template(root)
+    assert _visible(matcher, root) == [IGNORE_FILE, "sub/b.txt"]
+    assert not matcher.is_stale()
+
+    (root / "sub" / IGNORE_FILE).write_text("b.txt\n")
+    assert matcher.is_stale()
+    assert _visible(IgnoreMatcher.for_template(root), root) == [IGNORE_FILE, f"sub/{IGNORE_FILE}"]
+
+
+def test_render_skips_ignored_entries(tmp_path: Path, write_tree):
+    template = write_tree(tmp_path / "template", {
+        "proto.py": "",
+        IGNORE_FILE: "*.bak\n/notes/\n",
+        "a.txt.tmpl": "{{ 1 }}",
+        "a.txt.bak": "",
+        "notes/todo.txt": "",
+        "sub/notes/kept.txt": "",
+        "sub/broken.txt.tmpl.bak": "{{ never rendered",
+    })
+
+    ProtopyEngine().render(template, tmp_path / "out", [], {}, {})
+
+    out = tmp_path / "out"
+    assert sorted(p.relative_to(out).as_posix() for p in out.rglob("*") if p.is_file()) == [
+        IGNORE_FILE, "a.txt", "sub/notes/kept.txt"]
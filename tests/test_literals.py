@@ -0,0 +1,115 @@
+from pathlib import Path
+
+import pytest
+
+from protopy import literals
+from protopy.engine import ProtopyEngine, _ENCODING
+from protopy.literals import LiteralIndex, is_literal, literal_output, TEMPLATE, LITERAL, VERBATIM
+
+_SOURCES = [
+    "",
+    "\n",
+    "\n\n",
+    "plain",
+    "plain\n",
+    "plain\n\n",
+    "windows\r\nnewlines\r\n",
+    "old mac\rnewlines\r",
+    "mixed\r\nnew\rlines\n",
+    "   indented\n\ttabs\t\n",
+    "# looks like a line statement\n## or a line comment\n",
+    "% also a line statement in some settings\n",
+    "almost { {syntax} } %} #} }}\n",
+    "{ single braces }",
+    "a lone {",
+    "unicode héllo ü \u2028 line separator\n",
+    "\ufeffbyte order mark\n",
+    "\x00 nul and \x0c form feed",
+    "{{ name }}\n",
+    "{% if true %}x{% endif %}\n",
+    "{# a comment #}\n",
+    "text {# a comment #} text",
+    "{#",
+]
+
+
+def test_engine_environment_uses_the_assumed_syntax():
+    # the classification of literals assumes jinja's default syntax, see `protopy.literals`
+    for trusted in (False, True):
+        env = ProtopyEngine(trusted=trusted)._jinja
+        assert {env.block_start_string, env.variable_start_string, env.comment_start_string} == \
+            set(literals._MARKERS)
+        assert env.line_statement_prefix is None and env.line_comment_prefix is None
+        assert not env.keep_trailing_newline
+        assert env.newline_sequence == "\n"
+
+
+@pytest.mark.parametrize("source", _SOURCES)
+def test_literal_output_matches_jinja(tmp_path: Path, write_tree, source: str):
+    template = write_tree(tmp_path / "template", {"proto.py": "name = 'x'\n", "file.txt.tmpl": source})
+    path = template / "file.txt.tmpl"
+    engine = ProtopyEngine()
+    expected = engine._jinja.get_template(str(path)).render(name="x").encode(_ENCODING)
+
+    kind, read = LiteralIndex().classify(path, _ENCODING)
+    assert read == source
+    assert (kind == TEMPLATE) == (not is_literal(source))
+    if kind == VERBATIM:
+        assert source.encode(_ENCODING) == expected
+    elif kind == LITERAL:
+        assert literal_output(source).encode(_ENCODING) == expected
+
+    engine.render(template, tmp_path / "out", [], {}, {})
+    assert (tmp_path / "out" / "file.txt").read_bytes() == expected
+
+
+@pytest.mark.parametrize("source, kind", [
+    ("plain", VERBATIM),
+    ("unicode héllo", VERBATIM),
+    ("plain\n", LITERAL),
+    ("windows\r\nnewlines", LITERAL),
+    ("{{ x }}", TEMPLATE),
+    ("{% x %}", TEMPLATE),
+    ("{# x #}", TEMPLATE),
+])
+def test_classify(tmp_path: Path, source: str, kind: str):
+    path = tmp_path / "file.tmpl"
+    path.write_bytes(source.encode("utf-8"))
+    assert LiteralIndex().classify(path, "utf-8") == (kind, source)
+
+
+def test_classify_is_cached_until_modified(tmp_path: Path):
+    path = tmp_path / "file.tmpl"
+    path.write_text("plain")
+    index = LiteralIndex()
+    assert index.classify(path, "utf-8") == (VERBATIM, "plain")
+    assert index.classify(path, "utf-8") == (VERBATIM, None)  # not read again
+
+    path.write_text("{{ x }} changed")
+    assert index.classify(path, "utf-8") == (TEMPLATE, "{{ x }} changed")
+
+
+def test_sources_that_cannot_be_decoded_are_left_for_jinja(tmp_path: Path):
+    path = tmp_path / "file.tmpl"
+    path.write_bytes(b"\xff\xfe not utf-8")
+    assert LiteralIndex().classify(path, "utf-8") == (TEMPLATE, None)
+
+
+def test_tmpl_suffix_is_stripped_once(tmp_path: Path, write_tree):
+    template = write_tree(tmp_path / "template", {
+        "proto.py": "",
+        "literal.txt.tmpl": "literal",
+        "rendered.txt.tmpl": "{{ 'rendered' }}",
+        "double.tmpl.tmpl": "literal",
+        "double-rendered.tmpl.tmpl": "{{ 'rendered' }}",
+        "upper.TMPL": "{{ copied }}",
+    })
+
+    ProtopyEngine().render(template, tmp_path / "out", [], {}, {})
+
+    out = tmp_path / "out"
+    assert sorted(p.name for p in out.iterdir()) == [
+        "double-rendered.tmpl", "double.tmpl", "literal.txt", "rendered.txt", "upper.TMPL"]
+    assert (out / "double.tmpl").read_text() == "literal"
+    assert (out / "double-rendered.tmpl").read_text() == "rendered"
+    assert (out / "upper.TMPL").read_text() == "{{ copied }}"
@@ -0,0 +1,98 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from protopy.engine import ProtopyEngine
+from protopy.manifest import IncrementalDirectorySink, RenderReport, MANIFEST_FILE, read_manifest, affected_files
+
+_TEMPLATE = {
+    "proto.py": 'name = ask("name")\nversion = ask("version")\n',
+    "{{ name }}.txt": "copied",
+    "readme.md.tmpl": "# {{ name }}",
+    "version.txt.tmpl": "{{ version }}",
+    "static.txt.tmpl": "static",
+    "kept/.protopypreserve": "",
+    "kept/file.txt": "preserved",
+}
+
+
+@pytest.fixture
+def template(tmp_path: Path, write_tree) -> Path:
+    return write_tree(tmp_path / "template", _TEMPLATE)
+
+
+def _render(template: Path, target: Path, allow_overwrite: bool = False, **kwargs) -> RenderReport:
+    sink = IncrementalDirectorySink(target)
+    ProtopyEngine().render(template, sink, [], {"name": "app", "version": "1", **kwargs}, {},
+                           allow_overwrite=allow_overwrite)
+    return sink.report
+
+
+def test_first_render_creates_all_files(template: Path, tmp_path: Path):
+    report = _render(template, tmp_path / "out")
+
+    assert sorted(report.created) == [
+        "app.txt", "kept/.protopypreserve", "kept/file.txt", "readme.md", "static.txt", "version.txt"]
+    assert report.updated == report.unchanged == report.reused == report.orphaned == []
+    assert set(read_manifest(tmp_path / "out")["files"]) == set(report.created)
+
+
+def test_regenerating_does_not_require_overwrite(template: Path, tmp_path: Path):
+    target = tmp_path / "out"
+    _render(template, target)
+    mtimes = {p: p.stat().st_mtime_ns for p in target.rglob("*") if p.is_file() and p.name != MANIFEST_FILE}
+
+    report = _render(template, target)
+
+    assert report.created == report.updated == report.orphaned == []
+    assert sorted(report.unchanged) == sorted(read_manifest(target)["files"])
+    assert sorted(report.reused) == ["readme.md", "static.txt", "version.txt"]
+    assert {p: p.stat().st_mtime_ns for p in mtimes} == mtimes  # nothing was written
+
+
+def test_regenerating_still_protects_files_that_it_does_not_own(template: Path, tmp_path: Path):
+    target = tmp_path / "out"
+    _render(template, target)
+    (target / "other.txt").write_text("mine")
+
+    with pytest.raises(IOError):
+        _render(template, target, name="other")
+    assert (target / "other.txt").read_text() == "mine"
+
+
+def test_changes_are_reported(template: Path, tmp_path: Path):
+    target = tmp_path / "out"
+    _render(template, target)
+    (target / "static.txt").write_text("edited by hand")
+
+    report = _render(template, target, name="renamed", version="2")
+
+    assert sorted(report.created) == ["renamed.txt"]
+    assert sorted(report.updated) == ["readme.md", "static.txt", "version.txt"]
+    assert sorted(report.unchanged) == ["kept/.protopypreserve", "kept/file.txt"]
+    assert report.reused == []
+    assert report.orphaned == ["app.txt"]
+    assert (target / "static.txt").read_text() == "static"
+    assert (target / "app.txt").exists()  # orphaned files are reported, not removed
+
+
+@pytest.mark.parametrize("manifest", [None, "not json", json.dumps({"version": 999, "files": {}})])
+def test_missing_or_invalid_manifest(template: Path, tmp_path: Path, manifest):
+    target = tmp_path / "out"
+    _render(template, target)
+    if manifest is None:
+        (target / MANIFEST_FILE).unlink()
+    else:
+        (target / MANIFEST_FILE).write_text(manifest)
+
+    assert read_manifest(target) is None
+    assert affected_files(target, {"name": "app", "version": "1"}) is None
+
+    # without a manifest the files are not owned by the template, but identical content is still not written again
+    with pytest.raises(IOError):
+        _render(template, target)
+    report = _render(template, target, allow_overwrite=True)
+    assert report.created == report.updated == report.reused == []
+    assert len(report.unchanged) == 6
+    assert read_manifest(target) is not None
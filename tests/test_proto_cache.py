@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from protopy.engine import ProtopyEngine
+from protopy.proto_cache import ProtoCache
+
+
+def _write_template(directory: Path, proto: bytes) -> Path:
+    directory.mkdir(parents=True)
+    (directory / "proto.py").write_bytes(proto)
+    (directory / "out.txt.tmpl").write_text("{{ greeting | length }}")
+    return directory
+
+
+def test_entries_are_shared_between_template_locations(tmp_path: Path):
+    cache = ProtoCache(tmp_path / "cache")
+    source = b"def fail():\n    raise ValueError()\n"
+
+    first = cache.compile(source, str(tmp_path / "a" / "proto.py"))
+    second = ProtoCache(tmp_path / "cache").compile(source, str(tmp_path / "b" / "proto.py"))
+
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+    assert first.co_filename == str(tmp_path / "a" / "proto.py")
+    assert second.co_filename == str(tmp_path / "b" / "proto.py")
+
+    namespace = {}
+    exec(second, namespace)
+    assert namespace["fail"].__code__.co_filename == str(tmp_path / "b" / "proto.py")
+
+
+def test_proto_is_decoded_like_a_python_module(tmp_path: Path):
+    utf8 = _write_template(tmp_path / "utf8", 'greeting = "héllo"\n'.encode("utf-8"))
+    latin1 = _write_template(tmp_path / "latin1", '# -*- coding: latin-1 -*-\ngreeting = "héllo"\n'.encode("latin-1"))
+
+    engine = ProtopyEngine()
+    for template in (utf8, latin1):
+        target = tmp_path / f"{template.name}-out"
+        engine.render(template, target, [], {}, {})
+        assert (target / "out.txt").read_text() == "5"
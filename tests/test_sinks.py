@@ -0,0 +1,94 @@
+import io
+import stat
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from protopy.engine import ProtopyEngine
+from protopy.sinks import MemorySink, ZipSink, TarSink
+
+_TEMPLATE = {
+    "proto.py": 'name = ask("name")\n',
+    "plain.bin": b"\x00\x01\xff binary",
+    "run.sh": "#!/bin/sh\necho hi\n",
+    "{{ name }}.txt.tmpl": "hello {{ name }}\n",
+    "literal.txt.tmpl": "no jinja here",
+    "empty": None,
+    "sub/{{ name }}/deep.txt.tmpl": "{{ name | upper }}",
+    "kept/.protopypreserve": "",
+    "kept/{{ raw }}.txt": "{{ raw }}",
+    "kept/nested/file.txt": "nested",
+}
+
+
+class _Unseekable(io.RawIOBase):
+    # a write only stream that cannot seek nor tell its position (e.g., a socket or a pipe)
+
+    def __init__(self):
+        super().__init__()
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+
+@pytest.fixture
+def template(tmp_path: Path, write_tree) -> Path:
+    template = write_tree(tmp_path / "template", _TEMPLATE)
+    (template / "run.sh").chmod(0o755)
+    return template
+
+
+@pytest.fixture
+def expected(template: Path, tmp_path: Path, snapshot):
+    ProtopyEngine().render(template, tmp_path / "out", [], {"name": "x"}, {})
+    return snapshot(tmp_path / "out")
+
+
+def _zip_snapshot(data: bytes):
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        return {info.filename.rstrip("/"): (stat.S_IMODE(info.external_attr >> 16),
+                                            None if info.is_dir() else zf.read(info))
+                for info in zf.infolist()}
+
+
+def test_memory_sink(template: Path, expected):
+    sink = MemorySink()
+    ProtopyEngine().render(template, sink, [], {"name": "x"}, {})
+
+    assert sink.files == {name: content for name, (_, content) in expected.items() if content is not None}
+    assert sink.directories == {name for name, (_, content) in expected.items() if content is None}
+
+
+def test_zip_sink(template: Path, expected):
+    data = io.BytesIO()
+    with ZipSink(data) as sink:
+        ProtopyEngine().render(template, sink, [], {"name": "x"}, {})
+
+    assert _zip_snapshot(data.getvalue()) == expected
+
+
+def test_zip_sink_on_an_unseekable_stream(template: Path, expected):
+    stream = _Unseekable()
+    with ZipSink(stream) as sink:
+        ProtopyEngine().render(template, sink, [], {"name": "x"}, {})
+
+    assert _zip_snapshot(bytes(stream.data)) == expected
+
+
+@pytest.mark.parametrize("compression", [None, "gz"])
+def test_tar_sink(template: Path, expected, compression):
+    stream = _Unseekable()
+    with TarSink(stream, compression) as sink:
+        ProtopyEngine().render(template, sink, [], {"name": "x"}, {})
+
+    with tarfile.open(fileobj=io.BytesIO(bytes(stream.data)), mode="r:*") as tf:
+        result = {member.name: (member.mode, tf.extractfile(member).read() if member.isfile() else None)
+                  for member in tf.getmembers()}
+    assert result == expected
@@ -0,0 +1,133 @@
+import http.server
+import io
+import threading
+import zipfile
+from functools import partial
+from pathlib import Path
+from typing import Dict, List
+
+import pygit2
+import pytest
+
+from protopy.cli.sources.git_source import GitSource
+from protopy.cli.sources.source_cache import SourceCache
+from protopy.cli.sources.url_source import UrlSource
+from protopy.cli.sources.zip_source import ZipSource
+
+
+class _RecordingHandler(http.server.SimpleHTTPRequestHandler):
+    requests: List[str] = []
+
+    def do_GET(self):
+        self.requests.append("GET")
+        super().do_GET()
+
+    def do_HEAD(self):
+        self.requests.append("HEAD")
+        super().do_HEAD()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server(tmp_path: Path):
+    """
+    serves a zipped template from a local http server, yields (url of the zip, list of the received request methods)
+    """
+    content = io.BytesIO()
+    with zipfile.ZipFile(content, "w") as zf:
+        zf.writestr("proto.py", "")
+        zf.writestr("file.txt", "content")
+
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "template.zip").write_bytes(content.getvalue())
+
+    requests: List[str] = []
+    handler = type("Handler", (_RecordingHandler,), {"requests": requests})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=str(served)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/template.zip", requests
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def bare_repo(tmp_path: Path) -> str:
+    """
+    a local bare git repository with a single commit that holds two templates: a/ and b/
+    """
+    repo = pygit2.init_repository(str(tmp_path / "repo.git"), bare=True)
+    root = repo.TreeBuilder()
+    for name in ("a", "b"):
+        sub = repo.TreeBuilder()
+        sub.insert("proto.py", repo.create_blob(b""), pygit2.GIT_FILEMODE_BLOB)
+        sub.insert(f"f{name}.txt", repo.create_blob(name.encode()), pygit2.GIT_FILEMODE_BLOB)
+        root.insert(name, sub.write(), pygit2.GIT_FILEMODE_TREE)
+
+    signature = pygit2.Signature("test", "test@example.com")
+    repo.create_commit("refs/heads/master", signature, signature, "initial", root.write(), [])
+    repo.set_head("refs/heads/master")
+    return str(tmp_path / "repo.git")
+
+
+def _url_files(url: str, cache: SourceCache) -> Dict[str, str]:
+    with UrlSource(url, ZipSource, cache).use() as template:
+        return {p.name: p.read_text() for p in template.iterdir()}
+
+
+def test_url_cache_miss_downloads(http_server, tmp_path: Path):
+    url, requests = http_server
+    assert _url_files(url, SourceCache(tmp_path / "cache")) == {"proto.py": "", "file.txt": "content"}
+    assert requests == ["GET"]
+
+
+def test_url_cache_hit_does_not_contact_the_source(http_server, tmp_path: Path):
+    url, requests = http_server
+    cache = SourceCache(tmp_path / "cache")
+    _url_files(url, cache)
+    assert _url_files(url, cache)["file.txt"] == "content"
+    assert requests == ["GET"]
+
+
+def test_url_cache_revalidates_expired_entries(http_server, tmp_path: Path):
+    url, requests = http_server
+    cache = SourceCache(tmp_path / "cache", ttl=0)
+    _url_files(url, cache)
+    assert _url_files(url, cache)["file.txt"] == "content"
+    assert requests == ["GET", "HEAD"]  # not modified, so the content is not downloaded again
+
+
+def test_offline_mode_uses_cached_entries(http_server, tmp_path: Path):
+    url, requests = http_server
+    _url_files(url, SourceCache(tmp_path / "cache"))
+
+    offline = SourceCache(tmp_path / "cache", ttl=0, offline=True)
+    assert _url_files(url, offline)["file.txt"] == "content"
+    assert requests == ["GET"]
+
+    with pytest.raises(IOError):
+        _url_files(url + "?other", offline)
+
+
+def test_git_cache_hit(bare_repo: str, tmp_path: Path):
+    cache = SourceCache(tmp_path / "cache")
+    with GitSource(f"{bare_repo}#subdir=a", cache).use() as first:
+        pass
+    with GitSource(f"{bare_repo}#subdir=a", cache).use() as second:
+        assert second == first
+        assert (second / "fa.txt").read_text() == "a"
+
+
+def test_git_subdirs_of_the_same_commit_are_cached_separately(bare_repo: str, tmp_path: Path):
+    cache = SourceCache(tmp_path / "cache")
+    for name in ("a", "b"):
+        with GitSource(f"{bare_repo}#subdir={name}", cache).use() as template:
+            assert sorted(p.name for p in template.iterdir()) == sorted(["proto.py", f"f{name}.txt"])
+
+    with GitSource(bare_repo, cache).use() as template:
+        assert sorted(p.name for p in template.iterdir()) == ["a", "b"]
@@ -0,0 +1,109 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from protopy.engine import ProtopyEngine
+from protopy.staging import StagedDirectorySink, SyncMode
+
+_TEMPLATE = {
+    "proto.py": 'import os\n'
+                'name = ask("name")\n'
+                'def post_generation():\n'
+                '    if os.environ.get("PROTOPY_TEST_FAIL"):\n'
+                '        raise RuntimeError("post generation failed")\n',
+    "{{ name }}.txt.tmpl": "{{ name }}",
+    "shared.txt.tmpl": "new {{ name }}",
+    "dir/nested.txt.tmpl": "nested {{ name }}",
+    "new_dir/file.txt": "new",
+}
+
+
+@pytest.fixture
+def template(tmp_path: Path, write_tree) -> Path:
+    return write_tree(tmp_path / "template", _TEMPLATE)
+
+
+def _render(template: Path, sink: StagedDirectorySink, name: str = "x"):
+    ProtopyEngine().render(template, sink, [], {"name": name}, {}, allow_overwrite=True)
+
+
+def _siblings(path: Path):
+    return sorted(p.name for p in path.parent.iterdir() if p.name.startswith(f".{path.name}."))
+
+
+@pytest.mark.parametrize("sync", list(SyncMode))
+def test_fresh_target(template: Path, tmp_path: Path, snapshot, sync):
+    ProtopyEngine().render(template, tmp_path / "expected", [], {"name": "x"}, {})
+    sink = StagedDirectorySink(tmp_path / "out", sync=sync)
+
+    _render(template, sink)
+
+    assert snapshot(tmp_path / "out") == snapshot(tmp_path / "expected")
+    assert sink.staging_dir is None
+    assert _siblings(tmp_path / "out") == []
+
+
+def test_merge_into_existing_target(template: Path, tmp_path: Path, write_tree):
+    target = write_tree(tmp_path / "out", {
+        "shared.txt": "old",
+        "dir/other.txt": "kept",
+        "unrelated.txt": "kept",
+    })
+
+    _render(template, StagedDirectorySink(target, sync=SyncMode.NONE))
+
+    assert (target / "shared.txt").read_text() == "new x"
+    assert (target / "x.txt").read_text() == "x"
+    assert (target / "dir" / "nested.txt").read_text() == "nested x"
+    assert (target / "dir" / "other.txt").read_text() == "kept"
+    assert (target / "unrelated.txt").read_text() == "kept"
+    assert (target / "new_dir" / "file.txt").read_text() == "new"
+    assert _siblings(target) == []
+
+
+def test_failed_post_generation_is_rolled_back(template: Path, tmp_path: Path, write_tree, snapshot, monkeypatch):
+    target = write_tree(tmp_path / "out", {
+        "shared.txt": "old",
+        "dir/other.txt": "kept",
+    })
+    before = snapshot(target)
+    monkeypatch.setenv("PROTOPY_TEST_FAIL", "1")
+
+    with pytest.raises(RuntimeError):
+        _render(template, StagedDirectorySink(target, sync=SyncMode.NONE))
+    assert snapshot(target) == before
+    assert _siblings(target) == []
+
+    with pytest.raises(RuntimeError):
+        _render(template, StagedDirectorySink(tmp_path / "fresh", sync=SyncMode.NONE))
+    assert not (tmp_path / "fresh").exists()
+    assert _siblings(tmp_path / "fresh") == []
+
+
+def test_failed_render_leaves_target_untouched(template: Path, tmp_path: Path, write_tree, snapshot):
+    target = write_tree(tmp_path / "out", {"shared.txt": "old"})
+    before = snapshot(target)
+    (template / "broken.txt.tmpl").write_text("{{ name | no_such_filter }}")
+
+    with pytest.raises(Exception):
+        _render(template, StagedDirectorySink(target, sync=SyncMode.NONE))
+    assert snapshot(target) == before
+    assert _siblings(target) == []
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="requires symlinks")
+def test_target_under_a_symlinked_directory(template: Path, tmp_path: Path, write_tree):
+    real = write_tree(tmp_path / "real", {"out/shared.txt": "old"})
+    try:
+        (tmp_path / "link").symlink_to(real, target_is_directory=True)
+    except OSError:
+        pytest.skip("cannot create symlinks")
+
+    _render(template, StagedDirectorySink(tmp_path / "link" / "out", sync=SyncMode.NONE))
+    _render(template, StagedDirectorySink(tmp_path / "link" / "fresh", sync=SyncMode.NONE))
+
+    assert (real / "out" / "shared.txt").read_text() == "new x"
+    assert (real / "fresh" / "x.txt").read_text() == "x"
+    assert (tmp_path / "link").is_symlink()
+    assert sorted(p.name for p in real.iterdir()) == ["fresh", "out"]
@@ -0,0 +1,75 @@
+"""
+checks that the protopy cli starts fast: cli invocations that do not render templates are run in fresh interpreters, the
+tests fail if they import modules that should only be loaded on first use (the engine, jinja, pygit2, requests). if
+PROTOPY_STARTUP_BUDGET (seconds) is set, they also fail if the fastest of several runs exceeds that budget (wall time is
+too noisy on shared machines to be checked by default).
+"""
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import pytest
+
+_REPO_ROOT = Path(__file__).parent.parent
+_BUDGET = os.environ.get("PROTOPY_STARTUP_BUDGET")
+_REPEAT = 5
+
+# modules that should not be imported by commands that do not render templates
+_LAZY_MODULES = ["jinja2", "pygit2", "requests", "protopy.engine", "protopy.batch", "protopy.manifest"]
+
+_RUNNER = """
+import sys
+sys.argv = ["protopy"] + sys.argv[1:]
+from protopy.application import application
+application.auto_exits(False)
+application.run()
+print(",".join(m for m in {lazy!r} if m in sys.modules), file=sys.stderr)
+"""
+
+_COMMANDS = {"--help": ["--help"], "list": ["list"], "help generate": ["help", "generate"], "man": ["man", "{template}"]}
+
+
+@pytest.fixture(scope="module")
+def template_dir(tmp_path_factory) -> Path:
+    template = tmp_path_factory.mktemp("template")
+    (template / "proto.py").write_text('name = ask("name", doc="the name of the project")\n')
+    return template
+
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(_REPO_ROOT), str(_REPO_ROOT / "protopy_lib")]),
+           "PROTOPY_NO_DAEMON": "1"}
+    process = subprocess.run([sys.executable, "-c", _RUNNER.format(lazy=_LAZY_MODULES), *args],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, env=env)
+    assert process.returncode == 0, f"protopy {' '.join(args)} failed: {process.stderr.strip()}"
+    return process
+
+
+def _args(command: str, template_dir: Path) -> List[str]:
+    return [arg.format(template=template_dir) for arg in _COMMANDS[command]]
+
+
+@pytest.mark.parametrize("command", list(_COMMANDS))
+def test_startup_does_not_import_lazy_modules(command: str, template_dir: Path):
+    loaded = _run(_args(command, template_dir)).stderr.strip().splitlines()[-1:]
+    assert loaded in ([], [""]), f"protopy {command} eagerly imported: {loaded[0]}"
+
+
+@pytest.mark.skipif(_BUDGET is None, reason="PROTOPY_STARTUP_BUDGET is not set")
+@pytest.mark.parametrize("command", list(_COMMANDS))
+def test_startup_time(command: str, template_dir: Path):
+    args = _args(command, template_dir)
+    _run(args)  # warm up (e.g., bytecode compilation and file system caches)
+
+    times = []
+    for _ in range(_REPEAT):
+        start = time.perf_counter()
+        _run(args)
+        times.append(time.perf_counter() - start)
+
+    fastest = min(times)
+    assert fastest <= float(_BUDGET), f"protopy {command} took {fastest:.3f}s (budget: {_BUDGET}s)"
@@ -0,0 +1,78 @@
+import queue
+import threading
+from pathlib import Path
+
+import pytest
+
+from protopy.engine import ProtopyEngine
+from protopy.watch import TemplateWatcher, EVERYTHING
+
+_TEMPLATE = {
+    "proto.py": 'name = ask("name")\n',
+    "a.txt.tmpl": "a {{ name }}",
+    "b.txt.tmpl": "b {{ name }}",
+    "sub/c.txt": "c",
+}
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watcher_reports_changed_files(tmp_path: Path, write_tree, use_inotify):
+    template = write_tree(tmp_path / "template", _TEMPLATE)
+    with TemplateWatcher(template, poll_interval=0.01, use_inotify=use_inotify) as watcher:
+        (template / "a.txt.tmpl").write_text("a changed")
+        assert "a.txt.tmpl" in _wait(watcher)
+
+        (template / "sub" / "new.txt").write_text("new")
+        assert "sub/new.txt" in _wait(watcher)
+
+        (template / "b.txt.tmpl").unlink()
+        assert "b.txt.tmpl" in _wait(watcher)
+
+
+def test_scanning_does_not_follow_directory_links(tmp_path: Path, write_tree):
+    template = write_tree(tmp_path / "template", _TEMPLATE)
+    (template / "sub" / "loop").symlink_to(template, target_is_directory=True)
+
+    with TemplateWatcher(template, poll_interval=0.01, use_inotify=False) as watcher:
+        (template / "sub" / "c.txt").write_text("changed")
+        assert _wait(watcher) == {"sub/c.txt"}
+
+
+def test_watch_renders_only_the_changed_file(tmp_path: Path, write_tree):
+    template = write_tree(tmp_path / "template", _TEMPLATE)
+    target = tmp_path / "out"
+    cycles = queue.Queue()
+    stop = threading.Event()
+
+    thread = threading.Thread(target=ProtopyEngine().watch, args=(template, target, [], {"name": "x"}, {}),
+                              kwargs={"on_cycle": cycles.put, "stop": stop, "poll_interval": 0.01})
+    thread.start()
+    try:
+        initial = cycles.get(timeout=10)
+        assert initial.error is None and initial.proto and initial.planned
+        assert sorted(initial.rendered) == ["a.txt", "b.txt", "sub/c.txt"]
+
+        (template / "a.txt.tmpl").write_text("a {{ name }} changed")
+        cycle = cycles.get(timeout=10)
+        assert cycle.error is None and not cycle.proto and not cycle.planned
+        assert cycle.rendered == ["a.txt"]
+        assert (target / "a.txt").read_text() == "a x changed"
+
+        # a template in the middle of being edited fails its cycle, but keeps the previous output
+        (template / "a.txt.tmpl").write_text("a {{ name ")
+        assert cycles.get(timeout=10).error is not None
+        assert (target / "a.txt").read_text() == "a x changed"
+
+        (template / "a.txt.tmpl").write_text("a {{ name }} fixed")
+        cycle = cycles.get(timeout=10)
+        assert cycle.error is None and cycle.rendered == ["a.txt"]
+        assert (target / "a.txt").read_text() == "a x fixed"
+    finally:
+        stop.set()
+        thread.join(10)
+
+
+def _wait(watcher: TemplateWatcher):
+    changes = watcher.wait(timeout=10)
+    assert changes and EVERYTHING not in changes
+    return changes
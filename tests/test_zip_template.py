@@ -0,0 +1,81 @@
+import io
+import zipfile
+from pathlib import Path
+from zipfile import ZipFile
+
+from protopy.engine import ProtopyEngine
+from protopy.instrumentation import EngineObserver
+from protopy.zip_template import ZipTemplatePath
+
+_TEMPLATE = {
+    "proto.py": 'name = ask("name")\n',
+    "plain.bin": b"\x00\x01\xff binary",
+    "run.sh": "#!/bin/sh\necho hi\n",
+    "{{ name }}.txt.tmpl": "hello {{ name }}\n",
+    "literal.txt.tmpl": "no jinja here",
+    "unicode.txt.tmpl": "{% set s = 'héllo' %}{{ s }} {{ s | length }}",
+    "empty": None,
+    "sub/{{ name }}/deep.txt.tmpl": "{{ name | upper }}",
+    "kept/.protopypreserve": "",
+    "kept/{{ raw }}.txt": "{{ raw }}",
+}
+
+
+class _Compilations(EngineObserver):
+    def __init__(self):
+        self.files = []
+
+    def on_compile(self, name, seconds):
+        if name is not None:
+            self.files.append(name)
+
+
+def _template(tmp_path: Path, write_tree, zip_dir) -> Path:
+    template = write_tree(tmp_path / "template", _TEMPLATE)
+    (template / "run.sh").chmod(0o755)
+    return zip_dir(template, tmp_path / "template.zip")
+
+
+def test_zip_template_renders_like_the_directory(tmp_path: Path, write_tree, snapshot, zip_dir):
+    archive = _template(tmp_path, write_tree, zip_dir)
+    engine = ProtopyEngine()
+
+    engine.render(tmp_path / "template", tmp_path / "from_dir", [], {"name": "x"}, {})
+    with ZipFile(archive) as zf:
+        engine.render(ZipTemplatePath(zf), tmp_path / "from_zip", [], {"name": "x"}, {})
+
+    expected = snapshot(tmp_path / "from_dir")
+    assert snapshot(tmp_path / "from_zip") == expected
+    assert expected["run.sh"][0] == 0o755
+    assert expected["empty"] == (0o755, None)
+    assert expected["unicode.txt"][1] == "héllo 5".encode()
+
+
+def test_zip_templates_are_compiled_once_per_engine(tmp_path: Path, write_tree, zip_dir):
+    archive = _template(tmp_path, write_tree, zip_dir)
+    engine = ProtopyEngine()
+    compilations = _Compilations()
+    engine.add_observer(compilations)
+
+    for i in range(2):
+        with ZipFile(archive) as zf:  # opened for each render, as `ZipSource` does
+            engine.render(ZipTemplatePath(zf), tmp_path / f"out{i}", [], {"name": "x"}, {})
+        assert (tmp_path / f"out{i}" / "x.txt").read_text() == "hello x"
+
+    assert sorted(Path(name).name for name in compilations.files) == sorted(
+        ["{{ name }}.txt.tmpl", "unicode.txt.tmpl", "deep.txt.tmpl"])
+
+
+def test_in_memory_archives_are_not_confused(tmp_path: Path):
+    engine = ProtopyEngine()
+    for content in ("first {{ 1 }}", "second {{ 2 }}"):
+        data = io.BytesIO()
+        with ZipFile(data, "w") as zf:
+            zf.writestr(zipfile.ZipInfo("proto.py", (2020, 1, 1, 0, 0, 0)), "")
+            zf.writestr(zipfile.ZipInfo("file.txt.tmpl", (2020, 1, 1, 0, 0, 0)), content)
+
+        with ZipFile(data) as zf:
+            engine.render(ZipTemplatePath(zf), tmp_path / content.split()[0], [], {}, {})
+
+    assert (tmp_path / "first" / "file.txt").read_text() == "first 1"
+    assert (tmp_path / "second" / "file.txt").read_text() == "second 2"